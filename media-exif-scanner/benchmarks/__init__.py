@@ -0,0 +1 @@
+"""Synthetic-corpus benchmarks; run with: python -m benchmarks --help"""
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Make the project root importable so src.* and benchmarks.* resolve
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.run import main
+
+if __name__ == "__main__":
+    sys.exit(main())
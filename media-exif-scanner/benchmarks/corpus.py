@@ -0,0 +1,148 @@
+"""
+Reproducible synthetic media trees for benchmarking.
+
+Files are built from a handful of small templates so that even a 1M-file
+corpus is generated at disk speed: every JPEG gets its own EXIF segment
+(date taken, camera, GPS) spliced in after SOI, every MP4 its own mvhd, and
+random padding after the end-of-image / end-of-file marker makes each unique
+file's content (and hash) unique while keeping it decodable. Duplicates are
+byte-for-byte copies of earlier files, each placed on another "disk" than
+the file it copies.
+"""
+import io
+import json
+import math
+import os
+import random
+import shutil
+import struct
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+KINDS = {"jpeg": ".jpg", "png": ".png", "mp4": ".mp4"}
+DEFAULT_MIX = {"jpeg": 0.6, "png": 0.25, "mp4": 0.15}
+MANIFEST_NAME = "corpus.json"
+# Bumped whenever the same options start producing a different tree, so older corpora are rebuilt
+CORPUS_VERSION = 2
+_MAKES = [("Canon", "EOS 5D Mark IV"), ("NIKON CORPORATION", "NIKON D750"), ("Apple", "iPhone 12"),
+          ("SONY", "ILCE-7M3"), ("FUJIFILM", "X-T3")]
+
+
+def _jpeg_template(rng, index):
+    img = Image.new("RGB", (64, 48), tuple(rng.randrange(256) for _ in range(3)))
+    img.paste(tuple(rng.randrange(256) for _ in range(3)), (index * 8 % 48, 0, index * 8 % 48 + 16, 48))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=80)
+    # Drop SOI: each file gets SOI + its own APP1 + this body
+    return buf.getvalue()[2:]
+
+
+def _png_template(rng, index):
+    img = Image.new("RGB", (48, 48), tuple(rng.randrange(256) for _ in range(3)))
+    img.paste(tuple(rng.randrange(256) for _ in range(3)), (0, index * 6 % 32, 48, index * 6 % 32 + 16))
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _exif_segment(rng, taken):
+    exif = Image.Exif()
+    make, model = rng.choice(_MAKES)
+    exif[0x010F], exif[0x0110], exif[0x0112] = make, model, rng.choice((1, 3, 6, 8))
+    exif.get_ifd(0x8769)[0x9003] = taken.strftime("%Y:%m:%d %H:%M:%S")
+    gps = exif.get_ifd(0x8825)
+    gps[1], gps[2] = "N", (float(rng.randrange(90)), float(rng.randrange(60)), 0.0)
+    gps[3], gps[4] = "E", (float(rng.randrange(180)), float(rng.randrange(60)), 0.0)
+    payload = exif.tobytes()
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _mp4_header(taken, duration_ms):
+    created = int((taken - datetime(1904, 1, 1)).total_seconds())
+    mvhd = _box(b"mvhd", b"\x00\x00\x00\x00" + struct.pack(">IIII", created, created, 1000, duration_ms) + b"\x00" * 80)
+    return _box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41") + _box(b"moov", mvhd)
+
+
+def _sizes(rng, median_size):
+    """Log-normal file sizes around median_size (sigma 1, clamped to 1 KB .. 64x median)."""
+    while True:
+        yield int(min(max(rng.lognormvariate(math.log(median_size), 1.0), 1024), 64 * median_size))
+
+
+def generate_corpus(root, files=10000, duplicate_ratio=0.2, mix=None, median_size=64 * 1024, files_per_dir=500,
+                    disks=2, seed=0):
+    """
+    Write a synthetic tree of `files` media files under root and return its manifest.
+
+    duplicate_ratio of the files are copies of earlier files, each on another
+    disk (root/disk<N>) than the file it copies when disks > 1; mix maps kind ("jpeg", "png", "mp4") to its share of the
+    unique files. The same arguments always produce the same bytes.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds, weights = zip(*mix.items())
+    templates = {"jpeg": [_jpeg_template(rng, i) for i in range(8)], "png": [_png_template(rng, i) for i in range(8)]}
+    sizes = _sizes(rng, median_size)
+    epoch = datetime(2010, 1, 1)
+    originals = []  # (kind, path, disk) of the first files written, sampled for duplicates
+    manifest = {"version": CORPUS_VERSION, "files": files, "duplicate_ratio": duplicate_ratio, "mix": dict(mix), "median_size": median_size,
+                "files_per_dir": files_per_dir, "disks": disks, "seed": seed,
+                "bytes": 0, "duplicates": 0, "by_kind": dict.fromkeys(kinds, 0)}
+    made_dirs = set()
+    for index in range(files):
+        disk = index % disks
+        if originals and rng.random() < duplicate_ratio:
+            kind, source, source_disk = rng.choice(originals)
+            if disks > 1:
+                # Any disk but the source's
+                disk = (source_disk + 1 + rng.randrange(disks - 1)) % disks
+            with open(source, "rb") as f:
+                data = f.read()
+            manifest["duplicates"] += 1
+        else:
+            kind = rng.choices(kinds, weights)[0]
+            taken = epoch + timedelta(seconds=rng.randrange(15 * 365 * 86400))
+            if kind == "jpeg":
+                head = b"\xff\xd8" + _exif_segment(rng, taken) + rng.choice(templates["jpeg"])
+            elif kind == "png":
+                head = rng.choice(templates["png"])
+            else:
+                head = _mp4_header(taken, rng.randrange(1000, 600000))
+            size = max(next(sizes), len(head) + 16)
+            padding = rng.randbytes(size - len(head) - (8 if kind == "mp4" else 0))
+            data = head + (_box(b"mdat", padding) if kind == "mp4" else padding)
+        directory = os.path.join(root, f"disk{disk}", f"dir{index // files_per_dir:05d}")
+        if directory not in made_dirs:
+            os.makedirs(directory, exist_ok=True)
+            made_dirs.add(directory)
+        path = os.path.join(directory, f"{kind}_{index:07d}{KINDS[kind]}")
+        with open(path, "wb") as f:
+            f.write(data)
+        if len(originals) < 10000:
+            originals.append((kind, path, disk))
+        manifest["bytes"] += len(data)
+        manifest["by_kind"][kind] += 1
+    with open(os.path.join(root, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_or_generate(root, **options):
+    """Reuse the corpus at root if it was generated with the same options, otherwise (re)build it."""
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == CORPUS_VERSION and all(manifest.get(key) == value
+                                                             for key, value in options.items()):
+            return manifest
+        # Our own stale corpus: clear it so no files from the old run linger
+        shutil.rmtree(root)
+    elif os.path.isdir(root) and os.listdir(root):
+        raise ValueError(f"{root} is not empty and holds no {MANIFEST_NAME}; refusing to write a corpus there")
+    return generate_corpus(root, **options)
@@ -0,0 +1,223 @@
+"""
+Benchmark harness: python -m benchmarks --files 10000 100000 --output results.json
+
+For each corpus size a synthetic tree is generated (or reused, see
+corpus.load_or_generate) and every stage runs in a fresh process, so the
+reported peak RSS belongs to that stage alone. Results are JSON, one entry
+per corpus size with files/sec, MB/sec, peak RSS and stage-specific details,
+ready to diff between two runs.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.corpus import load_or_generate
+
+STAGES = ("hash", "exif", "media_scanner", "scan_engine", "db_insert", "dedupe")
+IMAGE_EXTENSIONS = (".jpg", ".png")
+
+
+def _list_files(root):
+    files = []
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            if not name.endswith(".json"):
+                path = os.path.join(dirpath, name)
+                files.append((path, os.path.getsize(path)))
+    return files
+
+
+def _records(files):
+    return [{"disk_name": "", "file_name": os.path.basename(path), "file_path": path, "exif_data": {},
+             "size": size} for path, size in files]
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _bench_hash(root, files, options):
+    from src.utils.hash_utils import generate_hash
+
+    start = time.perf_counter()
+    for path, _ in files:
+        generate_hash(path, options["hash_algorithm"])
+    return time.perf_counter() - start, len(files), sum(size for _, size in files), {}
+
+
+def _bench_exif(root, files, options):
+    from src.utils.exif_utils import extract_exif_data
+
+    images = [(path, size) for path, size in files if path.endswith(IMAGE_EXTENSIONS)]
+    start = time.perf_counter()
+    with_exif = sum(1 for path, _ in images if extract_exif_data(path))
+    # Only headers are read, so MB/s would be meaningless here
+    return time.perf_counter() - start, len(images), 0, {"with_exif": with_exif}
+
+
+def _bench_media_scanner(root, files, options):
+    from src.scanner.media_scanner import MediaScanner
+
+    scanner = MediaScanner([root], workers=options["workers"], hash_algorithm=options["hash_algorithm"])
+    start = time.perf_counter()
+    count, first = 0, None
+    # Streamed, so peak RSS stays flat and time to the first record is measured too
+    for _ in scanner.iter_media():
+        count += 1
+        if first is None:
+            first = time.perf_counter() - start
+    return time.perf_counter() - start, count, sum(size for _, size in files), {"first_record_seconds": first}
+
+
+def _bench_scan_engine(root, files, options):
+    from src.database.db_manager import DBManager
+    from src.scanner.scan_engine import ScanEngine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        phases = {}
+
+        def on_progress(event):
+            phases.setdefault(event["stage"], time.perf_counter())
+
+        engine = ScanEngine(db, hash_workers=options["workers"], exif_workers=options["workers"],
+                            hash_algorithm=options["hash_algorithm"])
+        start = time.perf_counter()
+        stats = engine.scan([root], on_progress=on_progress)[root]
+        elapsed = time.perf_counter() - start
+        db.engine.dispose()
+    # Seconds spent in each pipeline phase, from the first event of one phase to the next
+    marks = sorted(phases.items(), key=lambda item: item[1]) + [("end", start + elapsed)]
+    breakdown = {stage: round(marks[i + 1][1] - at, 4) for i, (stage, at) in enumerate(marks[:-1]) if stage != "done"}
+    return elapsed, stats.total_files, sum(size for _, size in files), {"phases": breakdown, "stats": stats.to_dict()}
+
+
+def _bench_db_insert(root, files, options):
+    from src.database.db_manager import DBManager
+
+    records = _records(files)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        start = time.perf_counter()
+        with db.batch_writer(batch_size=options["batch_size"]) as writer:
+            for record in records:
+                writer.add(**record)
+        elapsed = time.perf_counter() - start
+        db.engine.dispose()
+    return elapsed, len(records), 0, {"batch_size": options["batch_size"]}
+
+
+def _bench_dedupe(root, files, options):
+    from src.scanner.duplicate_finder import DuplicateFinder
+
+    records = _records(files)
+    finder = DuplicateFinder(algorithm=options["hash_algorithm"])
+    start = time.perf_counter()
+    groups = list(finder.find_duplicates(records))
+    elapsed = time.perf_counter() - start
+    return elapsed, len(records), 0, {
+        "groups": len(groups),
+        "duplicate_files": sum(len(group) - 1 for group in groups),
+        "partial_hashed": sum(1 for record in records if record.get("partial_hash")),
+        "full_hashed": sum(1 for record in records if record.get("hash_value")),
+    }
+
+
+def run_stage(stage, root, options):
+    """Run one stage (in its own process) and return its measurements."""
+    files = _list_files(root)
+    elapsed, count, total_bytes, details = globals()[f"_bench_{stage}"](root, files, options)
+    result = {
+        "seconds": round(elapsed, 4),
+        "files": count,
+        "bytes": total_bytes,
+        "files_per_sec": round(count / elapsed, 1) if elapsed else None,
+        "mb_per_sec": round(total_bytes / 1e6 / elapsed, 2) if elapsed and total_bytes else None,
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
+    result.update(details)
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, stages=STAGES, corpus_dir=None, log=print, **options):
+    corpus_dir = corpus_dir or os.path.join(tempfile.gettempdir(), "media_exif_scanner_bench")
+    corpus_options = {key: options.pop(key) for key in ("duplicate_ratio", "median_size", "seed")}
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": dict(options, **corpus_options),
+        },
+        "runs": [],
+    }
+    for size in sizes:
+        root = os.path.join(corpus_dir, f"{size}_files")
+        log(f"corpus: {size} files in {root}")
+        start = time.perf_counter()
+        manifest = load_or_generate(root, files=size, **corpus_options)
+        run = {"files": size, "corpus": dict(manifest, seconds=round(time.perf_counter() - start, 2)), "stages": {}}
+        for stage in stages:
+            log(f"  {stage}...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                run["stages"][stage] = result = pool.submit(run_stage, stage, root, options).result()
+            log(f"  {stage}: {result['seconds']}s, {result['files_per_sec']} files/s, {result['mb_per_sec']} MB/s")
+        report["runs"].append(run)
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="benchmarks", description="Benchmark scanning, hashing, EXIF, DB ingest and dedupe.")
+    parser.add_argument("--files", type=int, nargs="+", default=[10000], help="corpus sizes, e.g. 10000 100000 1000000")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--corpus-dir", help="where corpora are generated and reused (default: a temp folder)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.2)
+    parser.add_argument("--median-size", type=int, default=64 * 1024, help="median file size in bytes (log-normal)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--hash-algorithm", default="sha256")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    report = run_benchmarks(
+        args.files, stages=args.stages, corpus_dir=args.corpus_dir, log=lambda msg: print(msg, file=sys.stderr),
+        duplicate_ratio=args.duplicate_ratio, median_size=args.median_size, seed=args.seed,
+        workers=args.workers, batch_size=args.batch_size, hash_algorithm=args.hash_algorithm,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
@@ -0,0 +1 @@
+"""Command line entry point package; run with: python -m media_exif_scanner --help"""
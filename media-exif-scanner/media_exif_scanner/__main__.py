@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Make the project root importable so src.* resolves, as app_ui.py does
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
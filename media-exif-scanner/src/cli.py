@@ -0,0 +1,541 @@
+"""
+Headless command line interface: python -m media_exif_scanner scan|dedupe|report|purge|sync|merge|lookup
+
+Only the database layer is imported at startup; Pillow/NumPy are loaded by
+the commands that need them and tkinter never is, so cron runs start fast.
+"""
+import argparse
+import csv
+import json
+import os
+import signal
+import sys
+from itertools import islice
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.database.db_manager import DBManager
+from src.scanner.duplicate_finder import DuplicateFinder
+from src.scanner.keeper_policy import KeeperPolicy, parse_rules
+from src.utils.hash_utils import DEFAULT_ALGORITHM, available_algorithms, set_hash_cache
+from src.utils.metadata_fields import parse_period
+
+EXIT_OK = 0
+EXIT_ERRORS = 1  # Finished, but some files could not be processed
+EXIT_USAGE = 2
+EXIT_CANCELLED = 130
+
+# Files hashed and tested against the hash index per batch by `lookup`
+LOOKUP_BATCH = 10000
+
+
+class OutputWriter:
+    """Streams result rows (dicts) to stdout as text, JSON or CSV."""
+
+    def __init__(self, fmt, fields, stream=sys.stdout):
+        self.fmt = fmt
+        self.fields = fields
+        self.stream = stream
+        self.count = 0
+        self._csv = None
+
+    def write(self, row):
+        row = {field: row.get(field) for field in self.fields}
+        for field, value in row.items():
+            if hasattr(value, "isoformat"):
+                row[field] = value.isoformat(sep=" ")
+        if self.fmt == "json":
+            self.stream.write(("[\n" if self.count == 0 else ",\n") + json.dumps(row))
+        elif self.fmt == "csv":
+            if self._csv is None:
+                self._csv = csv.DictWriter(self.stream, fieldnames=self.fields)
+                self._csv.writeheader()
+            self._csv.writerow(row)
+        else:
+            self.stream.write(" | ".join(f"{field}={value}" for field, value in row.items()) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self.fmt == "json":
+            self.stream.write("[]\n" if self.count == 0 else "\n]\n")
+        self.stream.flush()
+
+
+def _parse_disk_limits(values):
+    limits = {}
+    for value in values or []:
+        path, _, count = value.rpartition("=")
+        if not path or not count.isdigit():
+            raise argparse.ArgumentTypeError(f"--disk-limit expects PATH=N, got {value!r}")
+        limits[path] = int(count)
+    return limits
+
+
+def _keeper_rules(value):
+    try:
+        parse_rules(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def _period(value):
+    try:
+        parse_period(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def _add_metadata_filters(parser):
+    parser.add_argument("--taken-from", metavar="DATE", type=_period,
+                        help="only files captured on or after this date (YYYY, YYYY-MM or YYYY-MM-DD)")
+    parser.add_argument("--taken-to", metavar="DATE", type=_period,
+                        help="only files captured up to the end of this date (YYYY, YYYY-MM or YYYY-MM-DD)")
+    parser.add_argument("--make", help="only files from this camera make (exact, as listed by report --by camera)")
+    parser.add_argument("--model", help="only files from this camera model (exact)")
+    gps = parser.add_mutually_exclusive_group()
+    gps.add_argument("--has-gps", dest="has_gps", action="store_true", default=None, help="only geotagged files")
+    gps.add_argument("--no-gps", dest="has_gps", action="store_false", help="only files without a location")
+    parser.add_argument("--min-width", type=int, help="only files at least this many pixels wide")
+    parser.add_argument("--min-height", type=int, help="only files at least this many pixels high")
+
+
+def _metadata_filters(db, args):
+    return db.metadata_filters(taken_from=args.taken_from, taken_to=args.taken_to, camera_make=args.make,
+                               camera_model=args.model, has_gps=args.has_gps, min_width=args.min_width,
+                               min_height=args.min_height)
+
+
+def _confirm_duplicates(db, path_prefix, algorithm, filters=()):
+    """Upgrade unconfirmed candidates to full hashes, as the dedupe tab does; the hashes are written in batches."""
+    with db.batch_writer() as batch:
+        def save(record, field):
+            batch.update(record["file_path"], **{field: record[field]})
+
+        finder = DuplicateFinder(on_update=save, algorithm=algorithm)
+        finder.confirm_all(db.get_duplicate_candidates(path_prefix, filters))
+
+
+def _build_metrics(args):
+    from src.utils.metrics import JsonLinesExporter, PrometheusTextfileExporter, ScanMetrics
+
+    exporters = []
+    if args.metrics_file:
+        exporter = PrometheusTextfileExporter if args.metrics_format == "prometheus" else JsonLinesExporter
+        exporters.append(exporter(args.metrics_file))
+    on_slow = lambda stage, path, seconds: print(f"Slow {stage} ({seconds:.2f}s): {path}", file=sys.stderr)
+    metrics = ScanMetrics(slow_threshold=args.slow_threshold, on_slow=on_slow, exporters=exporters,
+                          profile_path=args.profile or "media_exif_scanner.prof")
+    if args.profile:
+        metrics.start_profiling()
+    if args.trace_memory:
+        metrics.start_tracemalloc()
+    return metrics
+
+
+def _install_metric_toggles(metrics):
+    """SIGUSR1 toggles cProfile and SIGUSR2 toggles tracemalloc while a scan runs (POSIX only)."""
+    if not hasattr(signal, "SIGUSR1"):
+        return
+
+    def toggle_profiling(signum, frame):
+        if metrics.profiling:
+            metrics.stop_profiling()
+            print(f"Profiling off; saved to {metrics.dump_profile(metrics.profile_path)}", file=sys.stderr)
+        else:
+            metrics.start_profiling()
+            print("Profiling on", file=sys.stderr)
+
+    def toggle_tracemalloc(signum, frame):
+        import tracemalloc
+
+        if tracemalloc.is_tracing():
+            metrics.stop_tracemalloc()
+            print("Memory tracing off", file=sys.stderr)
+        else:
+            metrics.start_tracemalloc()
+            print("Memory tracing on", file=sys.stderr)
+
+    signal.signal(signal.SIGUSR1, toggle_profiling)
+    signal.signal(signal.SIGUSR2, toggle_tracemalloc)
+
+
+def cmd_scan(db, args):
+    # Imported lazily: the scan pipeline pulls in Pillow and NumPy
+    from src.scanner.scan_engine import ScanStats
+    from src.scanner.scan_worker import ScanWorker
+
+    missing = [path for path in args.paths if not os.path.isdir(path)]
+    if missing:
+        print(f"Not a directory: {', '.join(missing)}", file=sys.stderr)
+        return EXIT_USAGE
+    worker = ScanWorker(
+        db, args.paths,
+        hash_workers=args.hash_workers,
+        exif_workers=args.exif_workers,
+        exif_processes=args.exif_processes,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        disk_limits=_parse_disk_limits(args.disk_limit),
+        hash_algorithm=args.hash_algorithm,
+        metrics=_build_metrics(args),
+        exclude=args.exclude or (),
+        skip_hidden=not args.include_hidden,
+        follow_symlinks=args.follow_symlinks,
+        full_hash=args.full_hash,
+    )
+    _install_metric_toggles(worker.metrics)
+    worker.start()
+    result = None
+    try:
+        while result is None:
+            kind, payload = worker.events.get()
+            if kind == "progress" and args.progress:
+                print(
+                    f"{payload['stage']}: {payload['files_done']} files, {payload['files_per_sec']:.1f} files/s, "
+                    f"{payload['bytes_per_sec'] / 1e6:.1f} MB/s",
+                    file=sys.stderr,
+                )
+            elif kind == "write_error":
+                print(f"Error writing {payload['file_path']} to database: {payload['error']}", file=sys.stderr)
+            elif kind == "error":
+                print(f"Scan failed: {payload}", file=sys.stderr)
+                return EXIT_ERRORS
+            elif kind == "done":
+                result = payload
+    except KeyboardInterrupt:
+        # Let the engine commit what it has; a rerun resumes from there
+        worker.cancel()
+        worker.join()
+        return EXIT_CANCELLED
+
+    out = OutputWriter(args.format, ["path"] + list(ScanStats.FIELDS))
+    skipped = 0
+    for path, stats in result["stats"].items():
+        out.write(dict(stats.to_dict(), path=path))
+        skipped += stats.skipped + stats.write_errors
+    out.close()
+    if args.metrics:
+        for line in worker.metrics.format_summary():
+            print(line, file=sys.stderr)
+    if result["cancelled"]:
+        return EXIT_CANCELLED
+    return EXIT_ERRORS if skipped else EXIT_OK
+
+
+def cmd_dedupe(db, args):
+    fields = ["group", "hash_value", "host", "file_path", "size", "is_duplicate"]
+    out = OutputWriter(args.format, fields)
+    filters = _metadata_filters(db, args)
+    if args.similar:
+        # Imported lazily: perceptual hashing needs NumPy
+        from src.scanner.similarity_finder import find_similar_groups
+
+        groups = find_similar_groups(db.iter_perceptual_hashes(args.path, filters), threshold=args.threshold)
+        for index, group in enumerate(groups, start=1):
+            files = db.get_files_by_ids(group, columns=fields[1:])
+            for file_id in group:
+                if file_id in files:
+                    out.write(dict(files[file_id], group=index))
+    else:
+        _confirm_duplicates(db, args.path, args.hash_algorithm, filters)
+        for index, group in enumerate(db.iter_duplicate_groups(args.path, filters=filters), start=1):
+            for f in group:
+                out.write(dict(f, group=index))
+    out.close()
+    return EXIT_OK
+
+
+def cmd_report(db, args):
+    filters = _metadata_filters(db, args)
+    if args.by == "camera":
+        out = OutputWriter(args.format, ["camera_make", "camera_model", "files", "total_bytes", "first_taken",
+                                         "last_taken"])
+        rows = db.get_camera_summary(args.path, filters)
+    else:
+        out = OutputWriter(args.format, ["disk_name", "files", "total_bytes", "images_with_phash"])
+        rows = db.get_disk_summary(args.path, filters)
+    for row in rows:
+        out.write(row)
+    out.close()
+    if args.format == "text":
+        print(f"duplicate_groups={db.count_duplicate_groups(args.path, filters)} | "
+              f"reclaimable_bytes={db.get_reclaimable_bytes(args.path, filters)}")
+    return EXIT_OK
+
+
+def _purge_jobs(db, path_prefix):
+    """(keeper, duplicates) per group: the first copy (by path) not purged yet is kept."""
+    for group in db.iter_duplicate_groups(path_prefix):
+        remaining = [f for f in group if not f["is_duplicate"]]
+        # Copies on other hosts of a merged catalog are kept; purge runs on the host holding them
+        duplicates = [f for f in remaining[1:] if db.is_local(f)]
+        if duplicates:
+            yield remaining[0], duplicates
+
+
+def _policy_jobs(db, path_prefix, rules, include_ambiguous, on_ambiguous):
+    """(keeper, duplicates) per group as chosen by a KeeperPolicy, streamed from one pass over the groups."""
+    policy = KeeperPolicy(rules)
+    for decision in policy.decide_all(db.iter_duplicate_groups(path_prefix)):
+        if decision["ambiguous"] and not include_ambiguous:
+            on_ambiguous(decision)
+            continue
+        duplicates = [f for f in decision["duplicates"] if db.is_local(f)]
+        if duplicates:
+            yield decision["keeper"], duplicates
+
+
+def cmd_purge(db, args):
+    """Keep one copy of each duplicate group and move, quarantine, hardlink or reflink the others."""
+    from src.scanner.purge_engine import MOVE, QUARANTINE, PurgeEngine
+
+    action = args.action or (MOVE if args.dest else QUARANTINE)
+    if action == MOVE and not args.dest and not args.undo:
+        print("--action move needs --dest", file=sys.stderr)
+        return EXIT_USAGE
+    engine = PurgeEngine(action, dest=args.dest, workers=args.workers, algorithm=args.hash_algorithm,
+                         dry_run=args.dry_run, journal_path=args.journal, quarantine_dir=args.quarantine_dir)
+    out = OutputWriter(args.format, ["action", "status", "file_path", "kept", "dest", "size", "reclaimed", "error"])
+    errors = reclaimed = ambiguous = 0
+
+    def report_ambiguous(decision):
+        nonlocal ambiguous
+        ambiguous += 1
+        for f in decision["duplicates"]:
+            out.write({"action": action, "status": "ambiguous", "file_path": f["file_path"],
+                       "kept": decision["keeper"]["file_path"], "size": f["size"], "reclaimed": 0})
+
+    if args.undo:
+        results = engine.undo(args.undo)
+    else:
+        _confirm_duplicates(db, args.path, args.hash_algorithm)
+        if args.keep:
+            jobs = _policy_jobs(db, args.path, args.keep, args.include_ambiguous, report_ambiguous)
+        else:
+            jobs = _purge_jobs(db, args.path)
+        results = engine.run(jobs)
+    with db.batch_writer() as batch:
+        for result in results:
+            if result["status"] in ("done", "linked"):
+                batch.update(result["file_path"], is_duplicate=1)
+            elif result["status"] == "restored":
+                batch.update(result["file_path"], is_duplicate=0)
+            elif result["status"] in ("skipped", "failed"):
+                errors += 1
+                print(f"{result['status'].title()} {result['file_path']}: {result['error']}", file=sys.stderr)
+            reclaimed += result["reclaimed"]
+            out.write(result)
+    out.close()
+    if not args.undo:
+        verb = "Would reclaim" if args.dry_run else "Reclaimed"
+        print(f"{verb} {reclaimed / 1e6:.1f} MB", file=sys.stderr)
+        if ambiguous:
+            print(f"{ambiguous} groups left for review: no rule picked a single keeper", file=sys.stderr)
+        if engine.journal_path and os.path.exists(engine.journal_path):
+            print(f"Undo with: purge --undo {engine.journal_path}", file=sys.stderr)
+    return EXIT_ERRORS if errors else EXIT_OK
+
+
+def cmd_sync(db, args):
+    """Copy the content the target folder is missing from the source folder."""
+    from src.scanner.sync_planner import SyncCopier, SyncPlanner
+
+    planner = SyncPlanner(db, algorithm=args.hash_algorithm, layout=args.layout)
+    items = planner.plan(args.source, args.target)
+    if not planner.summary["source_files"]:
+        print(f"No catalogued files under {args.source}; scan it first", file=sys.stderr)
+        return EXIT_USAGE
+    summary = planner.summary
+    print(f"{summary['source_files']} source files: {summary['present']} already on the target, "
+          f"{summary['source_duplicates']} duplicates within the source, "
+          f"{summary['to_copy']} to copy ({summary['bytes_to_copy'] / 1e6:.1f} MB)", file=sys.stderr)
+    out = OutputWriter(args.format, ["status", "source_path", "dest_path", "size", "resumed_bytes", "error"])
+    errors = 0
+    copier = SyncCopier(workers=args.workers, algorithm=args.hash_algorithm, dry_run=args.dry_run)
+    for result in planner.record(copier.run(items)):
+        if result["status"] == "failed":
+            errors += 1
+            print(f"Failed to copy {result['source_path']}: {result['error']}", file=sys.stderr)
+        out.write(result)
+    out.close()
+    return EXIT_ERRORS if errors or planner.record_errors else EXIT_OK
+
+
+def cmd_merge(db, args):
+    """Fold shard catalogs scanned on other hosts into this one, copying only what changed since the last merge."""
+    if args.host and len(args.shards) > 1:
+        print("--host names a single shard", file=sys.stderr)
+        return EXIT_USAGE
+    out = OutputWriter(args.format, ["shard", "host", "copied", "deleted"])
+    errors = 0
+    for shard in args.shards:
+        try:
+            out.write(db.merge_shard(shard, host=args.host, full=args.full))
+        except (OSError, ValueError, SQLAlchemyError) as e:
+            errors += 1
+            print(f"Could not merge {shard}: {e}", file=sys.stderr)
+    out.close()
+    return EXIT_ERRORS if errors else EXIT_OK
+
+
+def _lookup_files(paths):
+    """The given files, and the media files under the given folders."""
+    from src.scanner.file_walker import FileWalker
+
+    walker = FileWalker()
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for file_path, _, _, _ in walker.walk(path):
+                yield file_path
+        else:
+            yield path
+
+
+def cmd_lookup(db, args):
+    """Tell which files' content the catalog already holds (e.g. "is this backed up?"), by full hash."""
+    from concurrent.futures import ThreadPoolExecutor
+    from src.utils.hash_index import HashIndex
+    from src.utils.hash_utils import generate_hash
+
+    try:
+        if args.index and os.path.exists(args.index) and not args.rebuild_index:
+            index = HashIndex.load(args.index, args.hash_algorithm)
+        else:
+            index = HashIndex.from_db(db, args.hash_algorithm, args.within)
+            if args.index:
+                index.save(args.index)
+    except (OSError, ValueError) as e:
+        print(f"Could not open the hash index {args.index}: {e} (--rebuild-index replaces it)", file=sys.stderr)
+        return EXIT_USAGE
+    print(f"{len(index)} catalogued hashes ({index.nbytes / 1e6:.1f} MB index)", file=sys.stderr)
+    out = OutputWriter(args.format, ["status", "file_path"])
+    counts = {"present": 0, "missing": 0, "unreadable": 0}
+    files = _lookup_files(args.paths)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        while True:
+            batch = list(islice(files, LOOKUP_BATCH))
+            if not batch:
+                break
+            hashes = list(executor.map(lambda file_path: generate_hash(file_path, args.hash_algorithm), batch))
+            for file_path, hash_value, found in zip(batch, hashes, index.contains(hashes)):
+                status = "unreadable" if hash_value is None else "present" if found else "missing"
+                counts[status] += 1
+                if not (args.missing and status == "present"):
+                    out.write({"status": status, "file_path": file_path})
+    out.close()
+    print(f"{counts['present']} present, {counts['missing']} missing, {counts['unreadable']} unreadable", file=sys.stderr)
+    return EXIT_ERRORS if counts["unreadable"] else EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="media_exif_scanner", description="Scan and deduplicate media files.")
+    parser.add_argument("--db-url", default="sqlite:///media_files.db", help="SQLAlchemy database URL")
+    parser.add_argument("--format", choices=("text", "json", "csv"), default="text", help="output format")
+    parser.add_argument("--hash-algorithm", choices=available_algorithms(), default=DEFAULT_ALGORITHM,
+                        help="content hash algorithm (stored hashes made with another one are recomputed)")
+    parser.add_argument("--host-id", default="",
+                        help="name of this host in a sharded setup; rows written are tagged with it (default: none)")
+    parser.add_argument("--hash-cache", action="store_true",
+                        help="keep content hashes with the files (extended attribute, else a sidecar file per "
+                             "folder) and reuse them while size and mtime match")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="scan folders into the catalog")
+    scan.add_argument("paths", nargs="+", help="folders to scan")
+    scan.add_argument("--hash-workers", type=int, default=4)
+    scan.add_argument("--exif-workers", type=int, default=4)
+    scan.add_argument("--exif-processes", type=int, default=0, help="process pool size for EXIF parsing (0: threads only)")
+    scan.add_argument("--queue-size", type=int, default=256)
+    scan.add_argument("--batch-size", type=int, default=1000, help="rows per database transaction")
+    scan.add_argument("--disk-limit", action="append", metavar="PATH=N", help="max concurrent reads for a scanned folder")
+    scan.add_argument("--exclude", action="append", metavar="GLOB",
+                      help="skip files and folders whose name or path matches (repeatable)")
+    scan.add_argument("--include-hidden", action="store_true", help="also scan hidden and system files and folders")
+    scan.add_argument("--follow-symlinks", action="store_true", help="descend into symlinked folders (loops are detected)")
+    scan.add_argument("--full-hash", action="store_true",
+                      help="fully hash every file (for shards: a merged catalog cannot read other hosts' files)")
+    scan.add_argument("--progress", action="store_true", help="print progress to stderr")
+    scan.add_argument("--metrics", action="store_true", help="print per-stage timings to stderr when done")
+    scan.add_argument("--metrics-file", help="stream metrics to this file while scanning")
+    scan.add_argument("--metrics-format", choices=("jsonl", "prometheus"), default="jsonl",
+                      help="JSON lines, or a node_exporter textfile (write it into the collector directory)")
+    scan.add_argument("--slow-threshold", type=float, default=2.0, help="log files taking longer than this (seconds)")
+    scan.add_argument("--profile", metavar="PATH", help="cProfile the workers and save pstats here (SIGUSR1 toggles)")
+    scan.add_argument("--trace-memory", action="store_true", help="record top allocations with tracemalloc (SIGUSR2 toggles)")
+    scan.set_defaults(func=cmd_scan)
+
+    dedupe = commands.add_parser("dedupe", help="list duplicate groups")
+    dedupe.add_argument("--path", help="only consider files under this folder")
+    dedupe.add_argument("--similar", action="store_true", help="group near-duplicate images by perceptual hash")
+    dedupe.add_argument("--threshold", type=int, default=8, help="max differing perceptual hash bits (--similar)")
+    _add_metadata_filters(dedupe)
+    dedupe.set_defaults(func=cmd_dedupe)
+
+    report = commands.add_parser("report", help="summarize the catalog")
+    report.add_argument("--path", help="only consider files under this folder")
+    report.add_argument("--by", choices=("disk", "camera"), default="disk", help="group the totals by disk or camera")
+    _add_metadata_filters(report)
+    report.set_defaults(func=cmd_report)
+
+    purge = commands.add_parser("purge", help="set aside all but one copy of each duplicate")
+    purge.add_argument("--action", choices=("move", "quarantine", "hardlink", "reflink"),
+                       help="what to do with each duplicate (default: move with --dest, quarantine without)")
+    purge.add_argument("--dest", help="folder receiving moved duplicates, under their original directory structure")
+    purge.add_argument("--quarantine-dir", help="quarantine folder (default: one at the root of each filesystem)")
+    purge.add_argument("--path", help="only consider files under this folder")
+    purge.add_argument("--keep", metavar="RULES", type=_keeper_rules,
+                       help="pick keepers by rules, in order, e.g. resolution,earliest,prefer:/mnt/disk1,metadata,"
+                            "shortest-path (default: the first copy by path)")
+    purge.add_argument("--include-ambiguous", action="store_true",
+                       help="with --keep, also purge groups no rule decided, keeping the first tied copy by path")
+    purge.add_argument("--workers", type=int, default=4, help="duplicate groups processed in parallel")
+    purge.add_argument("--journal", help="undo journal to write (default: ~/.media_exif_scanner/purge_journals/)")
+    purge.add_argument("--undo", metavar="JOURNAL", help="restore the files recorded in a purge journal")
+    purge.add_argument("--dry-run", action="store_true", help="report what would be done and the bytes reclaimed")
+    purge.set_defaults(func=cmd_purge)
+
+    sync = commands.add_parser("sync", help="copy content missing from a target folder (compared by hash)")
+    sync.add_argument("source", help="scanned folder to copy from")
+    sync.add_argument("target", help="folder to copy into (scan it first so existing content is known)")
+    sync.add_argument("--layout", choices=("source", "date"), default="source",
+                      help="mirror the source folders, or file copies under YYYY/MM from the capture date")
+    sync.add_argument("--workers", type=int, default=4, help="parallel transfers")
+    sync.add_argument("--dry-run", action="store_true", help="only report what would be copied")
+    sync.set_defaults(func=cmd_sync)
+
+    merge = commands.add_parser("merge", help="merge shard catalogs from other hosts into --db-url")
+    merge.add_argument("shards", nargs="+", help="shard SQLite files (e.g. copied from each host)")
+    merge.add_argument("--host", help="host for shard rows without one (default: the shard file name); one shard only")
+    merge.add_argument("--full", action="store_true", help="copy every row again instead of only the changed ones")
+    merge.set_defaults(func=cmd_merge)
+
+    lookup = commands.add_parser("lookup", help="check whether files' content is already catalogued (e.g. backed up)")
+    lookup.add_argument("paths", nargs="+", help="files or folders to check; they need not be catalogued")
+    lookup.add_argument("--in", dest="within", metavar="FOLDER",
+                        help="only count catalogued copies under this folder (files need full hashes: scan it with "
+                             "--full-hash)")
+    lookup.add_argument("--index", metavar="FILE",
+                        help="hash index file: memory-mapped if it exists, else built from the catalog and saved here")
+    lookup.add_argument("--rebuild-index", action="store_true", help="rebuild --index from the catalog")
+    lookup.add_argument("--missing", action="store_true", help="only list files whose content is missing")
+    lookup.add_argument("--workers", type=int, default=4, help="files hashed in parallel")
+    lookup.set_defaults(func=cmd_lookup)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.hash_cache:
+        from src.utils.hash_cache import HashCache
+        set_hash_cache(HashCache())
+    try:
+        db = DBManager(args.db_url, host=args.host_id)
+        return args.func(db, args)
+    except argparse.ArgumentTypeError as e:
+        parser.print_usage(sys.stderr)
+        print(f"{parser.prog}: error: {e}", file=sys.stderr)
+        return EXIT_USAGE
@@ -1,10 +1,52 @@
-from sqlalchemy import create_engine, Column, String, Integer, JSON, distinct
+from sqlalchemy import (create_engine, event, inspect, text, insert, update, delete, bindparam, and_, or_, func,
+                        select, case, cast, Column, Index, String, Integer, BigInteger, Float, DateTime, JSON, distinct)
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import time
+
+from src.utils.metadata_fields import METADATA_COLUMNS, metadata_columns, parse_period
 
 Base = declarative_base()
 
+
+def _now_ns():
+    return time.time_ns()
+
+
+def _file_identity():
+    """SQL expression naming the file behind a row: rows of one host sharing device and inode are hard links."""
+    return func.coalesce(
+        MediaFile.host + ":" + cast(MediaFile.device, String) + ":" + cast(MediaFile.inode, String),
+        MediaFile.file_path
+    )
+
+
+def _under(path):
+    """
+    SQL condition matching files under the folder path, as a range on
+    file_path so the path index serves it. Unlike LIKE it is case-sensitive
+    and takes '_' and '%' literally; the bound swaps the trailing separator
+    for the next character, which sorts after every path in the folder.
+    """
+    prefix = os.path.join(path, "")
+    return and_(MediaFile.file_path >= prefix, MediaFile.file_path < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def _one_row_per_file(rows):
+    """Keep one row per file in a duplicate group: hard links to a file already listed are dropped, preferring the copy not purged."""
+    kept = {}
+    for row in rows:
+        if row.get("device") is not None and row.get("inode") is not None:
+            key = (row.get("host"), row["device"], row["inode"])
+        else:
+            key = row["file_path"]
+        if key not in kept or (kept[key]["is_duplicate"] and not row["is_duplicate"]):
+            kept[key] = row
+    return list(kept.values())
+
+
 class MediaFile(Base):
     __tablename__ = 'media_files'
     
@@ -13,8 +55,40 @@ class MediaFile(Base):
     file_name = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
     exif_data = Column(JSON, nullable=True)
-    hash_value = Column(String, nullable=False)
+    hash_value = Column(String, nullable=True)  # Full hash, filled in lazily by DuplicateFinder
     is_duplicate = Column(Integer, default=0)  # 0: No, 1: Yes
+    size = Column(BigInteger, nullable=True)
+    partial_hash = Column(String, nullable=True)  # Hash of the first and last few MB
+    mtime_ns = Column(BigInteger, nullable=True)
+    inode = Column(BigInteger, nullable=True)
+    device = Column(BigInteger, nullable=True)
+    perceptual_hash = Column(BigInteger, nullable=True)  # 64-bit dHash of images, for near-duplicates
+    hash_algorithm = Column(String, nullable=True)  # Algorithm behind partial_hash and hash_value
+    # Typed copies of exif_data fields (see metadata_fields.metadata_columns), kept in sync on every write
+    taken_at = Column(DateTime, nullable=True)  # Capture time as recorded by the camera (no time zone)
+    camera_make = Column(String, nullable=True)
+    camera_model = Column(String, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    orientation = Column(Integer, nullable=True)  # EXIF orientation, 1-8
+    latitude = Column(Float, nullable=True)  # Decimal degrees, negative south / west
+    longitude = Column(Float, nullable=True)
+    duration = Column(Float, nullable=True)  # Seconds, videos only
+    host = Column(String, nullable=False, default="", server_default="")  # Scanning host; "" for this machine
+    updated_ns = Column(BigInteger, nullable=True, default=_now_ns, onupdate=_now_ns)  # Last write, for merges
+
+    __table_args__ = (
+        # Paths are unique per host; a merged catalog holds the same path from several hosts
+        Index("ix_media_files_file_path_host", "file_path", "host", unique=True),
+        Index("ix_media_files_updated_ns", "updated_ns"),
+        Index("ix_media_files_hash_value", "hash_value"),
+        Index("ix_media_files_disk_name", "disk_name"),
+        Index("ix_media_files_size_partial_hash", "size", "partial_hash"),
+        Index("ix_media_files_taken_at", "taken_at"),
+        # Serves camera lookups alone and "this camera in that period" as one range scan
+        Index("ix_media_files_camera_taken_at", "camera_make", "camera_model", "taken_at"),
+        Index("ix_media_files_latitude_longitude", "latitude", "longitude"),
+    )
 
     def to_dict(self):
         return {
@@ -23,23 +97,300 @@ class MediaFile(Base):
             "file_path": self.file_path,
             "exif_data": self.exif_data,
             "hash_value": self.hash_value,
-            "is_duplicate": self.is_duplicate
+            "is_duplicate": self.is_duplicate,
+            "size": self.size,
+            "partial_hash": self.partial_hash,
+            "mtime_ns": self.mtime_ns,
+            "inode": self.inode,
+            "device": self.device,
+            "perceptual_hash": self.perceptual_hash,
+            "hash_algorithm": self.hash_algorithm,
+            **{name: getattr(self, name) for name in METADATA_COLUMNS},
+            "host": self.host
         }
 
+
+class ShardMerge(Base):
+    """How far each shard has been merged into this catalog (see DBManager.merge_shard)."""
+    __tablename__ = 'shard_merges'
+
+    shard = Column(String, primary_key=True)
+    last_updated_ns = Column(BigInteger, nullable=False, default=0)  # Newest shard row copied, on the shard's clock
+    merged_ns = Column(BigInteger, nullable=True)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the scan's writer; NORMAL sync fsyncs per checkpoint, not per commit."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+def with_metadata_columns(fields):
+    """fields plus the typed metadata columns when it sets exif_data and does not carry them already."""
+    if "exif_data" not in fields or "taken_at" in fields:
+        return fields
+    return dict(fields, **metadata_columns(fields["exif_data"]))
+
+
+class BatchWriter:
+    """
+    Collects inserts, updates and deletes and writes them in batches.
+
+    Each flush runs in one transaction using Core executemany statements, in
+    the order inserts, updates, deletes. Use as a context manager so pending
+    rows are flushed on exit:
+
+        with db.batch_writer() as batch:
+            batch.add(disk_name=..., file_name=..., file_path=..., exif_data=...)
+
+    on_flush(rows, seconds), if given, is called after each committed batch.
+    A flush that fails is not kept queued: its rows are retried one per
+    transaction, and each row that still fails is passed to
+    on_error(file_path, error) (the database driver's error) and counted in
+    failed. Without on_error the
+    error is raised once the batch has been dropped.
+    Rows are written, matched and deleted as belonging to host.
+    """
+
+    def __init__(self, engine, batch_size=1000, on_flush=None, host="", on_error=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self.host = host
+        self.failed = 0
+        table = MediaFile.__table__
+        # updated_ns is left out so its column default stamps each row
+        self._row_defaults = {column.name: None for column in table.columns if column.name not in ("id", "updated_ns")}
+        self._row_defaults["is_duplicate"] = 0
+        self._row_defaults["host"] = host
+        self._inserts = []
+        self._updates = {}  # sorted field names -> [params]
+        self._deletes = []
+        self._pending = 0
+
+    def add(self, **fields):
+        """Queue a new media_files row."""
+        self._inserts.append(dict(self._row_defaults, **with_metadata_columns(fields)))
+        self._count()
+
+    def update(self, file_path, /, **fields):
+        """Queue an update of the given columns for the row stored at file_path."""
+        fields = with_metadata_columns(fields)
+        # Bind names must not clash with column names in an UPDATE
+        params = {f"_new_{field}": value for field, value in fields.items()}
+        params["_match_path"] = file_path
+        self._updates.setdefault(tuple(sorted(fields)), []).append(params)
+        self._count()
+
+    def delete(self, file_paths):
+        """Queue the removal of the rows for the given file paths."""
+        self._deletes.extend(file_paths)
+        self._count()
+
+    def flush(self):
+        """Write everything queued so far in a single transaction."""
+        if not self._pending:
+            return
+        # Take the batch off the queue first, so a failing row cannot fail every later flush
+        inserts, updates, deletes, pending = self._inserts, self._updates, self._deletes, self._pending
+        self._inserts, self._updates, self._deletes, self._pending = [], {}, [], 0
+        start = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                self._execute(conn, inserts, updates, deletes)
+        except SQLAlchemyError as e:
+            if self.on_error is None:
+                self.failed += pending
+                raise
+            pending = self._write_rows(inserts, updates, deletes)
+        if self.on_flush and pending:
+            self.on_flush(pending, time.perf_counter() - start)
+
+    def _execute(self, conn, inserts, updates, deletes):
+        table = MediaFile.__table__
+        if inserts:
+            conn.execute(insert(table), inserts)
+        for fields, params in updates.items():
+            stmt = (
+                update(table)
+                .where(table.c.file_path == bindparam("_match_path"), table.c.host == self.host)
+                .values({field: bindparam(f"_new_{field}") for field in fields})
+            )
+            conn.execute(stmt, params)
+        for i in range(0, len(deletes), 500):
+            conn.execute(delete(table).where(table.c.file_path.in_(deletes[i:i + 500]), table.c.host == self.host))
+
+    def _write_rows(self, inserts, updates, deletes):
+        """Retry a failed batch one row per transaction, reporting the rows that fail; returns the rows written."""
+        rows = [(row["file_path"], ([row], {}, [])) for row in inserts]
+        rows += [(params["_match_path"], ([], {fields: [params]}, []))
+                 for fields, group in updates.items() for params in group]
+        rows += [(file_path, ([], {}, [file_path])) for file_path in deletes]
+        written = 0
+        for i, (file_path, row) in enumerate(rows):
+            try:
+                with self.engine.begin() as conn:
+                    self._execute(conn, *row)
+                written += 1
+            except OperationalError as e:
+                # Locked, read-only or unreachable: the remaining rows would each wait and fail the same way
+                for file_path, _ in rows[i:]:
+                    self.failed += 1
+                    self.on_error(file_path, getattr(e, "orig", None) or e)
+                break
+            except SQLAlchemyError as e:
+                self.failed += 1
+                self.on_error(file_path, getattr(e, "orig", None) or e)
+        return written
+
+    def _count(self):
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
 class DBManager:
-    def __init__(self, db_url='sqlite:///media_files.db'):
+    """
+    Catalog access. host names the machine this catalog writes for: rows
+    added here carry it, and everything keyed by file path (updates,
+    deletes, change detection) only touches that host's rows, so a merged
+    catalog holding other hosts' files (see merge_shard) never mistakes them
+    for local ones. "" stands for this machine.
+    """
+
+    def __init__(self, db_url='sqlite:///media_files.db', host=""):
+        self.host = host
         self.engine = create_engine(db_url)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _set_sqlite_pragmas)
         Base.metadata.create_all(self.engine)
+        self._migrate_schema()
         self.Session = sessionmaker(bind=self.engine)
 
-    def add_media_file(self, disk_name, file_name, file_path, exif_data, hash_value):
+    def _migrate_schema(self):
+        """
+        Bring a media_files table created by an older version up to date.
+
+        Missing columns and indexes are added in place. Older tables declared
+        hash_value NOT NULL, which SQLite cannot relax with ALTER, so those are
+        rebuilt. Rows repeating a file_path are dropped (keeping the first) so
+        the unique path index can be built. Hashes stored before the algorithm
+        was recorded were always SHA-256. The typed metadata columns are
+        backfilled from exif_data in the same transaction, before their
+        indexes are built. Indexes the model no longer declares (such as the
+        old unique index on file_path alone) are dropped.
+        """
+        table = MediaFile.__table__
+        inspector = inspect(self.engine)
+        existing = {col["name"]: col for col in inspector.get_columns(table.name)}
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        rebuild = not existing["hash_value"]["nullable"]
+        with self.engine.begin() as conn:
+            if rebuild:
+                old_columns = ", ".join(name for name in existing)
+                conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+                table.create(conn)
+                conn.execute(text(
+                    f"INSERT INTO {table.name} ({old_columns}) SELECT {old_columns} FROM {table.name}_old "
+                    f"WHERE id IN (SELECT MIN(id) FROM {table.name}_old GROUP BY file_path)"
+                ))
+                conn.execute(text(f"DROP TABLE {table.name}_old"))
+            else:
+                for column in table.columns:
+                    if column.name not in existing:
+                        col_type = column.type.compile(dialect=self.engine.dialect)
+                        if column.server_default is not None:
+                            # SQLite only adds a NOT NULL column together with a default
+                            col_type += f" NOT NULL DEFAULT '{column.server_default.arg}'"
+                        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            if "hash_algorithm" not in existing:
+                conn.execute(text(
+                    f"UPDATE {table.name} SET hash_algorithm = 'sha256' "
+                    f"WHERE partial_hash IS NOT NULL OR hash_value IS NOT NULL"
+                ))
+            if "taken_at" not in existing:
+                self._backfill_metadata(conn)
+            if "updated_ns" not in existing:
+                conn.execute(text(f"UPDATE {table.name} SET updated_ns = :now"), {"now": _now_ns()})
+            if rebuild:
+                # table.create() already built every index
+                return
+            declared = {index.name for index in table.indexes}
+            for name in existing_indexes:
+                if name and name.startswith(f"ix_{table.name}_") and name not in declared:
+                    conn.execute(text(f"DROP INDEX {name}"))
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if index.unique:
+                    key = ", ".join(column.name for column in index.columns)
+                    conn.execute(text(
+                        f"DELETE FROM {table.name} WHERE id NOT IN "
+                        f"(SELECT MIN(id) FROM {table.name} GROUP BY {key})"
+                    ))
+                index.create(conn)
+
+    def _backfill_metadata(self, conn, batch_size=1000):
+        """Fill the typed metadata columns of existing rows from their exif_data, one keyset page at a time."""
+        table = MediaFile.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("_match_id"))
+            .values({name: bindparam(f"_new_{name}") for name in METADATA_COLUMNS})
+        )
+        after_id = 0
+        while True:
+            rows = conn.execute(
+                select(table.c.id, table.c.exif_data)
+                .where(table.c.id > after_id, table.c.exif_data.isnot(None))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            params = []
+            for row in rows:
+                values = metadata_columns(row.exif_data)
+                if any(value is not None for value in values.values()):
+                    params.append(dict({f"_new_{name}": value for name, value in values.items()}, _match_id=row.id))
+            if params:
+                conn.execute(stmt, params)
+            after_id = rows[-1].id
+
+    def batch_writer(self, batch_size=1000, on_flush=None, on_error=None):
+        """
+        Returns a BatchWriter for bulk ingestion; use it as a context manager.
+        """
+        return BatchWriter(self.engine, batch_size, on_flush, self.host, on_error)
+
+    def add_media_file(self, disk_name, file_name, file_path, exif_data, hash_value=None, size=None, partial_hash=None,
+                       mtime_ns=None, inode=None, device=None, perceptual_hash=None, hash_algorithm=None):
         session = self.Session()
         media_file = MediaFile(
             disk_name=os.path.splitdrive(file_path)[0],
             file_name=file_name,
             file_path=file_path,
+            host=self.host,
             exif_data=exif_data,
-            hash_value=hash_value
+            hash_value=hash_value,
+            size=size,
+            partial_hash=partial_hash,
+            mtime_ns=mtime_ns,
+            inode=inode,
+            device=device,
+            perceptual_hash=perceptual_hash,
+            hash_algorithm=hash_algorithm,
+            **metadata_columns(exif_data)
         )
         session.add(media_file)
         session.commit()
@@ -57,6 +408,362 @@ class DBManager:
         session.commit()
         session.close()
 
+    def _host_scope(self):
+        """Filter condition limiting a query to the rows this catalog writes for."""
+        return [MediaFile.host == self.host]
+
+    def is_local(self, record):
+        """True if a file dict belongs to this catalog's host, i.e. its path can be opened here."""
+        return record.get("host", self.host) == self.host
+
+    def _path_scope(self, path_prefix):
+        """Filter conditions limiting a query to files under path_prefix (no filter for None)."""
+        if not path_prefix:
+            return []
+        return [_under(path_prefix)]
+
+    def metadata_filters(self, taken_from=None, taken_to=None, camera_make=None, camera_model=None, has_gps=None,
+                         min_width=None, min_height=None, orientation=None, within=None):
+        """
+        Filter conditions on the typed metadata columns, for the filters=
+        argument of the listing, duplicate and summary queries. Criteria left
+        as None are not applied.
+
+        taken_from / taken_to take a date, datetime or "YYYY", "YYYY-MM",
+        "YYYY-MM-DD" string and include the whole period given (taken_to="2019"
+        runs to the end of 2019); files without a capture time never match a
+        date bound. Make and model match exactly, as listed by
+        get_camera_summary(). within is (south, west, north, east) in decimal
+        degrees and may cross the antimeridian.
+        """
+        conditions = []
+        if taken_from:
+            conditions.append(MediaFile.taken_at >= parse_period(taken_from)[0])
+        if taken_to:
+            conditions.append(MediaFile.taken_at < parse_period(taken_to)[1])
+        if camera_make:
+            conditions.append(MediaFile.camera_make == camera_make)
+        if camera_model:
+            conditions.append(MediaFile.camera_model == camera_model)
+        if has_gps is not None:
+            conditions.append(MediaFile.latitude.isnot(None) if has_gps else MediaFile.latitude.is_(None))
+        if min_width:
+            conditions.append(MediaFile.width >= min_width)
+        if min_height:
+            conditions.append(MediaFile.height >= min_height)
+        if orientation:
+            conditions.append(MediaFile.orientation == orientation)
+        if within:
+            south, west, north, east = within
+            conditions.append(MediaFile.latitude.between(south, north))
+            if west <= east:
+                conditions.append(MediaFile.longitude.between(west, east))
+            else:
+                conditions.append(or_(MediaFile.longitude >= west, MediaFile.longitude <= east))
+        return conditions
+
+    def _select_columns(self, columns, include_exif):
+        names = list(columns) if columns else [name for name in MediaFile.__table__.columns.keys() if name != "exif_data"]
+        if include_exif and "exif_data" not in names:
+            names.append("exif_data")
+        if "id" not in names:
+            names.insert(0, "id")
+        return [getattr(MediaFile, name) for name in names]
+
+    def get_files_page(self, columns=None, path_prefix=None, after_id=0, limit=100, include_exif=False, filters=()):
+        """
+        Returns (rows, last_id) for one keyset page of files with id > after_id.
+
+        rows are dicts of the requested column names (all columns except
+        exif_data by default). Pass last_id back as after_id for the next page;
+        rows is empty once the end is reached.
+        """
+        session = self.Session()
+        try:
+            rows = (
+                session.query(*self._select_columns(columns, include_exif))
+                .filter(MediaFile.id > after_id, *self._path_scope(path_prefix), *filters)
+                .order_by(MediaFile.id)
+                .limit(limit)
+                .all()
+            )
+            rows = [dict(row._mapping) for row in rows]
+            return rows, (rows[-1]["id"] if rows else after_id)
+        finally:
+            session.close()
+
+    def iter_files(self, columns=None, path_prefix=None, include_exif=False, batch_size=1000, filters=()):
+        """
+        Yields file dicts one keyset page at a time, so memory stays constant.
+
+        Each page is read in its own short transaction, which keeps SQLite
+        free for writers between pages.
+        """
+        after_id = 0
+        while True:
+            rows, after_id = self.get_files_page(columns, path_prefix, after_id, batch_size, include_exif, filters)
+            if not rows:
+                return
+            yield from rows
+
+    def get_duplicate_candidates(self, path_prefix=None, filters=()):
+        """
+        Returns size/hash columns for files that may be duplicates but are not
+        confirmed yet: files in size buckets that still lack partial hashes, and
+        files in buckets where a shared partial hash still lacks full hashes.
+        Feed these to DuplicateFinder.find_duplicates() to fill in the hashes.
+        Only this host's files are returned, as only they can be read here;
+        the buckets still count every host's files.
+        """
+        scope = self._path_scope(path_prefix) + list(filters)
+        session = self.Session()
+        try:
+            unpartialed_sizes = (
+                session.query(MediaFile.size)
+                .filter(MediaFile.size.isnot(None), *scope)
+                .group_by(MediaFile.size)
+                .having(func.count() > 1)
+                .having(func.count(MediaFile.partial_hash) < func.count())
+            )
+            unconfirmed_sizes = (
+                session.query(MediaFile.size)
+                .filter(MediaFile.partial_hash.isnot(None), *scope)
+                .group_by(MediaFile.size, MediaFile.partial_hash)
+                .having(func.count() > 1)
+                .having(func.count(MediaFile.hash_value) < func.count())
+            )
+            rows = (
+                session.query(MediaFile.file_path, MediaFile.size, MediaFile.partial_hash, MediaFile.hash_value,
+                              MediaFile.hash_algorithm)
+                .filter(or_(MediaFile.size.in_(unpartialed_sizes), MediaFile.size.in_(unconfirmed_sizes)), *scope,
+                        *self._host_scope())
+                .all()
+            )
+            return [dict(row._mapping) for row in rows]
+        finally:
+            session.close()
+
+    def iter_perceptual_hashes(self, path_prefix=None, filters=()):
+        """
+        Yields (id, perceptual_hash) for every image that has a perceptual hash.
+        """
+        rows = self.iter_files(
+            columns=("perceptual_hash",), path_prefix=path_prefix,
+            filters=(MediaFile.perceptual_hash.isnot(None), *filters), batch_size=5000
+        )
+        for row in rows:
+            yield row["id"], row["perceptual_hash"]
+
+    def iter_hash_values(self, algorithm, path_prefix=None, batch_size=50000, filters=()):
+        """
+        Yields lists of full hashes made with algorithm, one keyset page at a
+        time, as plain column tuples (no ORM objects). Purged copies are left
+        out: their content lives on in the kept file.
+        """
+        query = (
+            select(MediaFile.id, MediaFile.hash_value)
+            .where(MediaFile.hash_value.isnot(None), MediaFile.hash_algorithm == algorithm,
+                   MediaFile.is_duplicate == 0, *self._path_scope(path_prefix), *filters)
+            .order_by(MediaFile.id)
+            .limit(batch_size)
+        )
+        after_id = 0
+        while True:
+            with self.engine.connect() as conn:
+                rows = conn.execute(query.where(MediaFile.id > after_id)).all()
+            if not rows:
+                return
+            after_id = rows[-1][0]
+            yield [row[1] for row in rows]
+
+    def get_files_by_ids(self, ids, columns=None):
+        """
+        Returns {id: file dict} for the given row ids, loading only the requested columns (no EXIF by default).
+        """
+        ids = list(ids)
+        selected = self._select_columns(columns, include_exif=False)
+        session = self.Session()
+        try:
+            files = {}
+            for i in range(0, len(ids), 500):
+                rows = session.query(*selected).filter(MediaFile.id.in_(ids[i:i + 500])).all()
+                files.update((row.id, dict(row._mapping)) for row in rows)
+            return files
+        finally:
+            session.close()
+
+    def get_disk_summary(self, path_prefix=None, filters=()):
+        """
+        Returns per-disk totals: disk_name, files, total_bytes and images with a perceptual hash.
+        """
+        session = self.Session()
+        try:
+            rows = (
+                session.query(
+                    MediaFile.disk_name,
+                    func.count().label("files"),
+                    func.coalesce(func.sum(MediaFile.size), 0).label("total_bytes"),
+                    func.count(MediaFile.perceptual_hash).label("images_with_phash"),
+                )
+                .filter(*self._path_scope(path_prefix), *filters)
+                .group_by(MediaFile.disk_name)
+                .order_by(MediaFile.disk_name)
+                .all()
+            )
+            return [dict(row._mapping) for row in rows]
+        finally:
+            session.close()
+
+    def get_camera_summary(self, path_prefix=None, filters=()):
+        """
+        Returns per-camera totals: camera_make, camera_model, files, total_bytes
+        and the first_taken / last_taken capture times. Files without camera
+        tags are counted under None.
+        """
+        session = self.Session()
+        try:
+            rows = (
+                session.query(
+                    MediaFile.camera_make,
+                    MediaFile.camera_model,
+                    func.count().label("files"),
+                    func.coalesce(func.sum(MediaFile.size), 0).label("total_bytes"),
+                    func.min(MediaFile.taken_at).label("first_taken"),
+                    func.max(MediaFile.taken_at).label("last_taken"),
+                )
+                .filter(*self._path_scope(path_prefix), *filters)
+                .group_by(MediaFile.camera_make, MediaFile.camera_model)
+                .order_by(func.count().desc())
+                .all()
+            )
+            return [dict(row._mapping) for row in rows]
+        finally:
+            session.close()
+
+    def get_reclaimable_bytes(self, path_prefix=None, filters=()):
+        """
+        Returns bytes that removing all but one copy of every confirmed duplicate would free.
+        """
+        session = self.Session()
+        try:
+            # Hard links share their data, and copies already purged freed (or linked) theirs
+            live_files = func.count(distinct(case((MediaFile.is_duplicate == 0, _file_identity()))))
+            groups = (
+                session.query(
+                    (func.max(MediaFile.size) * (live_files - 1)).label("extra_bytes")
+                )
+                .filter(MediaFile.hash_value.isnot(None), *self._path_scope(path_prefix), *filters)
+                .group_by(MediaFile.hash_value)
+                .having(live_files > 1)
+                .subquery()
+            )
+            return session.query(func.coalesce(func.sum(groups.c.extra_bytes), 0)).scalar()
+        finally:
+            session.close()
+
+    def count_duplicate_groups(self, path_prefix=None, filters=()):
+        """
+        Returns the number of full hashes shared by more than one file (hard links of one file count once).
+        """
+        session = self.Session()
+        try:
+            groups = (
+                session.query(MediaFile.hash_value)
+                .filter(MediaFile.hash_value.isnot(None), *self._path_scope(path_prefix), *filters)
+                .group_by(MediaFile.hash_value)
+                .having(func.count(distinct(_file_identity())) > 1)
+                .subquery()
+            )
+            return session.query(func.count()).select_from(groups).scalar()
+        finally:
+            session.close()
+
+    def find_duplicate_groups(self, path_prefix=None, limit=10, offset=0, filters=()):
+        """
+        Returns one page of duplicate groups (files sharing a full hash), grouped
+        and paged in SQL. Each group is a list of dicts holding only the columns
+        the dedupe view and its keeper rules need; EXIF is not loaded. filters (e.g. from
+        metadata_filters()) restrict which files count towards a group. Hard
+        links of a file already in a group (e.g. copies purged into links)
+        are left out.
+        """
+        scope = self._path_scope(path_prefix) + list(filters)
+        session = self.Session()
+        try:
+            page_hashes = (
+                session.query(MediaFile.hash_value)
+                .filter(MediaFile.hash_value.isnot(None), *scope)
+                .group_by(MediaFile.hash_value)
+                .having(func.count(distinct(_file_identity())) > 1)
+                .order_by(MediaFile.hash_value)
+                .limit(limit)
+                .offset(offset)
+                .subquery()
+            )
+            rows = (
+                session.query(MediaFile.file_name, MediaFile.file_path, MediaFile.hash_value,
+                              MediaFile.is_duplicate, MediaFile.size, MediaFile.host, MediaFile.device, MediaFile.inode,
+                              *[getattr(MediaFile, name) for name in METADATA_COLUMNS])
+                .filter(MediaFile.hash_value.in_(select(page_hashes.c.hash_value)), *scope)
+                .order_by(MediaFile.hash_value, MediaFile.file_path)
+                .all()
+            )
+            groups = []
+            for row in rows:
+                if not groups or groups[-1][0]["hash_value"] != row.hash_value:
+                    groups.append([])
+                groups[-1].append(dict(row._mapping))
+            return [_one_row_per_file(group) for group in groups]
+        finally:
+            session.close()
+
+    def iter_duplicate_groups(self, path_prefix=None, include_exif=False, page_size=500, filters=()):
+        """
+        Yields every duplicate group in one pass, paging by hash_value (keyset)
+        so each page is a short read and memory stays bounded. Groups carry id,
+        disk_name, file_name, file_path, hash_value, is_duplicate, size,
+        mtime_ns, host, device, inode and the typed metadata columns (what
+        KeeperPolicy reads), plus exif_data with include_exif.
+        Hard links of a file already in a group are left out.
+        """
+        scope = self._path_scope(path_prefix) + list(filters)
+        columns = [MediaFile.id, MediaFile.disk_name, MediaFile.file_name, MediaFile.file_path, MediaFile.hash_value,
+                   MediaFile.is_duplicate, MediaFile.size, MediaFile.mtime_ns, MediaFile.host, MediaFile.device,
+                   MediaFile.inode] + [getattr(MediaFile, name) for name in METADATA_COLUMNS]
+        if include_exif:
+            columns.append(MediaFile.exif_data)
+        last_hash = ""
+        while True:
+            session = self.Session()
+            try:
+                page_hashes = (
+                    session.query(MediaFile.hash_value)
+                    .filter(MediaFile.hash_value > last_hash, *scope)
+                    .group_by(MediaFile.hash_value)
+                    .having(func.count(distinct(_file_identity())) > 1)
+                    .order_by(MediaFile.hash_value)
+                    .limit(page_size)
+                    .subquery()
+                )
+                rows = (
+                    session.query(*columns)
+                    .filter(MediaFile.hash_value.in_(select(page_hashes.c.hash_value)), *scope)
+                    .order_by(MediaFile.hash_value, MediaFile.file_path)
+                    .all()
+                )
+            finally:
+                session.close()
+            if not rows:
+                return
+            group = []
+            for row in rows:
+                if group and group[0]["hash_value"] != row.hash_value:
+                    yield _one_row_per_file(group)
+                    group = []
+                group.append(dict(row._mapping))
+            yield _one_row_per_file(group)
+            last_hash = rows[-1].hash_value
+
     def get_all_paths(self):
         """
         Returns a list of all unique file paths (folders) that have been scanned.
@@ -72,42 +779,233 @@ class DBManager:
 
     def get_all_files(self):
         """
-        Returns all file metadata as a list of dicts.
+        Returns all file metadata as a list of dicts. Prefer iter_files() for large catalogs.
+        """
+        return list(self.iter_files(include_exif=True))
+
+    def get_files_by_path(self, path):
+        """
+        Returns all file metadata for a given folder path. Prefer iter_files(path_prefix=...) for large catalogs.
+        """
+        return list(self.iter_files(path_prefix=path, include_exif=True))
+
+    def get_file_states(self, path):
+        """
+        Returns {file_path: state} for every file stored under a folder, where state
+        holds only the stat and hash columns needed to detect changes (no EXIF).
         """
+        columns = (MediaFile.file_path, MediaFile.size, MediaFile.mtime_ns, MediaFile.inode,
+                   MediaFile.device, MediaFile.partial_hash, MediaFile.hash_value, MediaFile.hash_algorithm,
+                   MediaFile.is_duplicate)
         session = self.Session()
         try:
-            files = session.query(MediaFile).all()
-            return [f.to_dict() for f in files]
+            rows = session.query(*columns).filter(_under(path), *self._host_scope())
+            return {row.file_path: dict(row._mapping) for row in rows}
         finally:
             session.close()
 
-    def get_files_by_path(self, path):
+    def delete_files(self, file_paths):
+        """
+        Removes the rows for the given file paths.
+        """
+        file_paths = list(file_paths)
+        session = self.Session()
+        try:
+            for i in range(0, len(file_paths), 500):
+                chunk = file_paths[i:i + 500]
+                session.query(MediaFile).filter(MediaFile.file_path.in_(chunk), *self._host_scope()).delete(
+                    synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def get_unhashed_size_collisions(self, paths, algorithm=None):
+        """
+        Returns (file_path, size, hash_algorithm) for files under the given
+        folders that have no partial hash yet (or, if algorithm is given, one
+        computed with another algorithm) but share their size with another
+        stored file.
+        """
+        unhashed = [MediaFile.partial_hash.is_(None)]
+        if algorithm:
+            unhashed.append(MediaFile.hash_algorithm != algorithm)
+        session = self.Session()
+        try:
+            shared_sizes = (
+                session.query(MediaFile.size)
+                .filter(MediaFile.size.isnot(None))
+                .group_by(MediaFile.size)
+                .having(func.count() > 1)
+            )
+            rows = (
+                session.query(MediaFile.file_path, MediaFile.size, MediaFile.hash_algorithm)
+                .filter(or_(*unhashed), *self._host_scope())
+                .filter(MediaFile.size.in_(shared_sizes))
+                .filter(or_(*[_under(path) for path in paths]))
+                .all()
+            )
+            return [tuple(row) for row in rows]
+        finally:
+            session.close()
+
+    def get_unhashed_files(self, paths, algorithm=None):
+        """
+        Returns (file_path, size, hash_algorithm) for this host's files under
+        the given folders that have no full hash yet (or, if algorithm is
+        given, one computed with another algorithm), whatever their size.
+        """
+        unhashed = [MediaFile.hash_value.is_(None)]
+        if algorithm:
+            unhashed.append(MediaFile.hash_algorithm != algorithm)
+        session = self.Session()
+        try:
+            rows = (
+                session.query(MediaFile.file_path, MediaFile.size, MediaFile.hash_algorithm)
+                .filter(or_(*unhashed), *self._host_scope())
+                .filter(or_(*[_under(path) for path in paths]))
+                .all()
+            )
+            return [tuple(row) for row in rows]
+        finally:
+            session.close()
+
+    def merge_shard(self, shard_path, host=None, full=False):
+        """
+        Copy the rows a shard catalog (a SQLite file written by a scan on
+        another host) added or changed since its last merge into this one.
+
+        The shard is attached and merged with bulk INSERT ... SELECT upserts in
+        one transaction. Rows are keyed by (file_path, host); shard rows
+        without a host are filed under host, by default the shard's file name
+        without extension, which also names the shard's merge watermark.
+        Conflict rules, so merging is deterministic and repeatable:
+          - the shard's row replaces the catalog's, keeping the catalog's id;
+          - except that when the shard has no hashes for a file whose size
+            and mtime are unchanged, the catalog keeps the hashes it has;
+          - catalog rows of the shard's hosts whose path is gone from the
+            shard are deleted.
+        Only shard rows whose updated_ns is newer than the watermark are
+        copied; full=True copies everything again. Returns {shard, host,
+        copied, deleted, last_updated_ns}.
         """
-        Returns all file metadata for a given folder path.
+        if self.engine.dialect.name != "sqlite":
+            raise ValueError("Merging shards needs a SQLite catalog")
+        shard_path = os.path.abspath(shard_path)
+        if not os.path.isfile(shard_path):
+            raise FileNotFoundError(f"No shard catalog at {shard_path}")
+        name = host or os.path.splitext(os.path.basename(shard_path))[0]
+        # Bring an older shard up to the current schema before reading it
+        DBManager(f"sqlite:///{shard_path}").engine.dispose()
+
+        table = MediaFile.__table__
+        columns = [column.name for column in table.columns if column.name not in ("id", "host", "updated_ns")]
+        hash_columns = ("partial_hash", "hash_value", "hash_algorithm")
+        unchanged = f"{table.name}.size IS excluded.size AND {table.name}.mtime_ns IS excluded.mtime_ns"
+        no_shard_hashes = "excluded.partial_hash IS NULL AND excluded.hash_value IS NULL"
+        assignments = []
+        for column in columns:
+            if column in hash_columns:
+                value = (f"CASE WHEN {no_shard_hashes} AND {unchanged} "
+                         f"THEN {table.name}.{column} ELSE excluded.{column} END")
+            elif column == "perceptual_hash":
+                value = f"COALESCE(excluded.{column}, CASE WHEN {unchanged} THEN {table.name}.{column} END)"
+            else:
+                value = f"excluded.{column}"
+            assignments.append(f"{column} = {value}")
+        assignments.append("updated_ns = excluded.updated_ns")
+        shard_host = "CASE WHEN s.host = '' THEN :name ELSE s.host END"
+        upsert = text(
+            f"INSERT INTO {table.name} ({', '.join(columns)}, host, updated_ns) "
+            f"SELECT {', '.join(f's.{column}' for column in columns)}, {shard_host}, :now "
+            f"FROM shard.{table.name} AS s WHERE s.updated_ns > :mark "
+            f"ON CONFLICT (file_path, host) DO UPDATE SET {', '.join(assignments)}"
+        )
+        prune = text(
+            f"DELETE FROM {table.name} WHERE host IN (SELECT DISTINCT {shard_host} FROM shard.{table.name} AS s) "
+            f"AND NOT EXISTS (SELECT 1 FROM shard.{table.name} AS s "
+            f"WHERE s.file_path = {table.name}.file_path AND {shard_host} = {table.name}.host)"
+        )
+
+        with self.engine.connect() as conn:
+            # ATTACH cannot run inside a transaction
+            conn.execute(text("ATTACH DATABASE :path AS shard"), {"path": shard_path})
+            try:
+                with conn.begin():
+                    state = conn.execute(
+                        select(ShardMerge.last_updated_ns).where(ShardMerge.shard == name)
+                    ).scalar()
+                    mark = 0 if full or state is None else state
+                    newest = conn.execute(
+                        text(f"SELECT MAX(updated_ns) FROM shard.{table.name} WHERE updated_ns > :mark"), {"mark": mark}
+                    ).scalar()
+                    copied = conn.execute(upsert, {"name": name, "now": _now_ns(), "mark": mark}).rowcount
+                    deleted = conn.execute(prune, {"name": name}).rowcount
+                    mark = max(mark, newest or 0)
+                    values = {"last_updated_ns": mark, "merged_ns": _now_ns()}
+                    if state is None:
+                        conn.execute(insert(ShardMerge.__table__).values(shard=name, **values))
+                    else:
+                        conn.execute(update(ShardMerge.__table__).where(ShardMerge.shard == name).values(**values))
+            finally:
+                conn.execute(text("DETACH DATABASE shard"))
+        return {"shard": shard_path, "host": name, "copied": copied, "deleted": deleted, "last_updated_ns": mark}
+
+    def get_files_by_content(self, size, hash_value):
+        """
+        Returns file metadata for files of the given size whose partial or full hash matches.
         """
         session = self.Session()
         try:
-            files = session.query(MediaFile).filter(MediaFile.file_path.like(f"{path}%")).all()
+            files = (
+                session.query(MediaFile)
+                .filter(MediaFile.size == size, *self._host_scope())
+                .filter(or_(MediaFile.partial_hash == hash_value, MediaFile.hash_value == hash_value))
+                .all()
+            )
             return [f.to_dict() for f in files]
         finally:
             session.close()
 
-    def add_file_with_exif(self, disk_name, file_name, file_path, mime_type, hash_value):
+    def update_file_fields(self, file_path, /, **fields):
+        """
+        Updates the given columns (e.g. size, partial_hash, hash_value, or file_path
+        itself for a move) for a stored file. New exif_data refreshes the typed
+        metadata columns too.
+        """
+        session = self.Session()
+        try:
+            session.query(MediaFile).filter_by(file_path=file_path, host=self.host).update(with_metadata_columns(fields))
+            session.commit()
+        finally:
+            session.close()
+
+    def add_file_with_exif(self, disk_name, file_name, file_path, mime_type, hash_value, hash_algorithm='sha256'):
         """
         Adds a media file to the database, extracting and cleaning EXIF data if the file is an image.
         """
+        # Imported here so headless DB users (e.g. the CLI) don't load Pillow
+        from src.utils.exif_utils import extract_exif_data, clean_exif_data
+        from src.utils.video_meta import read_video_metadata
+
         session = self.Session()
         try:
-            # Only extract EXIF data for image files
-            exif_data = extract_exif_data(file_path) if mime_type and mime_type.startswith('image/') else {}
-            exif_data = clean_exif_data(exif_data)
+            # Only extract EXIF data for image files; videos get their container metadata
+            if mime_type and mime_type.startswith('image/'):
+                exif_data = clean_exif_data(extract_exif_data(file_path))
+            elif mime_type and mime_type.startswith('video/'):
+                exif_data = read_video_metadata(file_path) or {}
+            else:
+                exif_data = {}
             
             media_file = MediaFile(
                 disk_name=os.path.splitdrive(file_path)[0],
                 file_name=file_name,
                 file_path=file_path,
+                host=self.host,
                 exif_data=exif_data,
-                hash_value=hash_value
+                hash_value=hash_value,
+                hash_algorithm=hash_algorithm if hash_value else None,
+                **metadata_columns(exif_data)
             )
             session.add(media_file)
             session.commit()
@@ -120,18 +1018,18 @@ class DBManager:
     def mark_as_duplicate(self, file_path):
         session = self.Session()
         try:
-            file = session.query(MediaFile).filter_by(file_path=file_path).first()
+            file = session.query(MediaFile).filter_by(file_path=file_path, host=self.host).first()
             if file:
                 file.is_duplicate = True
                 session.commit()
         finally:
             session.close()
 
-    def file_exists(self, file_path, hash_value):
+    def file_exists(self, file_path, hash_value=None):
         session = self.Session()
         try:
             # Check by file_path or hash_value (choose one or both as needed)
-            exists = session.query(MediaFile).filter_by(file_path=file_path).first() is not None
+            exists = session.query(MediaFile).filter_by(file_path=file_path, host=self.host).first() is not None
             # Or, to check by hash: (uncomment if you want to skip by hash too)
             # exists = session.query(MediaFile).filter_by(hash_value=hash_value).first() is not None
             return exists
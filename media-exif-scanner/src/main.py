@@ -1,13 +1,15 @@
 import os
 import sys
-from PyQt5.QtWidgets import QApplication
-from ui.app_ui import AppUI
+from tkinter import Tk
+
+# Ensure the project root is in sys.path so src.* imports resolve
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.ui.app_ui import AppUI
 
 def main():
-    app = QApplication(sys.argv)
-    window = AppUI()
-    window.show()
-    sys.exit(app.exec_())
+    root = Tk()
+    window = AppUI(root)
+    root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
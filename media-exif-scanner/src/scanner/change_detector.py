@@ -0,0 +1,102 @@
+import os
+
+from src.utils.hash_utils import is_fully_covered
+
+# Outcomes of ChangeDetector.classify()
+NEW = "new"
+MODIFIED = "modified"
+MOVED = "moved"
+UNCHANGED = "unchanged"
+
+# Columns compared to decide whether a stored file is unchanged
+STAT_FIELDS = ("size", "mtime_ns", "inode", "device")
+
+
+def stat_fields(st):
+    """Return the stat-derived columns stored for every media file."""
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "inode": st.st_ino or None,
+        "device": st.st_dev or None,
+    }
+
+
+class ChangeDetector:
+    """
+    Compares a fresh walk of a folder against the rows already stored for it.
+
+    stored maps file_path to a record with size, mtime_ns, inode, device,
+    partial_hash and hash_value (see DBManager.get_file_states). A file whose
+    (size, mtime_ns, inode, device) still match is unchanged and needs no
+    further I/O. A new path carrying the stat signature of a stored row whose
+    path has vanished is a move/rename. Rows never seen are reported as missing
+    once the walk is over.
+    """
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.seen = set()
+        self.moves = {}  # new file_path -> stored record it was moved from
+        self._inode_index = None
+        self._links = None
+
+    def classify(self, file_path, st):
+        """Return NEW, MODIFIED, MOVED or UNCHANGED for a walked file and its os.stat result."""
+        self.seen.add(file_path)
+        current = stat_fields(st)
+        record = self.stored.get(file_path)
+        if record is None:
+            old = self._moved_from(current)
+            if old is None:
+                return NEW
+            self.moves[file_path] = old
+            return MOVED
+        if all(record.get(key) == current[key] for key in STAT_FIELDS):
+            return UNCHANGED
+        return MODIFIED
+
+    def hard_link_of(self, file_path, st):
+        """Another stored row for the same file (device and inode) as the walked file_path, or None."""
+        if not st.st_ino:
+            return None
+        if self._links is None:
+            self._links = {}
+            for record in self.stored.values():
+                if record.get("inode") is not None:
+                    self._links.setdefault((record.get("device"), record["inode"]), []).append(record)
+        for record in self._links.get((st.st_dev or None, st.st_ino), ()):
+            if record["file_path"] != file_path:
+                return record
+        return None
+
+    def missing(self):
+        """Stored rows whose file was neither seen during the walk nor matched as a move."""
+        moved = {record["file_path"] for record in self.moves.values()}
+        return [record for path, record in self.stored.items() if path not in self.seen and path not in moved]
+
+    def _moved_from(self, current):
+        if current["inode"] is None:
+            return None
+        if self._inode_index is None:
+            self._inode_index = {
+                (record.get("device"), record["inode"]): record
+                for record in self.stored.values() if record.get("inode") is not None
+            }
+        old = self._inode_index.get((current["device"], current["inode"]))
+        if old is None or old["size"] != current["size"] or old.get("mtime_ns") != current["mtime_ns"]:
+            return None
+        # A hardlink is not a move: the old path must really be gone
+        if old["file_path"] in self.seen or os.path.lexists(old["file_path"]):
+            return None
+        del self._inode_index[(current["device"], current["inode"])]
+        return old
+
+
+def content_key(record):
+    """(size, hash) key identifying a file's content, or None if it has no usable hash."""
+    if record.get("partial_hash"):
+        return (record["size"], record["partial_hash"])
+    if record.get("hash_value") and is_fully_covered(record.get("size")):
+        return (record["size"], record["hash_value"])
+    return None
@@ -0,0 +1,110 @@
+import os
+from functools import partial
+
+from src.utils.hash_utils import DEFAULT_ALGORITHM, generate_hash, generate_partial_hash, is_fully_covered
+
+
+class DuplicateFinder:
+    """
+    Staged duplicate detection: size buckets, then partial hashes, then full hashes.
+
+    Works on file records (dicts with at least 'file_path', plus optional
+    'size', 'partial_hash' and 'hash_value'). Missing values are computed only
+    when a record shares its bucket with another record, written back onto the
+    record, and reported through on_update(record, field) so callers can persist
+    them.
+
+    Hashes are computed with algorithm, which is recorded in the record's
+    'hash_algorithm' field; stored hashes made with a different algorithm are
+    recomputed.
+    """
+
+    def __init__(self, on_update=None, partial_hasher=None, full_hasher=None, algorithm=DEFAULT_ALGORITHM):
+        self.on_update = on_update
+        self.algorithm = algorithm
+        self.partial_hasher = partial_hasher or partial(generate_partial_hash, algorithm=algorithm)
+        self.full_hasher = full_hasher or partial(generate_hash, algorithm=algorithm)
+
+    def group_by_size(self, records):
+        """Return lists of records sharing a file size; unique sizes are dropped."""
+        buckets = {}
+        for record in records:
+            size = self._size(record)
+            if size is not None:
+                buckets.setdefault(size, []).append(record)
+        return [group for group in buckets.values() if len(group) > 1]
+
+    def candidate_groups(self, records):
+        """Yield groups of records whose size and partial hash both match."""
+        for size_group in self.group_by_size(records):
+            yield from self._split(size_group, self._partial_hash)
+
+    def confirm_group(self, group):
+        """Full-hash the members of a candidate group and yield the confirmed duplicate groups."""
+        yield from self._split(group, self._full_hash)
+
+    def find_duplicates(self, records):
+        """Yield confirmed duplicate groups, hashing as little as possible."""
+        for group in self.candidate_groups(records):
+            yield from self.confirm_group(group)
+
+    def confirm_all(self, records):
+        """Compute the hashes needed to confirm every duplicate group; returns the number of groups found."""
+        return sum(1 for _ in self.find_duplicates(records))
+
+    def assign_partial_hashes(self, records):
+        """Compute partial hashes only for records whose size collides with another record."""
+        for size_group in self.group_by_size(records):
+            for record in size_group:
+                self._partial_hash(record)
+
+    def _split(self, group, key_func):
+        buckets = {}
+        for record in group:
+            key = key_func(record)
+            if key is not None:
+                buckets.setdefault(key, []).append(record)
+        for bucket in buckets.values():
+            if len(bucket) > 1:
+                yield bucket
+
+    def _size(self, record):
+        if record.get("size") is None:
+            try:
+                self._set(record, "size", os.path.getsize(record["file_path"]))
+            except OSError:
+                return None
+        return record["size"]
+
+    def _partial_hash(self, record):
+        self._check_algorithm(record)
+        if not record.get("partial_hash"):
+            self._set(record, "partial_hash", self.partial_hasher(record["file_path"]))
+        return record["partial_hash"]
+
+    def _full_hash(self, record):
+        self._check_algorithm(record)
+        if not record.get("hash_value"):
+            if is_fully_covered(record.get("size")) and record.get("partial_hash"):
+                value = record["partial_hash"]
+            else:
+                value = self.full_hasher(record["file_path"])
+            self._set(record, "hash_value", value)
+        return record["hash_value"]
+
+    def _check_algorithm(self, record):
+        """Drop hashes made with another algorithm and claim the record for ours."""
+        if record.get("hash_algorithm") == self.algorithm:
+            return
+        if record.get("hash_algorithm") is not None:
+            for field in ("partial_hash", "hash_value"):
+                if record.get(field):
+                    record[field] = None
+                    if self.on_update:
+                        self.on_update(record, field)
+        self._set(record, "hash_algorithm", self.algorithm)
+
+    def _set(self, record, field, value):
+        record[field] = value
+        if value is not None and self.on_update:
+            self.on_update(record, field)
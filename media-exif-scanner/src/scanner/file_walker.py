@@ -0,0 +1,142 @@
+import fnmatch
+import mimetypes
+import os
+import re
+import stat
+import time
+
+IMAGE = "image"
+VIDEO = "video"
+
+# Camera formats missing from some platforms' MIME tables
+_EXTRA_EXTENSIONS = {
+    ".heic": IMAGE, ".heif": IMAGE, ".avif": IMAGE, ".dng": IMAGE, ".nef": IMAGE, ".cr2": IMAGE, ".arw": IMAGE,
+    ".3gp": VIDEO, ".m4v": VIDEO, ".mts": VIDEO, ".m2ts": VIDEO, ".mkv": VIDEO, ".webm": VIDEO,
+}
+
+
+def _build_extension_kinds():
+    mimetypes.init()
+    kinds = {}
+    for types_map in (mimetypes.types_map, mimetypes.common_types):
+        for extension, mime_type in types_map.items():
+            if mime_type.startswith("image/"):
+                kinds[extension.lower()] = IMAGE
+            elif mime_type.startswith("video/"):
+                kinds[extension.lower()] = VIDEO
+    kinds.update(_EXTRA_EXTENSIONS)
+    return kinds
+
+
+# Lower-case extension -> IMAGE / VIDEO, built once instead of a guess_type() call per file
+EXTENSION_KINDS = _build_extension_kinds()
+
+# Directories that never hold user media: OS metadata, trash, thumbnail caches and our purge quarantine
+DEFAULT_EXCLUDED_DIRS = frozenset(name.lower() for name in (
+    "$RECYCLE.BIN", "System Volume Information", "lost+found", "__MACOSX",
+    ".Trashes", ".Trash", ".Spotlight-V100", ".fseventsd", ".DocumentRevisions-V100", ".TemporaryItems",
+    "@eaDir", ".thumbnails", ".thumbs", ".thumbnail", ".cache", ".dtrash",
+    ".media_exif_scanner_quarantine",
+))
+# A directory holding one of these files asks media scanners to skip it (Android convention)
+NO_MEDIA_MARKERS = frozenset((".nomedia",))
+
+# Windows-only: DirEntry.stat() there is free and carries the file attributes
+_HIDDEN_ATTRIBUTES = stat.FILE_ATTRIBUTE_HIDDEN | stat.FILE_ATTRIBUTE_SYSTEM if os.name == "nt" else 0
+
+
+def media_kind(file_name):
+    """Return IMAGE, VIDEO or None for a file name, from its extension."""
+    return EXTENSION_KINDS.get(os.path.splitext(file_name)[1].lower())
+
+
+class FileWalker:
+    """
+    Iterative os.scandir walker yielding only media files.
+
+    walk(root) yields (file_path, file_name, kind, stat_result) using the
+    DirEntry's cached stat, so callers never stat a file a second time.
+    Hidden and system entries (dot names, or the Windows hidden/system
+    attributes), DEFAULT_EXCLUDED_DIRS, directories containing a .nomedia
+    file, and anything whose name or full path matches one of the exclude
+    globs are skipped. Symlinks are not followed unless follow_symlinks is
+    set, in which case each directory is entered at most once (by device and
+    inode), so symlink loops terminate.
+    """
+
+    def __init__(self, exclude=(), skip_hidden=True, follow_symlinks=False, excluded_dirs=DEFAULT_EXCLUDED_DIRS,
+                 on_error=None, metrics=None):
+        self.skip_hidden = skip_hidden
+        self.follow_symlinks = follow_symlinks
+        self.excluded_dirs = excluded_dirs
+        self.on_error = on_error if on_error is not None else self._print_error
+        self.metrics = metrics
+        patterns = [fnmatch.translate(os.path.normcase(pattern)) for pattern in exclude]
+        self._exclude = re.compile("|".join(patterns)) if patterns else None
+
+    def walk(self, root):
+        visited = set()
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            start = time.perf_counter()
+            entries = self._list(directory, visited)
+            if self.metrics:
+                self.metrics.observe("walk", time.perf_counter() - start)
+                self.metrics.count("dirs_walked")
+                self.metrics.count("files_walked", len(entries))
+            for entry in entries:
+                if self._excluded(entry):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                        if entry.name.lower() not in self.excluded_dirs:
+                            stack.append(entry.path)
+                        continue
+                    kind = media_kind(entry.name)
+                    if kind is None or not entry.is_file(follow_symlinks=self.follow_symlinks):
+                        continue
+                    st = entry.stat(follow_symlinks=self.follow_symlinks)
+                    if not st.st_ino:
+                        # Windows DirEntry stats carry no inode/device; those drive change detection
+                        st = os.stat(entry.path, follow_symlinks=self.follow_symlinks)
+                except OSError as e:
+                    self.on_error(entry.path, e)
+                    continue
+                yield entry.path, entry.name, kind, st
+
+    def _list(self, directory, visited):
+        """Return the entries of directory, or [] if it was already visited, unreadable or opted out."""
+        try:
+            if self.follow_symlinks:
+                st = os.stat(directory)
+                key = (st.st_dev, st.st_ino)
+                if key in visited:
+                    return []
+                visited.add(key)
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError as e:
+            self.on_error(directory, e)
+            return []
+        if any(entry.name in NO_MEDIA_MARKERS for entry in entries):
+            return []
+        return entries
+
+    def _excluded(self, entry):
+        if self.skip_hidden:
+            if entry.name.startswith("."):
+                return True
+            if _HIDDEN_ATTRIBUTES:
+                try:
+                    if entry.stat(follow_symlinks=False).st_file_attributes & _HIDDEN_ATTRIBUTES:
+                        return True
+                except OSError:
+                    pass
+        if self._exclude is not None:
+            return bool(self._exclude.match(os.path.normcase(entry.name))
+                        or self._exclude.match(os.path.normcase(entry.path)))
+        return False
+
+    def _print_error(self, path, error):
+        print(f"Error reading {path}: {error}")
@@ -0,0 +1,110 @@
+import os
+
+from src.utils.metadata_fields import METADATA_COLUMNS, metadata_columns
+
+# Rule names accepted by parse_rules(); "prefer:<disk or folder>" may be given several times
+RULE_NAMES = ("resolution", "earliest", "prefer", "metadata", "shortest-path")
+DEFAULT_RULES = "resolution,earliest,metadata,shortest-path"
+
+# Sorts after every real value: files missing the information never win a rule
+_UNKNOWN = (1,)
+
+
+def _metadata(record, column):
+    """A typed metadata column of a record, parsed from its exif_data only when the column is NULL or not loaded."""
+    value = record.get(column)
+    if value is None and record.get("exif_data"):
+        value = metadata_columns(record["exif_data"])[column]
+    return value
+
+
+def resolution_key(record):
+    width, height = _metadata(record, "width"), _metadata(record, "height")
+    return (0, -width * height) if width and height else _UNKNOWN
+
+
+def earliest_key(record):
+    taken_at = _metadata(record, "taken_at")
+    return (0, taken_at) if taken_at else _UNKNOWN
+
+
+def metadata_key(record):
+    exif_data = record.get("exif_data")
+    if exif_data:
+        return -sum(1 for value in exif_data.values() if value not in (None, "", b"", {}, []))
+    # Rows loaded without their EXIF: count the typed columns kept from it
+    return -sum(1 for column in METADATA_COLUMNS if record.get(column) is not None)
+
+
+def shortest_path_key(record):
+    return len(record["file_path"])
+
+
+def prefer_key(prefix):
+    folder = os.path.join(prefix, "")
+
+    def key(record):
+        on_disk = record.get("disk_name") and record["disk_name"].lower() == prefix.lower()
+        return 0 if on_disk or record["file_path"].startswith(folder) else 1
+    return key
+
+
+_RULES = {
+    "resolution": resolution_key,
+    "earliest": earliest_key,
+    "metadata": metadata_key,
+    "shortest-path": shortest_path_key,
+}
+
+
+def parse_rules(spec):
+    """Turn "resolution,prefer:/mnt/disk1,shortest-path" into a list of (name, key function)."""
+    rules = []
+    for name in filter(None, (part.strip() for part in spec.split(","))):
+        if name.startswith("prefer:") and len(name) > len("prefer:"):
+            rules.append((name, prefer_key(name[len("prefer:"):])))
+        elif name in _RULES:
+            rules.append((name, _RULES[name]))
+        else:
+            raise ValueError(f"Unknown keeper rule {name!r}; expected one of {', '.join(RULE_NAMES)}")
+    return rules
+
+
+class KeeperPolicy:
+    """
+    Picks the file to keep in each duplicate group by applying rules in order.
+
+    Each rule maps a file record to a sort key (lower wins); only the files
+    tied for the best key go on to the next rule. When a single file is left
+    the group is decided by that rule; when files are still tied after the
+    last rule the group is ambiguous and the first of them (by path) is only
+    a suggestion for review. Files already purged (is_duplicate) are neither
+    kept nor purged again.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = parse_rules(rules) if isinstance(rules, str) else list(rules)
+
+    def choose(self, group):
+        """Return {"keeper", "duplicates", "ambiguous", "rule"} for a group, or None if nothing is left to purge."""
+        live = sorted((f for f in group if not f.get("is_duplicate")), key=lambda f: f["file_path"])
+        if len(live) < 2:
+            return None
+        candidates, rule = live, None
+        for name, key in self.rules:
+            scores = [key(f) for f in candidates]
+            best = min(scores)
+            candidates = [f for f, score in zip(candidates, scores) if score == best]
+            if len(candidates) == 1:
+                rule = name
+                break
+        keeper = candidates[0]
+        return {"keeper": keeper, "duplicates": [f for f in live if f is not keeper],
+                "ambiguous": rule is None, "rule": rule}
+
+    def decide_all(self, groups):
+        """Yield a decision per group as groups stream in (e.g. from DBManager.iter_duplicate_groups)."""
+        for group in groups:
+            decision = self.choose(group)
+            if decision is not None:
+                yield decision
@@ -1,40 +1,136 @@
+import asyncio
 import os
-import hashlib
+from collections import deque
 from PIL import Image
 from PIL.ExifTags import TAGS
-import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+
+from src.scanner.duplicate_finder import DuplicateFinder
+from src.scanner.change_detector import stat_fields
+from src.scanner.file_walker import FileWalker, IMAGE, VIDEO, media_kind
+from src.types.media_file import MediaFile
+from src.utils.exif_header import read_exif_header
+from src.utils.exif_utils import clean_exif_data
+from src.utils.hash_utils import DEFAULT_ALGORITHM, generate_hash
+from src.utils.metadata_fields import metadata_columns
+from src.utils.phash_utils import perceptual_hash
+from src.utils.video_meta import read_video_metadata
 
 class MediaScanner:
-    def __init__(self, paths):
+    """
+    Walks folders and reads each media file's EXIF / video metadata and perceptual hash.
+
+    iter_media() streams MediaFile records as they are parsed, and
+    aiter_media() does the same for asyncio code; scan_media() collects every
+    file into self.media_files instead.
+    """
+
+    def __init__(self, paths, workers=4, hash_algorithm=DEFAULT_ALGORITHM, exclude=(), skip_hidden=True,
+                 follow_symlinks=False):
         self.paths = paths
+        self.workers = workers
+        self.hash_algorithm = hash_algorithm
+        self.walker = FileWalker(exclude, skip_hidden=skip_hidden, follow_symlinks=follow_symlinks)
         self.media_files = []
+        self.skipped = 0
+
+    def iter_media(self):
+        """
+        Yield a MediaFile per media file under self.paths, in walk order, as soon as it is parsed.
+
+        EXIF parsing runs in a pool of `workers` threads with at most
+        workers * 4 files in flight, so memory stays constant however large
+        the tree is and the first record arrives after one file's work.
+        Records carry no content hashes; hashing is left to the consumer
+        (DuplicateFinder, or the database and ScanEngine). A file that cannot
+        be parsed is reported, counted in self.skipped and left out, like
+        ScanEngine skips it.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        try:
+            for path in self.paths:
+                if not os.path.exists(path):
+                    continue
+                # The walker only yields media files, with their stat; EXIF parsing runs in the pool
+                for entry in self.walker.walk(path):
+                    pending.append(executor.submit(self._build_record, path, *entry))
+                    if len(pending) >= self.workers * 4:
+                        yield from self._finished(pending.popleft())
+                while pending:
+                    yield from self._finished(pending.popleft())
+        finally:
+            # A consumer that stops early only waits for the files already being parsed
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    async def aiter_media(self):
+        """
+        Async iterator over the same records as iter_media(); the walk and
+        parsing run in threads, so the event loop is never blocked by them.
+        """
+        loop = asyncio.get_running_loop()
+        records = self.iter_media()
+        done = object()
+        # A single thread steps the generator, which must not be resumed concurrently
+        pump = ThreadPoolExecutor(max_workers=1)
+        try:
+            while True:
+                record = await loop.run_in_executor(pump, next, records, done)
+                if record is done:
+                    return
+                yield record
+        finally:
+            # Closing the generator waits for the files being parsed, so it runs on the pump
+            # thread (after any next() still in progress there), never on the event loop
+            pump.submit(records.close)
+            pump.shutdown(wait=False)
 
     def scan_media(self):
-        for path in self.paths:
-            if os.path.exists(path):
-                for root, dirs, files in os.walk(path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        if self.is_image(file_path) or self.is_video(file_path):
-                            exif_data = self.extract_exif(file_path) if self.is_image(file_path) else {}
-                            hash_value = self.calculate_hash(file_path)
-                            self.media_files.append({
-                                'disk_name': os.path.splitdrive(path)[0],
-                                'file_name': file,
-                                'file_path': file_path,
-                                'exif_data': exif_data,
-                                'hash_value': hash_value
-                            })
+        """Collect a dict per media file into self.media_files; prefer iter_media() for large trees."""
+        self.media_files.extend(record.to_dict() for record in self.iter_media())
+        # Only files sharing a size with another file get a partial hash;
+        # full hashes are left to DuplicateFinder.confirm_group().
+        DuplicateFinder(algorithm=self.hash_algorithm).assign_partial_hashes(self.media_files)
+
+    def _build_record(self, path, file_path, file_name, kind, st):
+        try:
+            return self._parse_file(path, file_path, file_name, kind, st)
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            return None
+
+    def _finished(self, future):
+        """Yield the record a parse produced; a file that failed is only counted."""
+        record = future.result()
+        if record is None:
+            self.skipped += 1
+        else:
+            yield record
+
+    def _parse_file(self, path, file_path, file_name, kind, st):
+        if kind == IMAGE:
+            exif_data = self.extract_exif(file_path)
+        else:
+            exif_data = read_video_metadata(file_path) or {}
+        return MediaFile(
+            os.path.splitdrive(path)[0], file_name, file_path, exif_data,
+            perceptual_hash=perceptual_hash(file_path) if kind == IMAGE else None,
+            **stat_fields(st),
+            **metadata_columns(exif_data)
+        )
 
     def is_image(self, file_path):
-        mime_type, _ = mimetypes.guess_type(file_path)
-        return mime_type and mime_type.startswith('image/')
+        return media_kind(file_path) == IMAGE
 
     def is_video(self, file_path):
-        mime_type, _ = mimetypes.guess_type(file_path)
-        return mime_type and mime_type.startswith('video/')
+        return media_kind(file_path) == VIDEO
 
     def extract_exif(self, file_path):
+        exif_data = read_exif_header(file_path)
+        if exif_data is not None:
+            return exif_data
         exif_data = {}
         try:
             image = Image.open(file_path)
@@ -46,11 +142,9 @@ class MediaScanner:
                         exif_data[tag] = value
         except Exception as e:
             print(f"Error extracting EXIF data from {file_path}: {e}")
-        return exif_data
+        # Pillow hands back IFDRational, bytes and nested tuples; the header reader's output is JSON-safe already
+        return clean_exif_data(exif_data)
 
     def calculate_hash(self, file_path):
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
\ No newline at end of file
+        # Same hasher as the scan engine, so hashes from both scanners compare equal
+        return generate_hash(file_path, self.hash_algorithm)
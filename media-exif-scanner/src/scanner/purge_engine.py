@@ -0,0 +1,282 @@
+import errno
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from src.utils.hash_utils import DEFAULT_ALGORITHM, generate_hash
+
+MOVE = "move"
+QUARANTINE = "quarantine"
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+ACTIONS = (MOVE, QUARANTINE, HARDLINK, REFLINK)
+
+# Linux ioctl cloning a whole file's extents (Btrfs, XFS, bcachefs, OCFS2)
+FICLONE = 0x40049409
+
+QUARANTINE_DIR_NAME = ".media_exif_scanner_quarantine"
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".media_exif_scanner", "purge_journals")
+FALLBACK_QUARANTINE_DIR = os.path.join(os.path.expanduser("~"), ".media_exif_scanner", "quarantine")
+
+
+class PurgeError(Exception):
+    """A duplicate that was left untouched, with the reason why."""
+
+
+def mount_point(path):
+    """Return the root of the filesystem holding path."""
+    path = os.path.realpath(path)
+    device = os.stat(path).st_dev
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path or os.stat(parent).st_dev != device:
+            return path
+        path = parent
+
+
+def relocated_path(root, file_path):
+    """file_path re-rooted under root, keeping its full directory structure (C:\\x\\y -> root/C/x/y)."""
+    drive, rest = os.path.splitdrive(os.path.abspath(file_path))
+    parts = [drive.rstrip(":\\/").replace(":", "")] if drive else []
+    return os.path.join(root, *parts, rest.lstrip("\\/"))
+
+
+def _tmp_path(path):
+    # Dot-prefixed so a scan running meanwhile skips it
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.purge-tmp")
+
+
+def _free_path(path):
+    """path, or path with a ' (n)' suffix if something already lives there."""
+    base, ext = os.path.splitext(path)
+    n = 1
+    while os.path.lexists(path):
+        path = f"{base} ({n}){ext}"
+        n += 1
+    return path
+
+
+def reflink(src, dst):
+    """Create dst as a copy-on-write clone of src (FICLONE); raises OSError where unsupported."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError as e:
+            if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV):
+                raise OSError(e.errno, f"reflinks are not supported here ({e.strerror})") from e
+            raise
+
+
+class PurgeEngine:
+    """
+    Removes duplicate copies from the scanned folders, one job per group.
+
+    Actions:
+      move       - relocate the duplicate under dest, keeping its directory
+                   structure (an atomic rename on the same filesystem,
+                   otherwise copy, verify, then unlink);
+      quarantine - move it into a quarantine folder at the root of its own
+                   filesystem (a rename), to be emptied later; where that
+                   root is not writable, into ~/.media_exif_scanner/quarantine
+                   instead, which on another filesystem is copy, verify,
+                   then unlink like move;
+      hardlink   - replace it with a hard link to the kept file;
+      reflink    - replace it with a copy-on-write clone of the kept file.
+
+    Groups are processed in parallel by a thread pool. Unless verify is off
+    (allowed for move/quarantine only, e.g. for similar images), the kept
+    file and each duplicate are fully hashed first and a duplicate is left
+    alone if it does not match. Every completed step is appended to a JSON
+    lines journal that undo() replays backwards. A dry run touches nothing
+    and reports the bytes each job would reclaim.
+
+    run() yields one result dict per duplicate: action, status ("done",
+    "dry-run", "linked" for a copy already hard-linked to the kept file,
+    "skipped", "failed"), file_path, kept, dest, size, reclaimed and error.
+    """
+
+    def __init__(self, action=QUARANTINE, dest=None, workers=4, algorithm=DEFAULT_ALGORITHM, verify=True,
+                 dry_run=False, journal_path=None, quarantine_dir=None):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown purge action {action!r}; expected one of {', '.join(ACTIONS)}")
+        if action == MOVE and not dest:
+            raise ValueError("The move action needs a destination folder")
+        self.action = action
+        self.dest = dest
+        self.workers = workers
+        self.algorithm = algorithm
+        # Replacing a file by a link to another is only safe for identical content
+        self.verify = verify or action in (HARDLINK, REFLINK)
+        self.dry_run = dry_run
+        self.run_id = time.strftime("%Y%m%d-%H%M%S")
+        self.journal_path = None if dry_run else journal_path or os.path.join(DEFAULT_JOURNAL_DIR, f"{self.run_id}.jsonl")
+        self.quarantine_dir = quarantine_dir
+        self._journal_lock = threading.Lock()
+
+    def run(self, groups):
+        """
+        Purge an iterable of (keeper, duplicates) pairs of file dicts; yields
+        results as jobs finish. groups is consumed lazily, a few jobs ahead of
+        the workers, so it can stream straight from the database.
+        """
+        if self.journal_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+        groups = iter(groups)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            while True:
+                for keeper, duplicates in islice(groups, self.workers * 4 - len(pending)):
+                    pending.add(executor.submit(self._purge_group, keeper, duplicates))
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+
+    def undo(self, journal_path=None):
+        """Reverse the steps recorded in a journal, newest first; yields results with status "restored" or "failed"."""
+        journal_path = journal_path or self.journal_path
+        with open(journal_path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        for entry in reversed(entries):
+            result = {"action": entry["action"], "file_path": entry["file_path"], "kept": entry["kept"],
+                      "dest": entry.get("dest"), "size": entry.get("size"), "reclaimed": 0, "error": None}
+            try:
+                if entry["action"] in (MOVE, QUARANTINE):
+                    if os.path.lexists(entry["file_path"]):
+                        raise PurgeError("a file already exists at the original path")
+                    os.makedirs(os.path.dirname(entry["file_path"]), exist_ok=True)
+                    self._relocate(entry["dest"], entry["file_path"], None)
+                else:
+                    # Give the path its own inode / extents back, with its original mode and mtime
+                    tmp = _tmp_path(entry["file_path"])
+                    shutil.copyfile(entry["file_path"], tmp)
+                    os.chmod(tmp, entry["mode"])
+                    os.utime(tmp, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+                    os.replace(tmp, entry["file_path"])
+                result["status"] = "restored"
+            except (OSError, PurgeError) as e:
+                result.update(status="failed", error=str(e))
+            yield result
+
+    def _purge_group(self, keeper, duplicates):
+        results = []
+        keeper_hash = None
+        for f in duplicates:
+            result = {"action": self.action, "file_path": f["file_path"], "kept": keeper["file_path"], "dest": None,
+                      "size": f.get("size"), "reclaimed": 0, "error": None}
+            try:
+                if self.verify and not self.dry_run and keeper_hash is None:
+                    keeper_hash = self._verified_keeper_hash(keeper)
+                result.update(self._purge_file(keeper, f, keeper_hash))
+            except PurgeError as e:
+                result.update(status="skipped", error=str(e))
+            except OSError as e:
+                result.update(status="failed", error=str(e))
+            results.append(result)
+        return results
+
+    def _verified_keeper_hash(self, keeper):
+        keeper_hash = generate_hash(keeper["file_path"], self.algorithm, cached=False)
+        if keeper_hash is None:
+            raise PurgeError(f"cannot read the kept file {keeper['file_path']}")
+        recorded = keeper.get("hash_value")
+        if recorded and keeper.get("hash_algorithm", self.algorithm) == self.algorithm and recorded != keeper_hash:
+            raise PurgeError(f"the kept file {keeper['file_path']} changed since it was scanned")
+        return keeper_hash
+
+    def _purge_file(self, keeper, f, keeper_hash):
+        file_path = f["file_path"]
+        st = os.stat(file_path, follow_symlinks=False)
+        keeper_st = os.stat(keeper["file_path"])
+        if (st.st_dev, st.st_ino) == (keeper_st.st_dev, keeper_st.st_ino):
+            # Linked by an earlier run the catalog did not record: nothing to do, nothing freed
+            return {"status": "linked", "size": st.st_size, "reclaimed": 0}
+        if self.action == HARDLINK and st.st_dev != keeper_st.st_dev:
+            raise PurgeError("hard links need both files on the same filesystem")
+        dest = self._destination(file_path)
+        # Space only comes back when this was the file's last link
+        reclaimed = st.st_size if st.st_nlink <= 1 else 0
+        if self.dry_run:
+            return {"status": "dry-run", "dest": dest, "size": st.st_size, "reclaimed": reclaimed}
+        if self.verify and generate_hash(file_path, self.algorithm, cached=False) != keeper_hash:
+            raise PurgeError("content differs from the kept file")
+        if self.action in (MOVE, QUARANTINE):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            dest = self._relocate(file_path, _free_path(dest), keeper_hash)
+        else:
+            tmp = _tmp_path(file_path)
+            try:
+                if self.action == HARDLINK:
+                    os.link(keeper["file_path"], tmp)
+                else:
+                    reflink(keeper["file_path"], tmp)
+                    shutil.copystat(file_path, tmp)
+                os.replace(tmp, file_path)
+            except OSError:
+                if os.path.lexists(tmp):
+                    os.unlink(tmp)
+                raise
+        self._journal({"action": self.action, "file_path": file_path, "kept": keeper["file_path"], "dest": dest,
+                       "size": st.st_size, "mode": st.st_mode & 0o7777, "mtime_ns": st.st_mtime_ns,
+                       "hash_value": keeper_hash, "hash_algorithm": self.algorithm if keeper_hash else None,
+                       "run_id": self.run_id, "time": time.time()})
+        return {"status": "done", "dest": dest, "size": st.st_size, "reclaimed": reclaimed}
+
+    def _destination(self, file_path):
+        if self.action == MOVE:
+            return relocated_path(self.dest, file_path)
+        if self.action != QUARANTINE:
+            return None
+        if self.quarantine_dir:
+            return relocated_path(os.path.join(self.quarantine_dir, self.run_id), file_path)
+        directory = os.path.realpath(os.path.dirname(os.path.abspath(file_path)))
+        mount = mount_point(directory)
+        root = os.path.join(mount, QUARANTINE_DIR_NAME)
+        if os.access(root if os.path.isdir(root) else mount, os.W_OK):
+            return os.path.join(root, self.run_id, os.path.relpath(directory, mount), os.path.basename(file_path))
+        # A filesystem root we cannot write to (e.g. "/") falls back to a per-user folder
+        return relocated_path(os.path.join(FALLBACK_QUARANTINE_DIR, self.run_id), file_path)
+
+    def _relocate(self, src, dst, expected_hash):
+        """Rename src to dst, or across filesystems copy, check the copy and unlink src; returns dst."""
+        try:
+            os.rename(src, dst)
+            return dst
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        tmp = _tmp_path(dst)
+        try:
+            shutil.copy2(src, tmp)
+            if expected_hash is not None:
+                if generate_hash(tmp, self.algorithm, cached=False) != expected_hash:
+                    raise PurgeError(f"the copy at {dst} does not match; the original was kept")
+            elif os.path.getsize(tmp) != os.path.getsize(src):
+                raise PurgeError(f"the copy at {dst} is incomplete; the original was kept")
+            os.replace(tmp, dst)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        os.unlink(src)
+        return dst
+
+    def _journal(self, entry):
+        with self._journal_lock:
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
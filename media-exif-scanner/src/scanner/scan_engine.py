@@ -0,0 +1,513 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from src.scanner.file_walker import FileWalker, IMAGE, VIDEO, media_kind
+from src.scanner.change_detector import ChangeDetector, MODIFIED, MOVED, UNCHANGED, STAT_FIELDS, stat_fields, content_key
+from src.utils.exif_utils import extract_exif_data, clean_exif_data
+from src.utils.metadata_fields import metadata_columns
+from src.utils.hash_utils import (generate_hash, generate_partial_hash, cached_hashes, DEFAULT_ALGORITHM,
+                                  PARTIAL_HASH_CHUNK)
+from src.utils.metrics import ScanMetrics
+from src.utils.phash_utils import perceptual_hash
+from src.utils.video_meta import read_video_metadata
+
+_DONE = object()
+
+
+def analyze_image(file_path):
+    """
+    EXIF and perceptual hash for one image, plus the seconds spent in each
+    step; top-level so it can run in a process pool.
+    """
+    start = time.perf_counter()
+    exif_data = extract_exif_data(file_path)
+    parsed = time.perf_counter()
+    exif_data = clean_exif_data(exif_data)
+    cleaned = time.perf_counter()
+    phash = perceptual_hash(file_path)
+    timings = {"exif": parsed - start, "exif_clean": cleaned - parsed, "phash": time.perf_counter() - cleaned}
+    return exif_data, phash, timings
+
+
+class ScanStats:
+    """Thread-safe per-folder counters reported at the end of a scan."""
+
+    FIELDS = ("total_files", "exif_copied", "skipped", "unchanged", "moved", "removed", "hashed", "write_errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def add(self, field, count=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + count)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class ScanControl:
+    """Pause / resume / cancel switches shared between a running scan and the caller."""
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self._paused_at = None
+        self.paused_seconds = 0.0
+        self.cancelled = False
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        if not self.paused:
+            self._paused_at = time.monotonic()
+            self._running.clear()
+
+    def resume(self):
+        if self.paused:
+            self.paused_seconds += time.monotonic() - self._paused_at
+            self._running.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self.resume()
+
+    def checkpoint(self):
+        """Block while paused; return False once the scan has been cancelled."""
+        self._running.wait()
+        return not self.cancelled
+
+
+class ScanProgress:
+    """
+    Running totals turned into throttled progress events.
+
+    Events are dicts with stage, files_done, bytes_done, files_per_sec,
+    bytes_per_sec, eta_seconds (None until the total is known) and
+    current_file. The total is estimated from the rows stored by previous
+    scans until the walk has finished.
+    """
+
+    def __init__(self, on_progress, control, expected_files=0, interval=0.25):
+        self.on_progress = on_progress
+        self.control = control
+        self.expected_files = expected_files
+        self.interval = interval
+        self.stage = "walk"
+        self.files_seen = 0
+        self.walk_done = False
+        self.files_done = 0
+        self.bytes_done = 0
+        self.current_file = None
+        self._start = time.monotonic()
+        self._paused_base = control.paused_seconds
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def seen(self):
+        with self._lock:
+            self.files_seen += 1
+
+    def done(self, file_path, size=0):
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += size or 0
+            self.current_file = file_path
+        self.emit()
+
+    def set_stage(self, stage, expected_files=None):
+        with self._lock:
+            self.stage = stage
+            if expected_files is not None:
+                # Rates and ETA restart for a stage with a known amount of work
+                self.files_done = self.bytes_done = 0
+                self.files_seen = self.expected_files = expected_files
+                self.walk_done = True
+                self._start = time.monotonic()
+                self._paused_base = self.control.paused_seconds
+        self.emit(force=True)
+
+    def snapshot(self):
+        paused = self.control.paused_seconds - self._paused_base
+        elapsed = max(time.monotonic() - self._start - paused, 1e-6)
+        files_per_sec = self.files_done / elapsed
+        total = self.files_seen if self.walk_done else max(self.files_seen, self.expected_files)
+        eta = (total - self.files_done) / files_per_sec if files_per_sec and total >= self.files_done else None
+        return {
+            "stage": self.stage,
+            "files_done": self.files_done,
+            "bytes_done": self.bytes_done,
+            "files_per_sec": files_per_sec,
+            "bytes_per_sec": self.bytes_done / elapsed,
+            "eta_seconds": eta,
+            "current_file": self.current_file,
+        }
+
+    def emit(self, force=False):
+        if not self.on_progress:
+            return
+        now = time.monotonic()
+        if force or now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self.on_progress(self.snapshot())
+
+
+class ScanEngine:
+    """
+    Parallel scanner that walks folders, extracts EXIF, hashes and stores media files.
+
+    Pipeline:
+      - one walker thread per folder lists media files with FileWalker
+        (honouring exclude globs, skip_hidden and follow_symlinks) and drops
+        unchanged ones (see ChangeDetector) into a bounded work queue;
+      - exif_workers threads parse EXIF and compute perceptual hashes,
+        optionally handing the Pillow work to a pool of exif_processes processes;
+      - once every folder is walked, hash_workers threads compute partial
+        hashes (with hash_algorithm) for files whose size collides with
+        another stored file; with full_hash, every file gets its partial and
+        full hash instead (for shard catalogs merged with other hosts', whose
+        files cannot be read later to confirm duplicates). With a hash
+        cache set (hash_utils.set_hash_cache), hashes cached with the files
+        are stored as they are walked and those files are not read again;
+      - a single writer thread owns all DB writes, fed by a bounded queue and
+        committed in batches of batch_size rows (see DBManager.batch_writer).
+
+    disk_limits maps a scanned folder to the maximum number of files read
+    from it at once, so spinning disks are not thrashed while SSDs run wide.
+
+    Every stage is timed into metrics (a ScanMetrics; see
+    src/utils/metrics.py), which is finished - summary computed, exporters
+    and profile written - when scan() returns.
+
+    A ScanControl passed to scan() can pause, resume or cancel it. A cancelled
+    scan commits what it has processed and skips the missing-file cleanup, so
+    the next scan of the same folders resumes at stat speed via ChangeDetector.
+    """
+
+    def __init__(self, db, hash_workers=4, exif_workers=4, exif_processes=0, queue_size=256, disk_limits=None,
+                 batch_size=1000, hash_algorithm=DEFAULT_ALGORITHM, metrics=None, exclude=(), skip_hidden=True,
+                 follow_symlinks=False, full_hash=False):
+        self.db = db
+        self.full_hash = full_hash
+        self.exclude = exclude
+        self.skip_hidden = skip_hidden
+        self.follow_symlinks = follow_symlinks
+        self.metrics = metrics or ScanMetrics()
+        self.batch_size = batch_size
+        self.hash_algorithm = hash_algorithm
+        self.hash_workers = hash_workers
+        self.exif_workers = exif_workers
+        self.exif_processes = exif_processes
+        self.queue_size = queue_size
+        self.disk_limits = disk_limits or {}
+        self._slots = {}
+        self._exif_pool = None
+        self._write_queue = None
+        self._control = None
+        self._progress = None
+        self._stats = {}
+        self._on_error = None
+        self._new_paths = set()
+
+    def scan(self, paths, control=None, on_progress=None, on_error=None):
+        """
+        Scan the given folders and return {path: ScanStats}.
+
+        on_progress(event) is called from worker threads (see ScanProgress).
+        on_error(file_path, error) is called from the writer thread for each
+        row the catalog rejected (counted in write_errors); by default the
+        error is printed.
+        """
+        paths = [path for path in dict.fromkeys(paths) if os.path.exists(path)]
+        # A folder nested inside another scanned folder would be walked (and inserted) twice
+        paths = [path for path in paths if not any(path.startswith(os.path.join(other, "")) for other in paths)]
+        self._stats = stats = {path: ScanStats() for path in paths}
+        self._on_error = on_error
+        self._new_paths = set()  # Paths first seen in this scan: the only places a vanished file can have moved to
+        detectors = {path: ChangeDetector(self.db.get_file_states(path)) for path in paths}
+        self._control = control = control or ScanControl()
+        self._progress = progress = ScanProgress(
+            on_progress, control, expected_files=sum(len(detector.stored) for detector in detectors.values())
+        )
+        self._slots = {
+            path: threading.BoundedSemaphore(self.disk_limits[path]) if self.disk_limits.get(path) else nullcontext()
+            for path in paths
+        }
+        self._write_queue = queue.Queue(maxsize=self.queue_size)
+        writer = threading.Thread(target=self._writer, daemon=True)
+        writer.start()
+        if self.exif_processes:
+            self._exif_pool = ProcessPoolExecutor(self.exif_processes)
+        try:
+            # Stage 1: walk + EXIF for new and modified files
+            work_queue = queue.Queue(maxsize=self.queue_size)
+            walkers = [
+                threading.Thread(target=self._walk, args=(path, detectors[path], stats[path], work_queue), daemon=True)
+                for path in paths
+            ]
+            self._run_consumers(work_queue, self._process_file, self.exif_workers, producers=walkers)
+            self._flush()
+            if control.cancelled:
+                return stats
+
+            # Stage 2: partial hashes, only where sizes collide (full hashes of everything with full_hash)
+            missing = {path: detectors[path].missing() for path in paths}
+            missing_paths = {record["file_path"] for records in missing.values() for record in records}
+            hash_queue = queue.Queue(maxsize=self.queue_size)
+            feeder = threading.Thread(
+                target=self._feed_hashes, args=(paths, missing_paths, stats, hash_queue), daemon=True
+            )
+            self._run_consumers(hash_queue, self._hash_file, self.hash_workers, producers=[feeder])
+            self._flush()
+            if control.cancelled:
+                return stats
+
+            # Stage 3: rows whose file vanished either moved (same content found) or are removed
+            progress.set_stage("cleanup")
+            for path in paths:
+                self._resolve_missing(missing[path], stats[path])
+            self._flush()
+            progress.set_stage("done")
+        finally:
+            self._write_queue.put(_DONE)
+            writer.join()
+            if self._exif_pool:
+                self._exif_pool.shutdown()
+                self._exif_pool = None
+            self.metrics.finish()
+        return stats
+
+    def _run_consumers(self, work_queue, handle, workers, producers):
+        def consume():
+            while True:
+                item = work_queue.get()
+                if item is _DONE:
+                    return
+                if not self._control.checkpoint():
+                    continue  # Cancelled: drain the queue so producers can stop
+                try:
+                    handle(item)
+                except Exception as e:
+                    item["stats"].add("skipped")
+                    print(f"Error processing {item['file_path']}: {e}")
+
+        consumers = [threading.Thread(target=consume, daemon=True) for _ in range(max(1, workers))]
+        for thread in producers + consumers:
+            thread.start()
+        for thread in producers:
+            thread.join()
+        for _ in consumers:
+            work_queue.put(_DONE)
+        for thread in consumers:
+            thread.join()
+
+    def _walk(self, path, detector, stats, work_queue):
+        def on_error(entry_path, error):
+            if media_kind(entry_path):
+                stats.add("total_files")
+                stats.add("skipped")
+            print(f"Error processing {entry_path}: {error}")
+
+        walker = FileWalker(self.exclude, skip_hidden=self.skip_hidden, follow_symlinks=self.follow_symlinks,
+                            on_error=on_error, metrics=self.metrics)
+        for file_path, file_name, kind, st in walker.walk(path):
+            if not self._control.checkpoint():
+                return
+            stats.add("total_files")
+            self._progress.seen()
+            status = detector.classify(file_path, st)
+            if status == UNCHANGED:
+                # Trust the stored hash and EXIF
+                stats.add("unchanged")
+                self._progress.done(file_path)
+                continue
+            record = {
+                "disk_name": os.path.splitdrive(file_path)[0],
+                "file_name": file_name,
+                "file_path": file_path,
+                **stat_fields(st)
+            }
+            if status == MOVED:
+                old = detector.moves[file_path]
+                self._write(("update", old["file_path"], record))
+                stats.add("moved")
+                self._progress.done(file_path)
+                continue
+            purged = None
+            if status == MODIFIED:
+                stored = detector.stored[file_path]
+                if stored.get("is_duplicate") and stored.get("hash_value"):
+                    link = detector.hard_link_of(file_path, st)
+                    if link and link.get("hash_value") == stored["hash_value"]:
+                        # A purged copy now hard-linked to its keeper: same content, keep the purge mark
+                        self._write(("update", file_path, stat_fields(st)))
+                        stats.add("unchanged")
+                        self._progress.done(file_path)
+                        continue
+                    purged = stored
+            if status != MODIFIED:
+                self._new_paths.add(file_path)
+            work_queue.put(dict(record, root=path, kind=kind, stats=stats, existing=status == MODIFIED, purged=purged))
+
+    def _process_file(self, item):
+        exif_data, phash = {}, None
+        file_path = item["file_path"]
+        if item["purged"] and self._still_purged_copy(item):
+            # Replaced by a link or reflink to its keeper: only the stat changed
+            self._write(("update", file_path, {key: item[key] for key in STAT_FIELDS}))
+            item["stats"].add("unchanged")
+            self._progress.done(file_path, item["size"])
+            return
+        if item["kind"] == IMAGE:
+            with self._slots[item["root"]]:
+                if self._exif_pool:
+                    with self.metrics.timer("image", file_path):
+                        exif_data, phash, timings = self._exif_pool.submit(analyze_image, file_path).result()
+                else:
+                    exif_data, phash, timings = self.metrics.call("image", analyze_image, file_path, file_path=file_path)
+            for stage, seconds in timings.items():
+                self.metrics.observe(stage, seconds)
+        elif item["kind"] == VIDEO:
+            with self._slots[item["root"]]:
+                exif_data = self.metrics.call("video_meta", read_video_metadata, file_path, file_path=file_path) or {}
+        if exif_data:
+            item["stats"].add("exif_copied")
+        fields = {key: item[key] for key in ("disk_name", "file_name") + STAT_FIELDS}
+        fields["exif_data"] = exif_data
+        # Typed columns are parsed here in the worker so the writer thread only binds values
+        fields.update(metadata_columns(exif_data))
+        fields["perceptual_hash"] = phash
+        # Hashes cached with the file (see src/utils/hash_cache.py) for its current size and mtime, if any
+        partial_hash, hash_value = cached_hashes(file_path, self.hash_algorithm, item["size"], item["mtime_ns"])
+        hashes = {"partial_hash": partial_hash, "hash_value": hash_value,
+                  "hash_algorithm": self.hash_algorithm if partial_hash or hash_value else None}
+        if item["existing"]:
+            # Content changed in place: refresh the row and forget its old hashes
+            self._write(("update", item["file_path"], dict(fields, is_duplicate=0, **hashes)))
+        else:
+            self._write(("add", dict(fields, file_path=item["file_path"], **hashes)))
+        self._progress.done(item["file_path"], item["size"])
+
+    def _still_purged_copy(self, item):
+        """Whether a changed file marked as a purged duplicate still holds the content it was purged for."""
+        purged = item["purged"]
+        if purged["size"] != item["size"]:
+            return False
+        algorithm = purged.get("hash_algorithm") or self.hash_algorithm
+        with self._slots[item["root"]]:
+            hash_value = self.metrics.call("full_hash", generate_hash, item["file_path"], algorithm,
+                                           file_path=item["file_path"])
+        return hash_value == purged["hash_value"]
+
+    def _feed_hashes(self, paths, missing_paths, stats, hash_queue):
+        unhashed = self.db.get_unhashed_files if self.full_hash else self.db.get_unhashed_size_collisions
+        to_hash = [row for row in unhashed(paths, self.hash_algorithm) if row[0] not in missing_paths]
+        self._progress.set_stage("hash", expected_files=len(to_hash))
+        for file_path, size, algorithm in to_hash:
+            if not self._control.checkpoint():
+                return
+            root = next(path for path in paths if file_path.startswith(os.path.join(path, "")))
+            hash_queue.put({"file_path": file_path, "size": size, "algorithm": algorithm, "root": root,
+                            "stats": stats[root]})
+
+    def _hash_file(self, item):
+        with self._slots[item["root"]]:
+            partial_hash = self.metrics.call("partial_hash", generate_partial_hash, item["file_path"],
+                                             self.hash_algorithm, file_path=item["file_path"])
+        read = min(item["size"], 2 * PARTIAL_HASH_CHUNK)
+        if partial_hash:
+            item["stats"].add("hashed")
+            fields = {"partial_hash": partial_hash, "hash_algorithm": self.hash_algorithm}
+            if self.full_hash:
+                with self._slots[item["root"]]:
+                    fields["hash_value"] = self.metrics.call("full_hash", generate_hash, item["file_path"],
+                                                             self.hash_algorithm, file_path=item["file_path"])
+                read = item["size"]
+            elif item["algorithm"] not in (None, self.hash_algorithm):
+                # A full hash made with the previous algorithm is stale now
+                fields["hash_value"] = None
+            self.metrics.count("bytes_hashed", read)
+            self._write(("update", item["file_path"], fields))
+        self._progress.done(item["file_path"], read)
+
+    def _resolve_missing(self, records, stats):
+        removed = []
+        for record in records:
+            key = content_key(record)
+            # Only a file new in this scan can be where it went; a copy that was already catalogued
+            # (e.g. the keeper of a purged duplicate) means this one was removed
+            candidates = self.db.get_files_by_content(*key) if key else []
+            matches = [f for f in candidates if f["file_path"] in self._new_paths]
+            if matches:
+                # Same content found at a new path: carry the known full hash over
+                stats.add("moved")
+                for match in matches:
+                    if (record.get("hash_value") and not match["hash_value"]
+                            and record.get("hash_algorithm") == match["hash_algorithm"]):
+                        self._write(("update", match["file_path"], {"hash_value": record["hash_value"]}))
+            else:
+                stats.add("removed")
+            removed.append(record["file_path"])
+        if removed:
+            self._write(("delete", removed))
+
+    def _write(self, op):
+        self._write_queue.put(op)
+
+    def _flush(self):
+        """Wait until the writer has committed everything queued so far."""
+        self._write_queue.put(("flush",))
+        self._write_queue.join()
+
+    def _on_flush(self, rows, seconds):
+        self.metrics.observe("db_commit", seconds)
+        self.metrics.count("db_commits")
+        self.metrics.count("db_rows_written", rows)
+
+    def _on_write_error(self, file_path, error):
+        """Count a row the writer could not store against the scanned folder holding it."""
+        self.metrics.count("db_rows_failed")
+        for path, stats in self._stats.items():
+            if file_path.startswith(os.path.join(path, "")):
+                stats.add("write_errors")
+                break
+        if self._on_error:
+            self._on_error(file_path, error)
+        else:
+            print(f"Error writing {file_path} to database: {error}")
+
+    def _writer(self):
+        with self.db.batch_writer(self.batch_size, on_flush=self._on_flush, on_error=self._on_write_error) as batch:
+            while True:
+                op = self._write_queue.get()
+                try:
+                    if op is _DONE:
+                        return
+                    if op[0] == "add":
+                        batch.add(**op[1])
+                    elif op[0] == "update":
+                        batch.update(op[1], **op[2])
+                    elif op[0] == "delete":
+                        batch.delete(op[1])
+                    elif op[0] == "flush":
+                        batch.flush()
+                except Exception as e:
+                    # Rows the database rejected reach _on_write_error from the batch; this is anything else
+                    if op[0] == "add":
+                        self._on_write_error(op[1]["file_path"], e)
+                    elif op[0] == "update":
+                        self._on_write_error(op[1], e)
+                    elif op[0] == "delete":
+                        for file_path in op[1]:
+                            self._on_write_error(file_path, e)
+                    else:
+                        print(f"Error writing {op[0]} to database: {e}")
+                finally:
+                    self._write_queue.task_done()
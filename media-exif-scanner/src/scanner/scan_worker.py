@@ -0,0 +1,49 @@
+import queue
+import threading
+
+from src.scanner.scan_engine import ScanEngine, ScanControl
+
+
+class ScanWorker(threading.Thread):
+    """
+    Runs a ScanEngine scan on a background thread.
+
+    Progress and completion are posted to the events queue as (kind, payload)
+    tuples so a UI can poll it from its own thread (e.g. Tk's after()):
+      ("progress", ScanProgress snapshot dict)
+      ("write_error", {"file_path": str, "error": exception}) for each row the catalog rejected
+      ("done", {"stats": {path: ScanStats}, "cancelled": bool, "metrics": ScanMetrics summary dict})
+      ("error", exception)
+    """
+
+    def __init__(self, db, paths, **engine_options):
+        super().__init__(daemon=True)
+        self.engine = ScanEngine(db, **engine_options)
+        self.metrics = self.engine.metrics  # Profiling / tracemalloc can be toggled while the scan runs
+        self.paths = paths
+        self.control = ScanControl()
+        self.events = queue.Queue()
+
+    def run(self):
+        try:
+            stats = self.engine.scan(self.paths, control=self.control, on_progress=self._post_progress,
+                                     on_error=self._post_write_error)
+            self.events.put(("done", {"stats": stats, "cancelled": self.control.cancelled,
+                                      "metrics": self.engine.metrics.summary()}))
+        except Exception as e:
+            self.events.put(("error", e))
+
+    def _post_progress(self, event):
+        self.events.put(("progress", event))
+
+    def _post_write_error(self, file_path, error):
+        self.events.put(("write_error", {"file_path": file_path, "error": error}))
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def cancel(self):
+        self.control.cancel()
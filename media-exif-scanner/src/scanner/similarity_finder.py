@@ -0,0 +1,45 @@
+from src.utils.bk_tree import BKTree
+
+# Max differing dHash bits for two images to count as near-duplicates
+DEFAULT_THRESHOLD = 8
+
+
+def find_similar_groups(hashed_items, threshold=DEFAULT_THRESHOLD):
+    """
+    Cluster (item, perceptual_hash) pairs into groups of near-duplicate images.
+
+    Every distinct hash is looked up once in a BK-tree and linked (union-find)
+    to all hashes within threshold bits, so the cost grows with the number of
+    neighbours rather than with all pairs. Returns lists of items, largest
+    group first; singletons are dropped.
+    """
+    tree = BKTree()
+    for item, phash in hashed_items:
+        tree.add(phash, item)
+
+    parent = {}
+
+    def find(item):
+        root = item
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while item != root:
+            parent[item], item = root, parent.get(item, item)
+        return root
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    for key, items in tree.nodes():
+        for item in items[1:]:
+            union(items[0], item)
+        for _, other in tree.search(key, threshold):
+            union(items[0], other)
+
+    groups = {}
+    for _, items in tree.nodes():
+        for item in items:
+            groups.setdefault(find(item), []).append(item)
+    return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
@@ -0,0 +1,288 @@
+import errno
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from src.scanner.change_detector import stat_fields
+from src.scanner.duplicate_finder import DuplicateFinder
+from src.utils.hash_index import HashIndex
+from src.utils.hash_utils import DEFAULT_ALGORITHM, generate_hash
+
+SOURCE_LAYOUT = "source"
+DATE_LAYOUT = "date"
+LAYOUTS = (SOURCE_LAYOUT, DATE_LAYOUT)
+
+# Bytes handed to the kernel per copy_file_range / sendfile call
+COPY_CHUNK = 64 * 1024 * 1024
+USERSPACE_CHUNK = 1024 * 1024
+
+_PLAN_COLUMNS = ("file_path", "file_name", "size", "partial_hash", "hash_value", "hash_algorithm", "mtime_ns")
+# EXIF / video keys holding the capture date, most specific first ("YYYY:MM:DD HH:MM:SS" or ISO 8601)
+_DATE_KEYS = ("DateTimeOriginal", "CreationDate", "CreationTime", "DateTimeDigitized", "DateTime")
+
+
+def _kernel_copy(src_fd, dst_fd, pos, size):
+    """Copy [pos, size) between fds in the kernel; returns the new position, or None if no kernel path works."""
+    if hasattr(os, "copy_file_range"):
+        try:
+            while pos < size:
+                copied = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK, size - pos), pos, pos)
+                if not copied:
+                    break
+                pos += copied
+            return pos
+        except OSError as e:
+            # Older kernels refuse cross-filesystem copies; sendfile still avoids userspace
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if sys.platform.startswith("linux") and hasattr(os, "sendfile"):
+        os.lseek(dst_fd, pos, os.SEEK_SET)
+        while pos < size:
+            sent = os.sendfile(dst_fd, src_fd, pos, min(COPY_CHUNK, size - pos))
+            if not sent:
+                break
+            pos += sent
+        return pos
+    return None
+
+
+def copy_file_data(src, dst, offset=0):
+    """
+    Copy the contents of src into dst, keeping the first offset bytes already
+    in dst (a resumed transfer). Uses copy_file_range or sendfile where the OS
+    has them, plain reads and writes otherwise. Returns the bytes copied.
+    """
+    with open(src, "rb") as fsrc, open(dst, "r+b" if offset else "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        fdst.truncate(offset)
+        pos = _kernel_copy(fsrc.fileno(), fdst.fileno(), offset, size)
+        if pos is None:
+            pos = offset
+            fsrc.seek(pos)
+            fdst.seek(pos)
+            while True:
+                chunk = fsrc.read(USERSPACE_CHUNK)
+                if not chunk:
+                    break
+                fdst.write(chunk)
+                pos += len(chunk)
+        fdst.flush()
+        os.fsync(fdst.fileno())
+    return pos - offset
+
+
+def _part_path(path):
+    # Dot-prefixed so scans skip unfinished transfers
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.sync-part")
+
+
+def capture_month(record):
+    """(year, month) strings for a record, from its EXIF / video date or else its mtime."""
+    exif_data = record.get("exif_data") or {}
+    for key in _DATE_KEYS:
+        value = exif_data.get(key)
+        if isinstance(value, str) and len(value) >= 7 and value[:4].isdigit() and value[5:7].isdigit():
+            if value[:4] != "0000" and value[5:7] != "00":
+                return value[:4], value[5:7]
+    if record.get("mtime_ns"):
+        return tuple(time.strftime("%Y %m", time.localtime(record["mtime_ns"] / 1e9)).split())
+    return "undated", ""
+
+
+class SyncPlanner:
+    """
+    Plans a one-way sync of the catalogued files under source into target.
+
+    The plan is a content set difference: a source file is copied only when
+    no file under target has the same size and full hash, and only one copy
+    of each distinct content is planned. Hashes the database already holds
+    are reused; missing ones are computed only for files whose size collides
+    with another file (size -> partial hash -> full hash, as in dedupe) and
+    saved back. Destinations mirror the source layout, or with layout="date"
+    become target/YYYY/MM/<name> from the EXIF / video capture date.
+    """
+
+    def __init__(self, db, algorithm=DEFAULT_ALGORITHM, layout=SOURCE_LAYOUT):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout {layout!r}; expected one of {', '.join(LAYOUTS)}")
+        self.db = db
+        self.algorithm = algorithm
+        self.layout = layout
+        self.summary = {}
+        self.record_errors = 0
+
+    def plan(self, source, target):
+        """Return the list of copy items (dicts) needed to bring target up to date with source."""
+        source_records = list(self.db.iter_files(_PLAN_COLUMNS, source, include_exif=self.layout == DATE_LAYOUT))
+        source_sizes = {record["size"] for record in source_records}
+        target_records = [record for record in self.db.iter_files(_PLAN_COLUMNS, target)
+                          if record["size"] in source_sizes]
+        with self.db.batch_writer() as batch:
+            def save(record, field):
+                batch.update(record["file_path"], **{field: record[field]})
+
+            DuplicateFinder(on_update=save, algorithm=self.algorithm).confirm_all(source_records + target_records)
+
+        # Target content as a compact digest index, tested for all source files in one batch
+        present = HashIndex.from_hashes((record["hash_value"] for record in target_records), self.algorithm)
+        source_records.sort(key=lambda r: r["file_path"])
+        on_target = present.contains(record["hash_value"] for record in source_records)
+        planned_content = set()
+        planned_paths = set()
+        items = []
+        summary = {"source_files": len(source_records), "present": 0, "source_duplicates": 0,
+                   "to_copy": 0, "bytes_to_copy": 0}
+        for record, found in zip(source_records, on_target):
+            if found:
+                summary["present"] += 1
+                continue
+            # Files whose size matched nothing were never hashed, and are unique by size alone
+            content = (record["size"], record["hash_value"]) if record["hash_value"] else record["file_path"]
+            if content in planned_content:
+                summary["source_duplicates"] += 1
+                continue
+            planned_content.add(content)
+            dest_path = self._free_dest(self._dest_path(record, source, target), record["size"], planned_paths)
+            planned_paths.add(dest_path)
+            known = record["hash_value"] if record.get("hash_algorithm") == self.algorithm else None
+            items.append({"id": record["id"], "source_path": record["file_path"], "dest_path": dest_path,
+                          "size": record["size"], "hash_value": known})
+            summary["to_copy"] += 1
+            summary["bytes_to_copy"] += record["size"] or 0
+        self.summary = summary
+        return items
+
+    def record(self, results):
+        """
+        Store copy results in the database as they stream by, yielding each
+        one on: the source's new hash and a row for each copy, written in
+        batches. Rows the database rejects are reported and skipped.
+        """
+        with self.db.batch_writer(on_error=self._record_failed) as batch:
+            for result in results:
+                if result["status"] in ("copied", "present"):
+                    self._record(batch, result)
+                yield result
+
+    def _record(self, batch, result):
+        if result["hash_computed"]:
+            batch.update(result["source_path"], hash_value=result["hash_value"], hash_algorithm=self.algorithm)
+        if self.db.file_exists(result["dest_path"]):
+            return
+        source = self.db.get_files_by_ids([result["id"]], columns=("exif_data", "perceptual_hash")).get(result["id"], {})
+        # The copy is byte-identical, so the source's EXIF and hashes carry over and a rescan finds it unchanged
+        batch.add(
+            disk_name=os.path.splitdrive(result["dest_path"])[0], file_name=os.path.basename(result["dest_path"]),
+            file_path=result["dest_path"], exif_data=source.get("exif_data"), hash_value=result["hash_value"],
+            perceptual_hash=source.get("perceptual_hash"), hash_algorithm=self.algorithm,
+            **stat_fields(os.stat(result["dest_path"]))
+        )
+
+    def _record_failed(self, file_path, error):
+        self.record_errors += 1
+        print(f"Could not record {file_path} in the database: {error}", file=sys.stderr)
+
+    def _dest_path(self, record, source, target):
+        if self.layout == DATE_LAYOUT:
+            return os.path.join(target, *capture_month(record), record["file_name"])
+        return os.path.join(target, os.path.relpath(record["file_path"], source))
+
+    def _free_dest(self, path, size, planned_paths):
+        """path, unless another planned copy or a different existing file holds it; then 'name (n).ext'."""
+        base, ext = os.path.splitext(path)
+        n = 1
+        while path in planned_paths or self._taken(path, size):
+            path = f"{base} ({n}){ext}"
+            n += 1
+        return path
+
+    def _taken(self, path, size):
+        # A same-sized file may be this very copy from an interrupted run; the copier verifies it
+        try:
+            return os.path.getsize(path) != size
+        except OSError:
+            return False
+
+
+class SyncCopier:
+    """
+    Runs a SyncPlanner plan with a thread pool.
+
+    Each file is copied into a hidden .sync-part file next to its
+    destination (resuming from whatever an interrupted run left there),
+    fsynced, hash-verified against the source and only then renamed into
+    place. A destination that already holds the same content counts as
+    "present". The source is hashed only when the plan carries no hash for it.
+
+    run() yields one result per item: the item's fields plus status
+    ("copied", "present", "dry-run", "failed"), hash_computed, resumed_bytes
+    and error.
+    """
+
+    def __init__(self, workers=4, algorithm=DEFAULT_ALGORITHM, dry_run=False):
+        self.workers = workers
+        self.algorithm = algorithm
+        self.dry_run = dry_run
+
+    def run(self, items):
+        """Copy an iterable of plan items; yields results as copies finish, with a few items queued per worker."""
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            while True:
+                for item in islice(items, self.workers * 4 - len(pending)):
+                    pending.add(executor.submit(self._copy, item))
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def _copy(self, item):
+        result = dict(item, status="failed", hash_computed=False, resumed_bytes=0, error=None)
+        if self.dry_run:
+            result["status"] = "dry-run"
+            return result
+        try:
+            result.update(self._transfer(item))
+        except OSError as e:
+            result["error"] = str(e)
+        return result
+
+    def _source_hash(self, item, outcome):
+        if item["hash_value"] is None:
+            item = dict(item, hash_value=generate_hash(item["source_path"], self.algorithm))
+            outcome["hash_computed"] = True
+            if item["hash_value"] is None:
+                raise OSError(errno.EIO, f"cannot read {item['source_path']}")
+        outcome["hash_value"] = item["hash_value"]
+        return item["hash_value"]
+
+    def _transfer(self, item):
+        source, dest = item["source_path"], item["dest_path"]
+        outcome = {}
+        if os.path.exists(dest):
+            if generate_hash(dest, self.algorithm, cached=False) == self._source_hash(item, outcome):
+                return dict(outcome, status="present")
+            return dict(outcome, error=f"{dest} already exists with other content")
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        part = _part_path(dest)
+        size = os.path.getsize(source)
+        try:
+            offset = os.path.getsize(part)
+        except OSError:
+            offset = 0
+        offset = offset if offset <= size else 0
+        copy_file_data(source, part, offset)
+        expected = self._source_hash(item, outcome)
+        if generate_hash(part, self.algorithm, cached=False) != expected:
+            # Possibly a stale partial from an older version of the source: start over next time
+            os.unlink(part)
+            return dict(outcome, error="copy does not match the source hash; removed it")
+        shutil.copystat(source, part)
+        os.replace(part, dest)
+        return dict(outcome, status="copied", resumed_bytes=offset)
@@ -1,10 +1,48 @@
+from src.utils.metadata_fields import METADATA_COLUMNS
+
+
 class MediaFile:
-    def __init__(self, disk_name, file_name, file_path, exif_data, hash_value):
+    """
+    One scanned media file, as yielded by MediaScanner.iter_media().
+
+    Slotted, so an instance carries no __dict__ and millions of them stay
+    small. It also reads like the record dicts the rest of the code passes
+    around (record["size"], record.get("hash_value"), record[field] = value),
+    so DuplicateFinder works on it directly; to_dict() gives a plain dict.
+    """
+
+    __slots__ = ("disk_name", "file_name", "file_path", "exif_data", "hash_value", "partial_hash", "hash_algorithm",
+                 "perceptual_hash", "size", "mtime_ns", "inode", "device") + METADATA_COLUMNS
+
+    def __init__(self, disk_name, file_name, file_path, exif_data=None, hash_value=None, **fields):
         self.disk_name = disk_name
         self.file_name = file_name
         self.file_path = file_path
         self.exif_data = exif_data
         self.hash_value = hash_value
+        for name in self.__slots__[5:]:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Unknown MediaFile fields: {', '.join(fields)}")
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
 
     def __repr__(self):
-        return f"MediaFile(disk_name={self.disk_name}, file_name={self.file_name}, file_path={self.file_path}, exif_data={self.exif_data}, hash_value={self.hash_value})"
\ No newline at end of file
+        return f"MediaFile(disk_name={self.disk_name}, file_name={self.file_name}, file_path={self.file_path}, exif_data={self.exif_data}, hash_value={self.hash_value})"
@@ -1,17 +1,27 @@
-from tkinter import Tk, Frame, Button, Entry, Listbox, Scrollbar, END, filedialog, Label, StringVar, OptionMenu, Canvas
-from PIL import Image, ImageTk
+from tkinter import Tk, Frame, Button, Entry, Listbox, Scrollbar, END, filedialog, Label, StringVar, OptionMenu
 import os
-import mimetypes
+import queue
 import sys
-import shutil
-import tkinter as tk
+import threading
 from tkinter import ttk
 
 # Ensure src is in sys.path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from src.utils.exif_utils import extract_exif_data
-from src.utils.hash_utils import generate_hash
+from src.utils.exif_utils import clean_exif_data
 from src.database.db_manager import DBManager  # You must implement this
+from src.scanner.duplicate_finder import DuplicateFinder
+from src.scanner.scan_worker import ScanWorker
+from src.utils.thumbnail_cache import ThumbnailCache
+from src.ui.duplicate_gallery import DuplicateGallery
+from src.scanner.similarity_finder import find_similar_groups
+from src.scanner.purge_engine import PurgeEngine, MOVE, QUARANTINE, HARDLINK, REFLINK
+from src.scanner.keeper_policy import KeeperPolicy, DEFAULT_RULES
+from src.utils.metadata_fields import METADATA_COLUMNS
+
+PURGE_ACTIONS = {"Quarantine": QUARANTINE, "Move to folder...": MOVE, "Hard link": HARDLINK, "Reflink": REFLINK}
+# Purge results committed per catalog transaction, and progress messages handled per poll of the Tk thread
+PURGE_BATCH = 500
+PURGE_POLL_LIMIT = 50
 
 class AppUI:
     def __init__(self, master):
@@ -20,6 +30,7 @@ class AppUI:
         self.master.state('zoomed')  # Full screen on Windows
 
         self.db = DBManager()
+        self.thumb_cache = ThumbnailCache()
 
         self.mode = StringVar(value="Scan")
         self.mode_menu = OptionMenu(self.master, self.mode, "Scan", "Deduplication", command=self.switch_mode)
@@ -72,6 +83,16 @@ class AppUI:
         extract_button = Button(parent, text="Extract EXIF & Hash", command=self.extract_exif_and_hash)
         extract_button.pack(pady=5)
 
+        self.scan_worker = None
+        controls = Frame(parent)
+        controls.pack(pady=5)
+        self.pause_button = Button(controls, text="Pause", command=self.toggle_scan_pause, state="disabled")
+        self.pause_button.pack(side="left", padx=2)
+        self.cancel_button = Button(controls, text="Cancel", command=self.cancel_scan, state="disabled")
+        self.cancel_button.pack(side="left", padx=2)
+        self.scan_status = StringVar(value="")
+        Label(parent, textvariable=self.scan_status, font=("Arial", 10)).pack(pady=2)
+
     def create_disk_entry(self, parent):
         row_frame = Frame(parent)
         entry = Entry(row_frame, width=60)
@@ -95,64 +116,137 @@ class AppUI:
             self.disk_entries.remove(entry)
 
     def extract_exif_and_hash(self):
+        if self.scan_worker and self.scan_worker.is_alive():
+            return
         self.media_listbox.delete(0, END)
+        paths = []
         for entry in self.disk_entries:
             path = entry.get()
             if not os.path.exists(path):
                 self.media_listbox.insert(END, f"Invalid path: {path}")
                 continue
-            total_files = 0
-            exif_copied = 0
-            skipped = 0
-            for root, dirs, files in os.walk(path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    mime_type, _ = mimetypes.guess_type(file_path)
-                    if not (mime_type and (mime_type.startswith('image/') or mime_type.startswith('video/'))):
-                        continue  # Not a media file, don't count
-                    total_files += 1
-                    try:
-                        hash_value = generate_hash(file_path)
-                        # --- SKIP if already in DB ---
-                        if self.db.file_exists(file_path, hash_value):
-                            continue
-                        exif_data = extract_exif_data(file_path) if mime_type and mime_type.startswith('image/') else {}
-                        exif_data = self.clean_exif_data(exif_data)
-                        if exif_data:
-                            exif_copied += 1
-                        print(f"Saving: {file_path}, hash: {hash_value}, exif: {str(exif_data)[:100]}")
-                        self.db.add_media_file(
-                            disk_name=os.path.splitdrive(file_path)[0],
-                            file_name=file,
-                            file_path=file_path,
-                            exif_data=exif_data,
-                            hash_value=hash_value
-                        )
-                    except Exception as e:
-                        skipped += 1
-                        print(f"Error processing {file_path}: {e}")
-                        continue
+            paths.append(path)
+        # Scan in the background; the UI only polls the worker's event queue
+        self.scan_worker = ScanWorker(self.db, paths)
+        self.scan_worker.start()
+        self.pause_button.config(text="Pause", state="normal")
+        self.cancel_button.config(state="normal")
+        self.scan_status.set("Scanning...")
+        self.master.after(200, self.poll_scan_events)
+
+    def poll_scan_events(self):
+        worker = self.scan_worker
+        latest = None
+        while True:
+            try:
+                kind, payload = worker.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                latest = payload
+            elif kind == "write_error":
+                print(f"Error writing {payload['file_path']} to database: {payload['error']}")
+            elif kind == "error":
+                self.finish_scan(f"Scan failed: {payload}")
+                return
+            elif kind == "done":
+                self.show_scan_results(payload["stats"])
+                for line in self.scan_worker.metrics.format_summary():
+                    print(line)
+                if payload["cancelled"]:
+                    self.finish_scan("Scan cancelled; run it again to resume from where it stopped.")
+                else:
+                    self.finish_scan("Scan complete.")
+                return
+        if latest:
+            self.scan_status.set(self.format_scan_progress(latest))
+        self.master.after(200, self.poll_scan_events)
+
+    def format_scan_progress(self, event):
+        eta = event["eta_seconds"]
+        eta_text = f"{int(eta // 60)}m {int(eta % 60)}s" if eta is not None else "estimating"
+        state = "Paused | " if self.scan_worker.control.paused else ""
+        return (
+            f"{state}{event['stage'].title()}: {event['files_done']} files"
+            f" | {event['files_per_sec']:.1f} files/s | {event['bytes_per_sec'] / 1e6:.1f} MB/s"
+            f" | ETA {eta_text}\n{event['current_file'] or ''}"
+        )
+
+    def show_scan_results(self, results):
+        for path, stats in results.items():
             self.media_listbox.insert(
                 END,
-                f"Path: {path}\n  Total media files: {total_files} | EXIF copied: {exif_copied} | Skipped: {skipped}"
+                f"Path: {path}\n  Total media files: {stats.total_files} | EXIF copied: {stats.exif_copied}"
+                f" | Skipped: {stats.skipped} | Unchanged: {stats.unchanged} | Moved: {stats.moved}"
+                f" | Removed: {stats.removed} | Partially hashed: {stats.hashed}"
+                + (f" | Not saved: {stats.write_errors} (see console)" if stats.write_errors else "")
             )
 
+    def finish_scan(self, message):
+        self.scan_status.set(message)
+        self.pause_button.config(text="Pause", state="disabled")
+        self.cancel_button.config(state="disabled")
+
+    def toggle_scan_pause(self):
+        if not self.scan_worker:
+            return
+        if self.scan_worker.control.paused:
+            self.scan_worker.resume()
+            self.pause_button.config(text="Pause")
+        else:
+            self.scan_worker.pause()
+            self.pause_button.config(text="Resume")
+            self.scan_status.set("Paused")
+
+    def cancel_scan(self):
+        if self.scan_worker:
+            self.scan_worker.cancel()
+            self.scan_status.set("Cancelling...")
+
+    def confirm_candidates(self, prefix, filters):
+        """
+        Upgrade unconfirmed candidates (shared size/partial hash) to full hashes,
+        on a background thread; the sizes and hashes computed are written in batches.
+        """
+        with self.db.batch_writer() as batch:
+            def save(record, field):
+                batch.update(record["file_path"], **{field: record[field]})
+
+            DuplicateFinder(on_update=save).confirm_all(self.db.get_duplicate_candidates(prefix, filters))
+
     def browse_metadata(self):
         self.media_listbox.delete(0, END)
-        files = self.db.get_all_files()
-        if not files:
+        self.browse_after_id = 0
+        if not self.show_metadata_page():
             self.media_listbox.insert(END, "No metadata found in the database.")
-            return
+
+    def next_metadata_page(self):
+        self.media_listbox.delete(0, END)
+        if not self.show_metadata_page():
+            self.media_listbox.insert(END, "No more metadata.")
+
+    def show_metadata_page(self, page_size=10):
+        """Show the next keyset page of metadata; returns False when there are no more rows."""
+        files, self.browse_after_id = self.db.get_files_page(
+            columns=("file_name", "file_path", "hash_value"),
+            after_id=getattr(self, "browse_after_id", 0),
+            limit=page_size,
+            include_exif=True
+        )
+        if not files:
+            return False
 
         # Table header
         header = f"{'File Name':30} | {'Path':40} | {'Hash':64} | {'EXIF Keys':20}"
         self.media_listbox.insert(END, header)
         self.media_listbox.insert(END, "-" * len(header))
 
-        for f in files[:10]:
+        for f in files:
             exif_keys = ", ".join(f['exif_data'].keys()) if isinstance(f['exif_data'], dict) else ""
-            row = f"{f['file_name'][:30]:30} | {f['file_path'][:40]:40} | {f['hash_value'][:64]:64} | {exif_keys[:20]:20}"
+            hash_value = f['hash_value'] or ""
+            row = f"{f['file_name'][:30]:30} | {f['file_path'][:40]:40} | {hash_value[:64]:64} | {exif_keys[:20]:20}"
             self.media_listbox.insert(END, row)
+        return True
 
     # --- Deduplication Mode ---
     def setup_dedupe_mode(self, parent=None):
@@ -165,219 +259,325 @@ class AppUI:
         path_options = ["All"] + paths
         path_menu = OptionMenu(parent, self.selected_path, *path_options)
         path_menu.pack(pady=5)
+        self.match_mode = StringVar(value="Exact")
+        match_menu = OptionMenu(parent, self.match_mode, "Exact", "Similar images")
+        match_menu.pack(pady=5)
+        # Narrow the groups by camera and capture date (typed, indexed columns)
+        filter_row = Frame(parent)
+        filter_row.pack(pady=5)
+        self.cameras = {"All cameras": (None, None)}
+        for row in self.db.get_camera_summary():
+            if row["camera_make"] or row["camera_model"]:
+                label = " ".join(filter(None, (row["camera_make"], row["camera_model"])))
+                self.cameras[label] = (row["camera_make"], row["camera_model"])
+        self.selected_camera = StringVar(value="All cameras")
+        OptionMenu(filter_row, self.selected_camera, *self.cameras).pack(side="left")
+        Label(filter_row, text="Taken from:").pack(side="left", padx=(10, 2))
+        self.taken_from = StringVar()
+        Entry(filter_row, textvariable=self.taken_from, width=12).pack(side="left")
+        Label(filter_row, text="to:").pack(side="left", padx=(5, 2))
+        self.taken_to = StringVar()
+        Entry(filter_row, textvariable=self.taken_to, width=12).pack(side="left")
         dedupe_button = Button(parent, text="Find Duplicates", command=self.run_deduplication)
         dedupe_button.pack(pady=5)
-
-        self.duplicate_groups = []
-        self.duplicate_page = 0
-        self.duplicates_per_page = 10
-
-        self.thumb_canvas = None
-        self.thumb_frame = None
-        self.page_label = None
-        self.prev_btn = None
-        self.next_btn = None
+        self.dedupe_status = StringVar(value="")
+        Label(parent, textvariable=self.dedupe_status, font=("Arial", 10)).pack(pady=2)
+        self.dedupe_results = None
+        # Keepers are preselected by these rules; Auto Purge applies them to every group at once
+        rules_row = Frame(parent)
+        rules_row.pack(pady=5)
+        Label(rules_row, text="Keeper rules:").pack(side="left")
+        self.keeper_rules = StringVar(value=DEFAULT_RULES)
+        Entry(rules_row, textvariable=self.keeper_rules, width=60).pack(side="left", padx=5)
+        Button(rules_row, text="Auto Purge (review ties)", command=self.auto_purge_duplicates).pack(side="left")
+
+        self.dedupe_prefix = None
+        self.dedupe_filters = []
+        self.similar_groups = None
+        self.review_groups = None
+        self.duplicate_group_count = 0
+        self.gallery_policy = None
+
+        self.purge_action = StringVar(value="Quarantine")
+        self.purge_status = StringVar(value="")
+        self.purge_results = None
+        self.last_purge_journal = None
 
         browse_meta_button = Button(parent, text="Browse Metadata", command=self.browse_metadata)
         browse_meta_button.pack(pady=5)
+        next_meta_button = Button(parent, text="Next Metadata Page", command=self.next_metadata_page)
+        next_meta_button.pack(pady=5)
+
+        # Navigation and purge controls at the top of the gallery; they exist before any search,
+        # so Auto Purge works straight away
+        nav_frame = Frame(parent, bg="#ffb347")
+        nav_frame.pack(fill="x", pady=(5, 0))
+        self.gallery = DuplicateGallery(parent, self.fetch_duplicate_groups, self.thumb_cache,
+                                        title=self.group_title, default_keeper=self.default_keeper,
+                                        is_local=self.db.is_local, bg="#f7f7f7")
+        Label(nav_frame, textvariable=self.gallery.position, font=("Arial", 12, "bold"), bg="#ffb347").pack(side="left", padx=10)
+        Label(nav_frame, text="Go to group:", bg="#ffb347").pack(side="left", padx=(10, 2))
+        self.goto_entry = Entry(nav_frame, width=8)
+        self.goto_entry.pack(side="left")
+        self.goto_entry.bind("<Return>", lambda event: self.goto_group())
+        Button(nav_frame, text="Go", command=self.goto_group, bg="#fff", font=("Arial", 10, "bold")).pack(side="left", padx=5)
+        self.purge_btn = Button(nav_frame, text="Keep Selected & Purge Duplicates", command=self.purge_selected_duplicates, bg="#d9534f", fg="white", font=("Arial", 11, "bold"))
+        self.purge_btn.pack(side="right", padx=10)
+        OptionMenu(nav_frame, self.purge_action, *PURGE_ACTIONS).pack(side="right", padx=5)
+        self.undo_btn = Button(nav_frame, text="Undo Last Purge", command=self.undo_last_purge, state="disabled", bg="#fff", font=("Arial", 10, "bold"))
+        self.undo_btn.pack(side="right", padx=5)
+        Label(nav_frame, textvariable=self.purge_status, bg="#ffb347").pack(side="right", padx=10)
+        self.gallery.pack(pady=10, fill="both", expand=True)
+
+    def read_dedupe_scope(self):
+        """Set the folder and metadata filters from the controls; False if a date is invalid."""
+        path = self.selected_path.get()
+        make, model = self.cameras[self.selected_camera.get()]
+        try:
+            filters = self.db.metadata_filters(taken_from=self.taken_from.get().strip() or None,
+                                               taken_to=self.taken_to.get().strip() or None,
+                                               camera_make=make, camera_model=model)
+        except ValueError as e:
+            print(f"Invalid date filter: {e}")
+            return False
+        self.dedupe_prefix = None if path == "All" else path
+        self.dedupe_filters = filters
+        return True
 
     def run_deduplication(self):
+        """Find the groups on a background thread (hashing can take minutes); poll_deduplication shows them."""
+        if self.dedupe_results is not None:
+            return
         self.media_listbox.delete(0, END)
-        path = self.selected_path.get()
-        if path == "All":
-            files = self.db.get_all_files()
-        else:
-            files = self.db.get_files_by_path(path)
-        # Group by hash
-        hash_map = {}
-        for info in files:
-            h = info["hash_value"]
-            if h:
-                hash_map.setdefault(h, []).append(info)
-        self.duplicate_groups = [group for group in hash_map.values() if len(group) > 1]
-        self.duplicate_page = 0
-        self.show_duplicate_page()
-
-    def show_duplicate_page(self):
-        # Remove old thumbnail frame if exists
-        if hasattr(self, "v_scroll") and self.v_scroll:
-            self.v_scroll.destroy()
-        if self.thumb_canvas:
-            self.thumb_canvas.destroy()
-        if self.page_label:
-            self.page_label.destroy()
-        if self.prev_btn:
-            self.prev_btn.destroy()
-        if self.next_btn:
-            self.next_btn.destroy()
-        if hasattr(self, "purge_btn") and self.purge_btn:
-            self.purge_btn.destroy()
-        if hasattr(self, "nav_frame") and self.nav_frame:
-            self.nav_frame.destroy()
-
-        # Navigation and purge buttons at the top
-        self.nav_frame = Frame(self.dedupe_tab, bg="#ffb347")
-        self.nav_frame.pack(fill="x", pady=(5, 0))
-        total_pages = max(1, (len(self.duplicate_groups) + self.duplicates_per_page - 1) // self.duplicates_per_page)
-        self.page_label = Label(self.nav_frame, text=f"Page {self.duplicate_page+1} of {total_pages}", font=("Arial", 12, "bold"), bg="#ffb347")
-        self.page_label.pack(side="left", padx=10)
-        self.prev_btn = Button(self.nav_frame, text="Previous", command=self.prev_duplicate_page, bg="#fff", font=("Arial", 10, "bold"))
-        self.prev_btn.pack(side="left", padx=10)
-        self.next_btn = Button(self.nav_frame, text="Next", command=self.next_duplicate_page, bg="#fff", font=("Arial", 10, "bold"))
-        self.next_btn.pack(side="left", padx=10)
-        self.purge_btn = Button(self.nav_frame, text="Keep Selected & Purge Duplicates", command=self.purge_selected_duplicates, bg="#d9534f", fg="white", font=("Arial", 11, "bold"))
-        self.purge_btn.pack(side="right", padx=10)
+        if not self.read_dedupe_scope():
+            return
+        prefix, filters, similar = self.dedupe_prefix, self.dedupe_filters, self.match_mode.get() == "Similar images"
 
-        # Canvas with vertical scrollbar for thumbnails
-        self.thumb_canvas = Canvas(self.dedupe_tab, width=1600, height=700, bg="#f7f7f7", highlightthickness=0)
-        self.thumb_canvas.pack(pady=10, fill="both", expand=True, side="left")
-        self.v_scroll = Scrollbar(self.dedupe_tab, orient="vertical", command=self.thumb_canvas.yview)
-        self.v_scroll.pack(side="right", fill="y")
-        self.thumb_canvas.configure(yscrollcommand=self.v_scroll.set)
-
-        self.thumb_frame = Frame(self.thumb_canvas, bg="#f7f7f7")
-        self.thumb_canvas.create_window((0, 0), window=self.thumb_frame, anchor='nw')
-
-        # Show only 10 groups per page
-        self.duplicates_per_page = 10
-        start = self.duplicate_page * self.duplicates_per_page
-        end = start + self.duplicates_per_page
-        groups = self.duplicate_groups[start:end]
-
-        self.thumbnails = []
-        self.keep_vars = []
-        self.group_file_refs = []
-
-        # Grid layout: 2 columns, 5 rows (adjust cols as needed)
-        cols = 2
-        for idx, group in enumerate(groups):
-            row = idx // cols
-            col = idx % cols
-            group_card = Frame(self.thumb_frame, bd=2, relief="groove", padx=5, pady=5, bg="#fffbe6")
-            group_card.grid(row=row, column=col, padx=16, pady=16, sticky="n")
-
-            group_label = Label(group_card, text=f"Group {start+idx+1} (hash: {group[0]['hash_value'][:8]}...)", font=("Arial", 11, "bold"), bg="#fffbe6")
-            group_label.pack(anchor="w", pady=(0, 4))
-
-            thumbs_row = Frame(group_card, bg="#fffbe6")
-            thumbs_row.pack(anchor="w", pady=2)
-            names_row = Frame(group_card, bg="#fffbe6")
-            names_row.pack(anchor="w", pady=(0,2))
-
-            keep_var = tk.IntVar(value=0)
-            self.keep_vars.append(keep_var)
-            file_refs = []
-            for j, f in enumerate(group):
-                is_duplicate = f.get("is_duplicate", False)
-                if is_duplicate:
-                    thumb = self.get_thumbnail(None, purged=True)
-                else:
-                    thumb = self.get_thumbnail(f['file_path'], gray=False)
-                thumb_label = Label(thumbs_row, image=thumb, bg="#fffbe6", bd=2, relief="ridge")
-                thumb_label.image = thumb
-                thumb_label.grid(row=0, column=j, padx=8, pady=2)
-                file_label = Label(names_row, text=f['file_name'], wraplength=120, font=("Arial", 9), bg="#fffbe6")
-                file_label.grid(row=0, column=j, padx=8, pady=(0, 6))
-                rb = tk.Radiobutton(
-                    thumbs_row, variable=keep_var, value=j,
-                    state="disabled" if is_duplicate else "normal",
-                    bg="#fffbe6"
-                )
-                rb.grid(row=1, column=j, pady=(2, 0))
-                file_refs.append(f)
-            self.group_file_refs.append(file_refs)
-
-        self.thumb_frame.update_idletasks()
-        self.thumb_canvas.config(scrollregion=self.thumb_canvas.bbox("all"))
-
-    def get_thumbnail(self, file_path, size=(100, 100), gray=False, purged=False):
-        from PIL import ImageDraw, ImageFont
-        if purged:
-            # Create a gray rectangle with "Purged" text
-            img = Image.new('RGB', size, color='#cccccc')
-            draw = ImageDraw.Draw(img)
-            text = "Purged"
+        def find(results):
             try:
-                font = ImageFont.truetype("arial.ttf", 16)
-            except Exception:
-                font = ImageFont.load_default()
-            bbox = draw.textbbox((0, 0), text, font=font)
-            w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            draw.text(((size[0]-w)//2, (size[1]-h)//2), text, fill="black", font=font)
-            thumb = ImageTk.PhotoImage(img)
-            self.thumbnails.append(thumb)
-            return thumb
+                if similar:
+                    # Near-duplicates: perceptual hashes clustered through a BK-tree, kept as row ids
+                    groups = find_similar_groups(self.db.iter_perceptual_hashes(prefix, filters))
+                    results.put((groups, len(groups)))
+                    return
+                # Hash lazily; the grouping itself then happens in SQL, one page at a time
+                self.confirm_candidates(prefix, filters)
+                results.put((None, self.db.count_duplicate_groups(prefix, filters)))
+            except Exception as e:
+                print(f"Finding duplicates failed: {e}")
+                results.put(None)
+
+        self.dedupe_results = queue.Queue()
+        self.dedupe_status.set("Finding duplicates...")
+        threading.Thread(target=find, args=(self.dedupe_results,), daemon=True).start()
+        self.master.after(200, self.poll_deduplication)
+
+    def poll_deduplication(self):
+        try:
+            result = self.dedupe_results.get_nowait()
+        except queue.Empty:
+            self.master.after(200, self.poll_deduplication)
+            return
+        self.dedupe_results = None
+        if result is None:
+            self.dedupe_status.set("Finding duplicates failed (see console)")
+            return
+        self.dedupe_status.set("")
+        self.review_groups = None
+        self.similar_groups, self.duplicate_group_count = result
+        self.show_duplicate_groups()
+
+    def fetch_duplicate_groups(self, offset, limit):
+        """One page of groups from the active mode: SQL exact-hash groups, or in-memory similar / review groups."""
+        id_groups = self.review_groups if self.review_groups is not None else self.similar_groups
+        if id_groups is None:
+            return self.db.find_duplicate_groups(self.dedupe_prefix, limit=limit, offset=offset,
+                                                 filters=self.dedupe_filters)
+        page = id_groups[offset:offset + limit]
+        # Similar images differ, so their metadata matters to the keeper rules
+        files = self.db.get_files_by_ids(
+            (file_id for group in page for file_id in group),
+            columns=("file_name", "file_path", "hash_value", "is_duplicate", "size", "mtime_ns", "host")
+            + METADATA_COLUMNS
+        )
+        return [[files[file_id] for file_id in group if file_id in files] for group in page]
+
+    def show_duplicate_groups(self):
+        """Point the gallery at the groups of the active mode."""
+        self.gallery_policy = self.keeper_policy()
+        self.undo_btn.config(state="normal" if self.last_purge_journal and self.purge_results is None else "disabled")
+        self.gallery.reset(self.duplicate_group_count)
+
+    def refresh_duplicate_groups(self):
+        """Reload the shown groups in place, e.g. after purging from the review list."""
+        self.undo_btn.config(state="normal" if self.last_purge_journal and self.purge_results is None else "disabled")
+        self.gallery.refresh()
+
+    def group_title(self, index, group):
+        if self.review_groups is not None:
+            return f"Group {index + 1} (review: no rule picked a keeper, {len(group)} files)"
+        if self.similar_groups is None:
+            return f"Group {index + 1} (hash: {group[0]['hash_value'][:8]}..., {len(group)} files)"
+        return f"Group {index + 1} (similar images: {len(group)})"
+
+    def default_keeper(self, group):
+        decision = self.gallery_policy.choose(group) if self.gallery_policy else None
+        return group.index(decision["keeper"]) if decision else 0
+
+    def goto_group(self):
         try:
-            img = Image.open(file_path)
-            img.thumbnail(size)
-            if gray:
-                img = img.convert("LA").convert("RGB")
-            thumb = ImageTk.PhotoImage(img)
-            self.thumbnails.append(thumb)
-            return thumb
-        except Exception:
-            # Return a blank image if error
-            img = Image.new('RGB', size, color='gray')
-            thumb = ImageTk.PhotoImage(img)
-            self.thumbnails.append(thumb)
-            return thumb
-
-    def next_duplicate_page(self):
-        total_pages = max(1, (len(self.duplicate_groups) + self.duplicates_per_page - 1) // self.duplicates_per_page)
-        if self.duplicate_page < total_pages - 1:
-            self.duplicate_page += 1
-            self.show_duplicate_page()
-
-    def prev_duplicate_page(self):
-        if self.duplicate_page > 0:
-            self.duplicate_page -= 1
-            self.show_duplicate_page()
+            index = int(self.goto_entry.get()) - 1
+        except ValueError:
+            return
+        self.gallery.scroll_to(index)
 
     def purge_selected_duplicates(self):
-        # For each group, keep the selected, mark others as duplicate and copy them
-        dest_folder = r"C:\duplicate_pics"
-        os.makedirs(dest_folder, exist_ok=True)
-        for group_idx, keep_var in enumerate(self.keep_vars):
-            keep_idx = keep_var.get()
-            files = self.group_file_refs[group_idx]
-            for idx, f in enumerate(files):
-                if idx != keep_idx and not f.get("is_duplicate", False):
-                    # Mark as duplicate in DB
-                    self.db.mark_as_duplicate(f['file_path'])
-                    # Copy file to dest_folder
-                    try:
-                        shutil.copy2(f['file_path'], dest_folder)
-                    except Exception as e:
-                        print(f"Failed to copy {f['file_path']}: {e}")
+        # For each group, keep the selected file and purge the others through the PurgeEngine
+        if self.purge_results is not None:
+            return
+        jobs = []
+        for files, keep_idx in self.gallery.selections():
+            keeper = files[keep_idx]
+            if keeper.get("is_duplicate", False):
+                # The default selection may be a copy purged earlier; keep the first live one instead
+                keeper = next((f for f in files if not f.get("is_duplicate", False)), None)
+            # Copies on other hosts of a merged catalog can only be purged on their own host
+            duplicates = [f for f in files if f is not keeper and not f.get("is_duplicate", False) and self.db.is_local(f)]
+            if keeper and duplicates:
+                jobs.append((keeper, duplicates))
+        if not jobs:
+            return
+        target = self.ask_purge_target()
+        if target is None:
+            return
+        # Similar images differ byte-wise, so only exact groups can be hash-verified
+        engine = PurgeEngine(*target, verify=self.similar_groups is None)
+        self.last_purge_journal = engine.journal_path
+        # Purging from the review list stays on it; otherwise the groups are reloaded
+        on_done = self.refresh_duplicate_groups if self.review_groups is not None else None
+        self.start_purge(lambda: engine.run(jobs), f"Purging ({self.purge_action.get().rstrip('.')})...", "purged",
+                         on_done)
+
+    def auto_purge_duplicates(self):
+        """Purge every exact group the keeper rules decide, then list the tied groups for review."""
+        policy = self.keeper_policy()
+        target = self.ask_purge_target() if policy and self.purge_results is None else None
+        if target is None or not self.read_dedupe_scope():
+            return
+        prefix, filters = self.dedupe_prefix, self.dedupe_filters
+        ambiguous = []
+
+        def decided_jobs():
+            # On the purge thread: confirm the candidates (full hashing), then one streaming pass over all groups
+            self.confirm_candidates(prefix, filters)
+            groups = self.db.iter_duplicate_groups(prefix, filters=filters)
+            for decision in policy.decide_all(groups):
+                if decision["ambiguous"]:
+                    files = sorted([decision["keeper"]] + decision["duplicates"], key=lambda f: f["file_path"])
+                    ambiguous.append([f["id"] for f in files])
+                else:
+                    duplicates = [f for f in decision["duplicates"] if self.db.is_local(f)]
+                    if duplicates:
+                        yield decision["keeper"], duplicates
+
+        engine = PurgeEngine(*target)
+        self.last_purge_journal = engine.journal_path
+        self.start_purge(lambda: engine.run(decided_jobs()), "Auto purging...", "purged",
+                         lambda: self.show_review_groups(ambiguous))
+
+    def show_review_groups(self, groups):
+        self.similar_groups = None
+        self.review_groups = groups
+        self.duplicate_group_count = len(groups)
+        self.show_duplicate_groups()
+
+    def keeper_policy(self):
+        try:
+            return KeeperPolicy(self.keeper_rules.get())
+        except ValueError as e:
+            print(f"Invalid keeper rules: {e}")
+            return None
+
+    def ask_purge_target(self):
+        """(action, dest) for the selected purge action, or None if the user cancelled the folder choice."""
+        action = PURGE_ACTIONS[self.purge_action.get()]
+        if action != MOVE:
+            return action, None
+        dest = filedialog.askdirectory(title="Move duplicates to")
+        return (action, dest) if dest else None
+
+    def undo_last_purge(self):
+        if self.purge_results is not None or not self.last_purge_journal or not os.path.exists(self.last_purge_journal):
+            return
+        journal, self.last_purge_journal = self.last_purge_journal, None
+        self.start_purge(lambda: PurgeEngine().undo(journal), "Undoing last purge...", "restored")
+
+    def start_purge(self, results_factory, status, verb, on_done=None):
+        """
+        Run a purge or undo on a background thread, which also records the
+        results in the catalog (batched) and posts running counters for
+        poll_purge_results; on_done is called once it has finished.
+        """
+        self.purge_results = queue.Queue()
+        self.purge_on_done = on_done or self.run_deduplication
+        self.purge_verb = verb
+        self.purge_status.set(status)
+        self.purge_btn.config(state="disabled")
+
+        def run(results=self.purge_results):
+            summary = {"files": 0, "bytes": 0, "errors": 0}
+            try:
+                with self.db.batch_writer(PURGE_BATCH) as batch:
+                    for result in results_factory():
+                        if result["status"] in ("done", "linked"):
+                            batch.update(result["file_path"], is_duplicate=1)
+                        elif result["status"] == "restored":
+                            batch.update(result["file_path"], is_duplicate=0)
+                        else:
+                            summary["errors"] += 1
+                            print(f"Could not purge {result['file_path']}: {result['error']}")
+                            continue
+                        summary["files"] += 1
+                        summary["bytes"] += result["reclaimed"]
+                        if summary["files"] % PURGE_BATCH == 0:
+                            results.put(("progress", dict(summary)))
+            except Exception as e:
+                print(f"Purge failed: {e}")
+            results.put(("done", summary))
+
+        threading.Thread(target=run, daemon=True).start()
+        self.master.after(200, self.poll_purge_results)
+
+    def poll_purge_results(self):
+        summary = None
+        # Bounded per tick, so a backlog of updates never holds up the Tk thread
+        for _ in range(PURGE_POLL_LIMIT):
+            try:
+                kind, summary = self.purge_results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "done":
+                self.finish_purge(summary)
+                return
+        if summary:
+            self.purge_status.set(f"{summary['files']} files {self.purge_verb} so far...")
+        self.master.after(200, self.poll_purge_results)
+
+    def finish_purge(self, summary):
+        self.purge_results = None
+        self.purge_btn.config(state="normal")
+        message = f"{summary['files']} files {self.purge_verb}"
+        if self.purge_verb == "purged":
+            message += f" ({summary['bytes'] / 1e6:.1f} MB reclaimed)"
+        if summary["errors"]:
+            message += f", {summary['errors']} skipped (see console)"
+        self.purge_status.set(message)
         # Refresh page to gray out purged files
-        self.run_deduplication()
+        self.purge_on_done()
 
     def clean_exif_data(self, exif_data):
         """Recursively convert bytes and non-JSON-serializable EXIF data to strings or floats."""
-        import numbers
-
-        # Import IFDRational from PIL if available
-        try:
-            from PIL.TiffImagePlugin import IFDRational
-        except ImportError:
-            IFDRational = None
-
-        if isinstance(exif_data, dict):
-            return {k: self.clean_exif_data(v) for k, v in exif_data.items()}
-        elif isinstance(exif_data, (list, tuple)):
-            return [self.clean_exif_data(v) for v in exif_data]
-        elif isinstance(exif_data, bytes):
-            try:
-                return exif_data.decode(errors="replace")
-            except Exception:
-                return str(exif_data)
-        elif IFDRational and isinstance(exif_data, IFDRational):
-            # Convert IFDRational to float
-            return float(exif_data)
-        elif isinstance(exif_data, numbers.Number):
-            return exif_data
-        else:
-            return str(exif_data)
+        return clean_exif_data(exif_data)
 
 if __name__ == "__main__":
     root = Tk()
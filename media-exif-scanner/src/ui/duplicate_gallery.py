@@ -0,0 +1,315 @@
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import Frame, Label, Button, Scrollbar, StringVar
+
+from PIL import Image, ImageDraw, ImageFont, ImageTk
+
+from src.utils.thumbnail_cache import thumbnail_key
+
+ROW_HEIGHT = 190
+THUMB_SIZE = (100, 100)
+CARD_BG = "#fffbe6"
+
+
+def _text_image(text, color, size=THUMB_SIZE):
+    img = Image.new("RGB", size, color=color)
+    if text:
+        draw = ImageDraw.Draw(img)
+        try:
+            font = ImageFont.truetype("arial.ttf", 16)
+        except Exception:
+            font = ImageFont.load_default()
+        bbox = draw.textbbox((0, 0), text, font=font)
+        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        draw.text(((size[0] - w) // 2, (size[1] - h) // 2), text, fill="black", font=font)
+    return ImageTk.PhotoImage(img)
+
+
+class DuplicateGallery(Frame):
+    """
+    Virtualized list of duplicate groups, one fixed-height row per group.
+
+    Only the rows that fit on screen exist as widgets; scrolling rebinds them
+    to other groups instead of building new ones, and scroll_to() jumps to
+    any group index. Groups are fetched through fetch(offset, limit) a page
+    at a time and kept in a small LRU. A row shows `columns` files at once,
+    with arrows to step through larger groups. Thumbnails load from the
+    ThumbnailCache in the background behind a placeholder, and only the most
+    recent max_images PhotoImages are held.
+
+    Keeper choices survive scrolling: default_keeper(group) preselects an
+    index and the user's picks are remembered per group. selections() returns
+    the groups shown since the last reset()/refresh() with their keepers.
+    Files for which is_local(file) is false (other hosts' files in a merged
+    catalog) only show thumbnails already in the cache.
+    """
+
+    def __init__(self, master, fetch, thumb_cache, title=None, default_keeper=None, columns=8, page_size=50,
+                 max_pages=16, max_images=400, is_local=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.fetch = fetch
+        self.thumb_cache = thumb_cache
+        self.title = title or (lambda index, group: f"Group {index + 1} ({len(group)} files)")
+        self.default_keeper = default_keeper or (lambda group: 0)
+        self.is_local = is_local or (lambda f: True)
+        self.columns = columns
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.max_images = max_images
+        self.position = StringVar(value="")
+
+        self.count = 0
+        self.top = 0
+        self.visible = 1
+        self.pages = OrderedDict()
+        self.images = OrderedDict()
+        self.choices = {}  # group index -> file_path picked by the user
+        self.offsets = {}  # group index -> first file shown in its row
+        self.seen = set()
+        self.pending = []
+        self.rows = []
+        self.placeholder = _text_image("", "#dddddd")
+        self.purged = _text_image("Purged", "#cccccc")
+        self.remote = _text_image("Remote", "#dddddd")
+
+        self.scrollbar = Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.body = Frame(self, bg="#f7f7f7")
+        self.body.pack(side="left", fill="both", expand=True)
+        self.body.bind("<Configure>", self._on_configure)
+        self.body.bind("<Enter>", lambda event: self._bind_wheel(True))
+        self.body.bind("<Leave>", lambda event: self._bind_wheel(False))
+
+    # --- Data ---
+    def reset(self, count):
+        """Show count groups from the top, forgetting cached pages, choices and what was seen."""
+        self.count = count
+        self.top = 0
+        self.pages.clear()
+        self.choices.clear()
+        self.offsets.clear()
+        self.seen.clear()
+        self.render()
+
+    def refresh(self):
+        """Reload the groups (e.g. after a purge) but stay at the same position and keep the user's choices."""
+        self.pages.clear()
+        self.seen.clear()
+        self.render()
+
+    def group(self, index):
+        page_index = index // self.page_size
+        page = self.pages.get(page_index)
+        if page is None:
+            page = self.pages[page_index] = self.fetch(page_index * self.page_size, self.page_size)
+            if len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(page_index)
+        offset = index - page_index * self.page_size
+        return page[offset] if offset < len(page) else None
+
+    def keeper_index(self, index, group):
+        chosen = self.choices.get(index)
+        for i, f in enumerate(group):
+            if f["file_path"] == chosen:
+                return i
+        return self.default_keeper(group)
+
+    def selections(self):
+        """(group, keeper index) for every group shown since the last reset()/refresh()."""
+        for index in sorted(self.seen):
+            group = self.group(index)
+            if group:
+                yield group, self.keeper_index(index, group)
+
+    # --- Scrolling ---
+    def scroll_to(self, index):
+        self.top = max(0, min(index, self.count - self.visible))
+        self.render()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(value) * self.count))
+        elif action == "scroll":
+            self.scroll_to(self.top + int(value) * (self.visible if unit == "pages" else 1))
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) in (4, 5):
+            step = -1 if event.num == 4 else 1
+        else:
+            step = -1 if event.delta > 0 else 1
+        self.scroll_to(self.top + step)
+
+    def _bind_wheel(self, active):
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            if active:
+                self.bind_all(sequence, self._on_wheel)
+            else:
+                self.unbind_all(sequence)
+
+    def _on_configure(self, event):
+        visible = max(1, event.height // ROW_HEIGHT)
+        if visible != self.visible or len(self.rows) < visible:
+            self.visible = visible
+            while len(self.rows) < visible:
+                self.rows.append(_GroupRow(self, self.body))
+            self.render()
+
+    # --- Rendering ---
+    def render(self):
+        for i, row in enumerate(self.rows):
+            index = self.top + i
+            group = self.group(index) if i < self.visible and index < self.count else None
+            if group is None:
+                row.hide()
+                continue
+            self.seen.add(index)
+            row.show(index, group, self.offsets.get(index, 0))
+        if self.count:
+            last = min(self.count, self.top + self.visible)
+            self.scrollbar.set(self.top / self.count, last / self.count)
+            self.position.set(f"Groups {self.top + 1}-{last} of {self.count}")
+        else:
+            self.scrollbar.set(0, 1)
+            self.position.set("No duplicate groups")
+        # Warm the cache for the groups just below the visible ones
+        ahead = (self.group(index) for index in range(self.top + self.visible, min(self.count, self.top + 2 * self.visible)))
+        self.thumb_cache.prefetch(f for group in ahead if group for f in group[:self.columns]
+                                  if not f.get("is_duplicate") and self.is_local(f))
+
+    def choose(self, index, group, file_index):
+        self.choices[index] = group[file_index]["file_path"]
+
+    def shift(self, index, group, step):
+        offset = self.offsets.get(index, 0) + step * self.columns
+        self.offsets[index] = max(0, min(offset, len(group) - 1))
+        self.render()
+
+    def show_thumbnail(self, slot, f):
+        """Put f's thumbnail on slot, or a placeholder that poll_thumbnails() replaces once it is generated."""
+        if f.get("is_duplicate"):
+            slot.key = None
+            slot.set_image(self.purged)
+            return
+        key = slot.key = thumbnail_key(f)
+        image = self.images.get(key)
+        if image is None:
+            path = self.thumb_cache.get(key)
+            if path is None and not self.is_local(f):
+                slot.set_image(self.remote)
+                return
+            if path is None:
+                slot.set_image(self.placeholder)
+                self.pending.append((self.thumb_cache.request(f["file_path"], key), key))
+                if len(self.pending) == 1:
+                    self.after(50, self.poll_thumbnails)
+                return
+            image = self._load_image(key, path)
+        else:
+            self.images.move_to_end(key)
+        slot.set_image(image)
+
+    def poll_thumbnails(self):
+        """Swap placeholders for thumbnails finished by the cache workers (Tk calls stay on the UI thread)."""
+        pending = []
+        for future, key in self.pending:
+            if not future.done():
+                pending.append((future, key))
+                continue
+            # The slot may have been recycled for another file meanwhile
+            slots = [slot for row in self.rows for slot in row.slots if slot.key == key]
+            if future.result() and slots:
+                image = self._load_image(key, future.result())
+                for slot in slots:
+                    slot.set_image(image)
+        self.pending = pending
+        if pending:
+            self.after(50, self.poll_thumbnails)
+
+    def _load_image(self, key, path):
+        try:
+            with Image.open(path) as img:
+                image = ImageTk.PhotoImage(img)
+        except Exception:
+            image = _text_image("", "gray")
+        self.images[key] = image
+        if len(self.images) > self.max_images:
+            self.images.popitem(last=False)
+        return image
+
+
+class _GroupRow:
+    """One recycled row: a title, arrows for long groups, and `columns` thumbnail slots."""
+
+    def __init__(self, gallery, parent):
+        self.gallery = gallery
+        self.index = None
+        self.group = None
+        self.frame = Frame(parent, bd=2, relief="groove", padx=5, pady=5, bg=CARD_BG, height=ROW_HEIGHT - 8)
+        self.frame.pack_propagate(False)
+        header = Frame(self.frame, bg=CARD_BG)
+        header.pack(fill="x")
+        self.title = Label(header, font=("Arial", 11, "bold"), bg=CARD_BG)
+        self.title.pack(side="left")
+        self.next_btn = Button(header, text="▶", command=lambda: gallery.shift(self.index, self.group, 1))
+        self.next_btn.pack(side="right")
+        self.prev_btn = Button(header, text="◀", command=lambda: gallery.shift(self.index, self.group, -1))
+        self.prev_btn.pack(side="right")
+        strip = Frame(self.frame, bg=CARD_BG)
+        strip.pack(anchor="w", pady=2)
+        self.keep_var = tk.IntVar(value=0)
+        self.slots = [_Slot(self, strip, column) for column in range(gallery.columns)]
+
+    def show(self, index, group, offset):
+        self.index, self.group = index, group
+        self.title.configure(text=self.gallery.title(index, group))
+        self.keep_var.set(self.gallery.keeper_index(index, group))
+        for column, slot in enumerate(self.slots):
+            file_index = offset + column
+            if file_index < len(group):
+                slot.show(file_index, group[file_index])
+            else:
+                slot.hide()
+        more = len(group) > self.gallery.columns
+        self.prev_btn.configure(state="normal" if more and offset > 0 else "disabled")
+        self.next_btn.configure(state="normal" if more and offset + self.gallery.columns < len(group) else "disabled")
+        self.frame.pack(fill="x", padx=16, pady=4)
+
+    def hide(self):
+        self.index = self.group = None
+        for slot in self.slots:
+            slot.key = None
+        self.frame.pack_forget()
+
+
+class _Slot:
+    def __init__(self, row, parent, column):
+        self.row = row
+        self.key = None
+        self.frame = Frame(parent, bg=CARD_BG)
+        self.column = column
+        self.thumb = Label(self.frame, bg=CARD_BG, bd=2, relief="ridge")
+        self.thumb.pack()
+        self.radio = tk.Radiobutton(self.frame, variable=row.keep_var, bg=CARD_BG, command=self._chosen)
+        self.radio.pack()
+        self.name = Label(self.frame, wraplength=110, font=("Arial", 9), bg=CARD_BG)
+        self.name.pack()
+
+    def show(self, file_index, f):
+        self.radio.configure(value=file_index, state="disabled" if f.get("is_duplicate") else "normal")
+        # Files merged from another host's shard are labelled with it
+        self.name.configure(text=f"{f['host']}: {f['file_name']}" if f.get("host") else f["file_name"])
+        self.row.gallery.show_thumbnail(self, f)
+        self.frame.grid(row=0, column=self.column, padx=8)
+
+    def hide(self):
+        self.key = None
+        self.frame.grid_remove()
+
+    def set_image(self, image):
+        self.thumb.configure(image=image)
+        self.thumb.image = image
+
+    def _chosen(self):
+        self.row.gallery.choose(self.row.index, self.row.group, self.row.keep_var.get())
@@ -0,0 +1,58 @@
+from src.utils.phash_utils import hamming_distance
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes for Hamming-distance range queries.
+
+    Each node keeps the items whose hash is exactly its key; children are keyed
+    by their distance to the node. The triangle inequality lets search() skip
+    every subtree outside [d - threshold, d + threshold], so lookups touch a
+    small fraction of the tree instead of comparing all pairs.
+    """
+
+    def __init__(self, distance=hamming_distance):
+        self.distance = distance
+        self.root = None  # [key, items, {distance: child}]
+        self.size = 0
+
+    def add(self, key, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = self.distance(key, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [key, [item], {}]
+                return
+            node = child
+
+    def search(self, key, threshold):
+        """Return [(distance, item)] for every item within threshold of key."""
+        results = []
+        if self.root is None:
+            return results
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = self.distance(key, node[0])
+            if d <= threshold:
+                results.extend((d, item) for item in node[1])
+            for child_d, child in node[2].items():
+                if d - threshold <= child_d <= d + threshold:
+                    stack.append(child)
+        return results
+
+    def nodes(self):
+        """Yield (key, items) for every distinct hash in the tree."""
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            yield node[0], node[1]
+            stack.extend(node[2].values())
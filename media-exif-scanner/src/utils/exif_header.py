@@ -0,0 +1,294 @@
+"""
+Header-only EXIF reader for JPEG, TIFF (and TIFF-based RAW), PNG and HEIC/AVIF.
+
+Only the container headers are touched: JPEG segments are walked with small
+reads up to the start of scan, PNG chunks up to the first IDAT, HEIC boxes up
+to the Exif item, and TIFF files are memory-mapped so only the IFD pages are
+faulted in. Values are decoded straight into JSON-safe primitives, so no
+Pillow objects are built and clean_exif_data() has nothing left to do.
+"""
+import mmap
+import struct
+
+# Tags kept by default, by IFD. Names match PIL.ExifTags so rows look the same
+# whichever reader produced them.
+IFD0_TAGS = {
+    0x0100: "ImageWidth",
+    0x0101: "ImageLength",
+    0x010F: "Make",
+    0x0110: "Model",
+    0x0112: "Orientation",
+    0x0132: "DateTime",
+}
+EXIF_TAGS = {
+    0x9003: "DateTimeOriginal",
+    0x9004: "DateTimeDigitized",
+    0x9011: "OffsetTimeOriginal",
+    0xA002: "ExifImageWidth",
+    0xA003: "ExifImageHeight",
+}
+GPS_TAGS = {
+    0x00: "GPSVersionID",
+    0x01: "GPSLatitudeRef",
+    0x02: "GPSLatitude",
+    0x03: "GPSLongitudeRef",
+    0x04: "GPSLongitude",
+    0x05: "GPSAltitudeRef",
+    0x06: "GPSAltitude",
+    0x07: "GPSTimeStamp",
+    0x1D: "GPSDateStamp",
+}
+DEFAULT_TAGS = frozenset(IFD0_TAGS.values()) | frozenset(EXIF_TAGS.values()) | {"GPSInfo"}
+
+_EXIF_IFD_POINTER = 0x8769
+_GPS_IFD_POINTER = 0x8825
+# TIFF field type -> (struct code, size in bytes)
+_TYPES = {
+    1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 5: ("II", 8), 6: ("b", 1), 7: ("s", 1),
+    8: ("h", 2), 9: ("i", 4), 10: ("ii", 8), 11: ("f", 4), 12: ("d", 8),
+}
+# JPEG start-of-frame markers carrying the image dimensions
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"heim", b"heis", b"mif1", b"msf1", b"avif"}
+
+
+class ExifFormatError(ValueError):
+    """Raised for truncated or malformed metadata; callers fall back to Pillow."""
+
+
+def read_exif_header(file_path, tags=DEFAULT_TAGS):
+    """
+    Return the whitelisted EXIF tags of an image as a JSON-safe dict.
+
+    Returns None when the container is not one this reader understands (or is
+    malformed), so the caller can fall back to Pillow. A supported file with
+    no EXIF yields the dimensions found in its header, or {}.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(16)
+            if head[:2] == b"\xff\xd8":
+                return _read_jpeg(f, tags)
+            if head[:8] == b"\x89PNG\r\n\x1a\n":
+                return _read_png(f, tags)
+            if head[:4] in (b"II*\x00", b"MM\x00*"):
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return parse_tiff(data, tags)
+            if head[4:8] == b"ftyp" and head[8:12] in _HEIF_BRANDS:
+                return _read_heif(f, tags)
+    except (OSError, ValueError, struct.error, IndexError):
+        return None
+    return None
+
+
+def parse_tiff(data, tags=DEFAULT_TAGS):
+    """Parse a TIFF/EXIF block (bytes, memoryview or mmap) into a dict of whitelisted tags."""
+    if data[:2] == b"II":
+        order = "<"
+    elif data[:2] == b"MM":
+        order = ">"
+    else:
+        raise ExifFormatError("bad TIFF byte order")
+    if struct.unpack_from(order + "H", data, 2)[0] != 42:
+        raise ExifFormatError("bad TIFF magic")
+    result = {}
+    ifd0 = _read_ifd(data, order, struct.unpack_from(order + "I", data, 4)[0])
+    _collect(ifd0, IFD0_TAGS, tags, data, order, result)
+    if _EXIF_IFD_POINTER in ifd0:
+        exif_ifd = _read_ifd(data, order, _value(data, order, *ifd0[_EXIF_IFD_POINTER]))
+        _collect(exif_ifd, EXIF_TAGS, tags, data, order, result)
+    if "GPSInfo" in tags and _GPS_IFD_POINTER in ifd0:
+        gps_ifd = _read_ifd(data, order, _value(data, order, *ifd0[_GPS_IFD_POINTER]))
+        gps = {}
+        _collect(gps_ifd, GPS_TAGS, GPS_TAGS.values(), data, order, gps)
+        if gps:
+            result["GPSInfo"] = gps
+    return result
+
+
+def _read_ifd(data, order, offset):
+    """Return {tag: (type, count, value_field_offset)} for one IFD."""
+    (count,) = struct.unpack_from(order + "H", data, offset)
+    if count > 1000:
+        raise ExifFormatError("implausible IFD entry count")
+    entries = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        tag, field_type, value_count = struct.unpack_from(order + "HHI", data, entry)
+        if field_type in _TYPES:
+            entries[tag] = (field_type, value_count, entry + 8)
+    return entries
+
+
+def _collect(entries, names, wanted, data, order, result):
+    for tag, name in names.items():
+        if name in wanted and tag in entries:
+            result[name] = _value(data, order, *entries[tag])
+
+
+def _value(data, order, field_type, count, field_offset):
+    code, size = _TYPES[field_type]
+    total = size * count
+    offset = field_offset if total <= 4 else struct.unpack_from(order + "I", data, field_offset)[0]
+    if offset + total > len(data):
+        raise ExifFormatError("value outside of EXIF block")
+    raw = bytes(data[offset:offset + total])
+    if field_type == 2:
+        return raw.split(b"\x00", 1)[0].decode("utf-8", errors="replace").strip()
+    if field_type == 7:
+        return raw.decode(errors="replace")
+    values = struct.unpack(order + code * count, raw)
+    if field_type in (5, 10):
+        values = [num / den if den else None for num, den in zip(values[::2], values[1::2])]
+    return values[0] if count == 1 else list(values)
+
+
+def _read_jpeg(f, tags):
+    result, dims = None, {}
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+        kind = marker[1]
+        if kind == 0xD8 or 0xD0 <= kind <= 0xD7 or kind == 0x01:
+            continue  # Standalone markers carry no length
+        if kind in (0xD9, 0xDA):
+            break  # End of image / start of scan: no metadata beyond this point
+        (length,) = struct.unpack(">H", f.read(2))
+        if kind == 0xE1 and result is None:
+            segment = f.read(length - 2)
+            if segment[:6] == b"Exif\x00\x00":
+                result = parse_tiff(memoryview(segment)[6:], tags)
+                continue
+            f.seek(-(length - 2), 1)
+        elif kind in _SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", f.read(5))
+            dims = {"ImageWidth": width, "ImageLength": height}
+            f.seek(length - 7, 1)
+            continue
+        f.seek(length - 2, 1)
+    return _with_dimensions(result or {}, dims, tags)
+
+
+def _read_png(f, tags):
+    result, dims = None, {}
+    f.seek(8)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type == b"IHDR":
+            width, height = struct.unpack(">II", f.read(8))
+            dims = {"ImageWidth": width, "ImageLength": height}
+            f.seek(length - 8 + 4, 1)
+        elif chunk_type == b"eXIf":
+            result = parse_tiff(f.read(length), tags)
+            f.seek(4, 1)
+        elif chunk_type in (b"IDAT", b"IEND"):
+            break
+        else:
+            f.seek(length + 4, 1)
+    return _with_dimensions(result or {}, dims, tags)
+
+
+def _with_dimensions(result, dims, tags):
+    for name, value in dims.items():
+        if name in tags:
+            result.setdefault(name, value)
+    return result
+
+
+def iter_boxes(f, start, end):
+    """Yield (type, payload_offset, payload_size) for ISO-BMFF boxes in [start, end)."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", f.read(8))
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise ExifFormatError("bad box size")
+        yield box_type, offset + header, size - header
+        offset += size
+
+
+def _read_heif(f, tags):
+    f.seek(0, 2)
+    file_end = f.tell()
+    meta = next((box for box in iter_boxes(f, 0, file_end) if box[0] == b"meta"), None)
+    if meta is None:
+        return {}
+    _, meta_offset, meta_size = meta
+    # meta is a full box: skip version + flags
+    children = {box[0]: box for box in iter_boxes(f, meta_offset + 4, meta_offset + meta_size)}
+    if b"iinf" not in children or b"iloc" not in children:
+        return {}
+    exif_id = _heif_exif_item(f, children[b"iinf"])
+    if exif_id is None:
+        return {}
+    location = _heif_item_location(f, children[b"iloc"], exif_id)
+    if location is None:
+        return {}
+    offset, length = location
+    f.seek(offset)
+    payload = f.read(length)
+    # The Exif item starts with the offset of the TIFF header past this field
+    (tiff_offset,) = struct.unpack(">I", payload[:4])
+    return parse_tiff(memoryview(payload)[4 + tiff_offset:], tags)
+
+
+def _heif_exif_item(f, iinf):
+    _, offset, size = iinf
+    f.seek(offset)
+    version = f.read(4)[0]
+    entry_count_size = 2 if version == 0 else 4
+    start = offset + 4 + entry_count_size
+    for box_type, infe_offset, _ in iter_boxes(f, start, offset + size):
+        if box_type != b"infe":
+            continue
+        f.seek(infe_offset)
+        infe_version = f.read(4)[0]
+        if infe_version < 2:
+            continue
+        id_size = 2 if infe_version == 2 else 4
+        item_id = int.from_bytes(f.read(id_size), "big")
+        f.read(2)  # item_protection_index
+        if f.read(4) == b"Exif":
+            return item_id
+    return None
+
+
+def _heif_item_location(f, iloc, wanted_id):
+    _, offset, _ = iloc
+    f.seek(offset)
+    version = f.read(4)[0]
+    sizes = f.read(2)
+    offset_size, length_size = sizes[0] >> 4, sizes[0] & 0x0F
+    base_offset_size = sizes[1] >> 4
+    index_size = sizes[1] & 0x0F if version in (1, 2) else 0
+
+    def read_int(size):
+        return int.from_bytes(f.read(size), "big") if size else 0
+
+    item_count = read_int(2 if version < 2 else 4)
+    for _ in range(item_count):
+        item_id = read_int(2 if version < 2 else 4)
+        construction_method = read_int(2) & 0x0F if version in (1, 2) else 0
+        read_int(2)  # data_reference_index
+        base_offset = read_int(base_offset_size)
+        extents = []
+        for _ in range(read_int(2)):
+            read_int(index_size)
+            extents.append((read_int(offset_size), read_int(length_size)))
+        if item_id == wanted_id:
+            if construction_method != 0 or len(extents) != 1:
+                return None  # Stored in idat or split: leave it to Pillow
+            extent_offset, extent_length = extents[0]
+            return base_offset + extent_offset, extent_length
+    return None
@@ -2,7 +2,16 @@ import os
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
 
+from src.utils.exif_header import read_exif_header
+
 def extract_exif_data(image_path):
+    """Read EXIF from the file header when possible; otherwise decode it with Pillow."""
+    exif_data = read_exif_header(image_path)
+    if exif_data is not None:
+        return exif_data
+    return _extract_pillow_exif(image_path)
+
+def _extract_pillow_exif(image_path):
     exif_data = {}
     try:
         image = Image.open(image_path)
@@ -16,6 +25,33 @@ def extract_exif_data(image_path):
         print(f"Error extracting EXIF data from {image_path}: {e}")
     return exif_data
 
+def clean_exif_data(exif_data):
+    """Recursively convert bytes and non-JSON-serializable EXIF data to strings or floats."""
+    import numbers
+
+    # Import IFDRational from PIL if available
+    try:
+        from PIL.TiffImagePlugin import IFDRational
+    except ImportError:
+        IFDRational = None
+
+    if isinstance(exif_data, dict):
+        return {k: clean_exif_data(v) for k, v in exif_data.items()}
+    elif isinstance(exif_data, (list, tuple)):
+        return [clean_exif_data(v) for v in exif_data]
+    elif isinstance(exif_data, bytes):
+        try:
+            return exif_data.decode(errors="replace")
+        except Exception:
+            return str(exif_data)
+    elif IFDRational and isinstance(exif_data, IFDRational):
+        # Convert IFDRational to float
+        return float(exif_data)
+    elif isinstance(exif_data, numbers.Number):
+        return exif_data
+    else:
+        return str(exif_data)
+
 def get_gps_info(exif_data):
     gps_info = {}
     if 'GPSInfo' in exif_data:
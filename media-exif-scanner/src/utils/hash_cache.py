@@ -0,0 +1,138 @@
+import atexit
+import errno
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Extended attribute holding a file's cached hashes ("user." namespace: settable by the file's owner)
+XATTR_NAME = "user.media_exif_scanner.hashes"
+# Per-directory fallback where extended attributes are unsupported; dot-prefixed so scans skip it
+SIDECAR_NAME = ".media_exif_scanner_hashes.json"
+
+# errnos meaning "this filesystem / platform has no user xattrs"
+_NO_XATTR = {errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOSYS}
+_NO_ATTRIBUTE = {getattr(errno, "ENODATA", errno.ENOENT), getattr(errno, "ENOATTR", errno.ENOENT)}
+
+
+class HashCache:
+    """
+    Content hashes stored with the files themselves, so they survive a new
+    catalog, a cleared database or a disk moved to another machine.
+
+    Each file's entry records its size and mtime_ns next to its hashes, keyed
+    by algorithm (full hash) or "<algorithm>:partial"; an entry only counts
+    while the file's size and mtime still match. Entries are kept in an
+    extended attribute on the file (Linux), or, where the filesystem or
+    platform has none, in a sidecar JSON file per directory. Sidecars are
+    cached in memory for the most recent max_sidecars directories and
+    written back atomically when evicted, every flush_every changes, by
+    flush() and at exit.
+
+    Install one with hash_utils.set_hash_cache() to have generate_hash() and
+    generate_partial_hash() consult it.
+    """
+
+    def __init__(self, use_xattr=True, max_sidecars=64, flush_every=256):
+        self.use_xattr = use_xattr and hasattr(os, "getxattr")
+        self.max_sidecars = max_sidecars
+        self.flush_every = flush_every
+        self._sidecars = OrderedDict()  # directory -> {"files": {name: entry}, "dirty": changes}
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def get(self, file_path, key, size, mtime_ns):
+        """The value cached under key for file_path, or None if missing or the file changed since."""
+        entry = self._read(file_path)
+        if not entry or entry.get("size") != size or entry.get("mtime_ns") != mtime_ns:
+            return None
+        return entry.get("hashes", {}).get(key)
+
+    def put(self, file_path, size, mtime_ns, **hashes):
+        """Record hashes (key=value) for file_path as it was at size / mtime_ns."""
+        entry = self._read(file_path)
+        if not entry or entry.get("size") != size or entry.get("mtime_ns") != mtime_ns:
+            entry = {"size": size, "mtime_ns": mtime_ns, "hashes": {}}
+        if all(entry["hashes"].get(key) == value for key, value in hashes.items()):
+            return
+        entry["hashes"].update(hashes)
+        if not self._write_xattr(file_path, entry):
+            self._write_sidecar(file_path, entry)
+
+    def flush(self):
+        """Write every changed sidecar back to disk."""
+        with self._lock:
+            for directory, sidecar in self._sidecars.items():
+                self._save_sidecar(directory, sidecar)
+
+    # --- Extended attributes ---
+    def _read(self, file_path):
+        if self.use_xattr:
+            try:
+                return json.loads(os.getxattr(file_path, XATTR_NAME))
+            except OSError as e:
+                # Filesystems without xattrs keep their entries in sidecars
+                if e.errno not in _NO_XATTR and e.errno not in _NO_ATTRIBUTE:
+                    return None
+            except ValueError:
+                return None
+        return self._read_sidecar(file_path)
+
+    def _write_xattr(self, file_path, entry):
+        if not self.use_xattr:
+            return False
+        try:
+            os.setxattr(file_path, XATTR_NAME, json.dumps(entry, separators=(",", ":")).encode())
+            return True
+        except OSError:
+            # No xattr support, or a read-only file or medium: the sidecar is tried next (and fails quietly too)
+            return False
+
+    # --- Sidecar files ---
+    def _read_sidecar(self, file_path):
+        directory, name = os.path.split(os.path.abspath(file_path))
+        with self._lock:
+            entry = self._sidecar(directory)["files"].get(name)
+            # A copy, so callers can edit it outside the lock
+            return dict(entry, hashes=dict(entry.get("hashes", {}))) if entry else None
+
+    def _write_sidecar(self, file_path, entry):
+        directory, name = os.path.split(os.path.abspath(file_path))
+        with self._lock:
+            sidecar = self._sidecar(directory)
+            sidecar["files"][name] = entry
+            sidecar["dirty"] += 1
+            if sidecar["dirty"] >= self.flush_every:
+                self._save_sidecar(directory, sidecar)
+
+    def _sidecar(self, directory):
+        sidecar = self._sidecars.get(directory)
+        if sidecar is not None:
+            self._sidecars.move_to_end(directory)
+            return sidecar
+        try:
+            with open(os.path.join(directory, SIDECAR_NAME)) as f:
+                files = json.load(f).get("files", {})
+        except (OSError, ValueError, AttributeError):
+            files = {}
+        sidecar = self._sidecars[directory] = {"files": files, "dirty": 0}
+        if len(self._sidecars) > self.max_sidecars:
+            evicted, old = self._sidecars.popitem(last=False)
+            self._save_sidecar(evicted, old)
+        return sidecar
+
+    def _save_sidecar(self, directory, sidecar):
+        if not sidecar["dirty"]:
+            return
+        sidecar["dirty"] = 0
+        try:
+            # Entries of files that are gone would only pile up
+            present = set(os.listdir(directory))
+            files = {name: entry for name, entry in sidecar["files"].items() if name in present}
+            sidecar["files"] = files
+            tmp = os.path.join(directory, f"{SIDECAR_NAME}.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"version": 1, "files": files}, f, separators=(",", ":"))
+            os.replace(tmp, os.path.join(directory, SIDECAR_NAME))
+        except OSError:
+            pass
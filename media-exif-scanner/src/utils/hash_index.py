@@ -0,0 +1,223 @@
+import json
+import os
+
+import numpy as np
+
+from src.utils.hash_utils import DEFAULT_ALGORITHM, new_hasher
+
+# Bloom filter sizing: ~10 bits and 7 probes per digest give about 1% false positives
+BLOOM_BITS_PER_DIGEST = 10
+BLOOM_PROBES = 7
+# New digests wait in a sorted delta until it reaches this size or 1/8 of the main array
+COMPACT_MIN = 65536
+# Digests hashed into the Bloom filter per vectorized step
+BLOOM_CHUNK = 1 << 20
+# Odd 64-bit constant spreading short digests (xxh64) over the second probe hash
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def digest_size(algorithm):
+    """Bytes in a digest made with algorithm (32 for sha256)."""
+    return new_hasher(algorithm).digest_size
+
+
+def _search(sorted_digests, digests):
+    """Boolean array: which of digests occur in sorted_digests."""
+    if not len(sorted_digests) or not len(digests):
+        return np.zeros(len(digests), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_digests, digests), len(sorted_digests) - 1)
+    return sorted_digests[pos] == digests
+
+
+class HashIndex:
+    """
+    Set of full content hashes stored as raw digests in a sorted NumPy array.
+
+    A SHA-256 digest costs 32 bytes here, against well over 100 for its hex
+    string in a Python set, so tens of millions of hashes fit in memory.
+    Membership is tested for a whole batch at once (contains()): a Bloom filter
+    (about 10 bits per digest) turns most absent hashes away, and the rest are
+    binary searched with searchsorted. add() keeps new digests in a small sorted
+    delta that is merged into the main array once it grows past COMPACT_MIN or
+    an eighth of it; merge() folds in another index.
+
+    save() writes the digests as a .npy file (plus the Bloom filter and the
+    algorithm and digest size next to it) that load() memory-maps, so a saved
+    index opens instantly and is paged in on demand.
+    """
+
+    def __init__(self, algorithm=DEFAULT_ALGORITHM, digests=None, bloom=None):
+        self.algorithm = algorithm
+        self.dtype = np.dtype(f"S{digest_size(algorithm)}")
+        if digests is None:
+            digests = np.empty(0, dtype=self.dtype)
+        elif digests.dtype != self.dtype:
+            raise ValueError(f"{algorithm} digests are {self.dtype.itemsize} bytes, got {digests.dtype.itemsize}")
+        self._digests = digests
+        self._delta = np.empty(0, dtype=self.dtype)
+        if bloom is None or len(bloom) * 8 < len(digests) * BLOOM_BITS_PER_DIGEST // 2:
+            self._rebuild_bloom()
+        else:
+            self._bloom = np.array(bloom, dtype=np.uint8)
+
+    @classmethod
+    def from_hashes(cls, hashes, algorithm=DEFAULT_ALGORITHM):
+        """Index of an iterable of hex hashes (None and malformed values are ignored)."""
+        index = cls(algorithm)
+        index.add(hashes)
+        return index
+
+    @classmethod
+    def from_db(cls, db, algorithm=DEFAULT_ALGORITHM, path_prefix=None, filters=()):
+        """Index of the full hashes the catalog holds for algorithm, read in batches without ORM rows."""
+        chunks = [cls._to_digests(batch, np.dtype(f"S{digest_size(algorithm)}"))[0]
+                  for batch in db.iter_hash_values(algorithm, path_prefix, filters=filters)]
+        digests = np.unique(np.concatenate(chunks)) if chunks else None
+        return cls(algorithm, digests)
+
+    @classmethod
+    def load(cls, path, algorithm=DEFAULT_ALGORITHM, mmap=True):
+        """
+        Open an index written by save(), memory-mapped unless mmap is False.
+
+        Raises ValueError if it was built with another algorithm than the one
+        asked for, does not say which, or does not match its metadata.
+        """
+        try:
+            with open(f"{path}.meta") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"{path} has no {path}.meta naming its hash algorithm") from None
+        if meta.get("algorithm") != algorithm or meta.get("digest_size") != digest_size(algorithm):
+            raise ValueError(f"{path} holds {meta.get('algorithm')} digests of {meta.get('digest_size')} bytes, "
+                             f"not {algorithm}")
+        digests = np.load(path, mmap_mode="r" if mmap else None)
+        if len(digests) != meta.get("count", len(digests)):
+            raise ValueError(f"{path} holds {len(digests)} digests, its {path}.meta says {meta['count']}")
+        try:
+            bloom = np.load(f"{path}.bloom", mmap_mode="r" if mmap else None)
+        except OSError:
+            bloom = None
+        return cls(algorithm, digests, bloom)
+
+    def save(self, path):
+        """Write the index to path (.npy), its Bloom filter to path + ".bloom" and its algorithm to path + ".meta"."""
+        self.compact()
+        meta = {"algorithm": self.algorithm, "digest_size": self.dtype.itemsize, "count": len(self._digests)}
+        for target, content in ((path, self._digests), (f"{path}.bloom", self._bloom), (f"{path}.meta", meta)):
+            tmp = f"{target}.tmp"
+            if isinstance(content, dict):
+                with open(tmp, "w") as f:
+                    json.dump(content, f)
+            else:
+                with open(tmp, "wb") as f:
+                    np.save(f, content)
+            os.replace(tmp, target)
+
+    def __len__(self):
+        return len(self._digests) + len(self._delta)
+
+    def __contains__(self, hash_value):
+        return bool(self.contains([hash_value])[0])
+
+    @property
+    def nbytes(self):
+        return self._digests.nbytes + self._delta.nbytes + self._bloom.nbytes
+
+    def contains(self, hashes):
+        """Boolean array with one entry per hex hash in hashes: whether the index holds it."""
+        hashes = list(hashes)
+        digests, valid = self._to_digests(hashes, self.dtype)
+        found = np.zeros(len(hashes), dtype=bool)
+        maybe = self._bloom_test(digests)
+        candidates = digests[maybe]
+        present = _search(self._digests, candidates) | _search(self._delta, candidates)
+        found[np.flatnonzero(valid)[maybe][present]] = True
+        return found
+
+    def add(self, hashes):
+        """Add hex hashes (or an array of digests); returns how many were new."""
+        if isinstance(hashes, np.ndarray):
+            digests = np.unique(hashes.astype(self.dtype))
+        else:
+            digests = np.unique(self._to_digests(hashes, self.dtype)[0])
+        digests = digests[~(_search(self._digests, digests) | _search(self._delta, digests))]
+        if not len(digests):
+            return 0
+        self._delta = np.union1d(self._delta, digests)
+        if len(self) > len(self._bloom) * 8 // BLOOM_BITS_PER_DIGEST:
+            # Over capacity: compact() regrows the filter
+            self.compact()
+        else:
+            self._bloom_set(digests)
+            if len(self._delta) > max(COMPACT_MIN, len(self._digests) // 8):
+                self.compact()
+        return len(digests)
+
+    def merge(self, other):
+        """Add every digest of another index made with the same algorithm; returns how many were new."""
+        if other.algorithm != self.algorithm:
+            raise ValueError(f"cannot merge a {other.algorithm} index into a {self.algorithm} one")
+        other.compact()
+        return self.add(other._digests)
+
+    def compact(self):
+        """Merge the delta into the main sorted array (one linear pass) and regrow the Bloom filter if full."""
+        if len(self._delta):
+            self._digests = np.insert(self._digests, np.searchsorted(self._digests, self._delta), self._delta)
+            self._delta = np.empty(0, dtype=self.dtype)
+        if len(self._digests) > len(self._bloom) * 8 // BLOOM_BITS_PER_DIGEST:
+            self._rebuild_bloom()
+
+    # --- Conversion ---
+    @staticmethod
+    def _to_digests(hashes, dtype):
+        """(digests, valid): the well-formed hex hashes as an array, and a mask of which inputs they were."""
+        width = dtype.itemsize * 2
+        hashes = list(hashes)
+        valid = np.fromiter((isinstance(h, str) and len(h) == width for h in hashes), dtype=bool, count=len(hashes))
+        kept = [h for h, ok in zip(hashes, valid) if ok]
+        try:
+            raw = bytes.fromhex("".join(kept))
+        except ValueError:
+            # Some value is not hex: check them one by one
+            for i in np.flatnonzero(valid):
+                try:
+                    bytes.fromhex(hashes[i])
+                except ValueError:
+                    valid[i] = False
+            raw = bytes.fromhex("".join(h for h, ok in zip(hashes, valid) if ok))
+        return np.frombuffer(raw, dtype=dtype), valid
+
+    # --- Bloom filter ---
+    def _probes(self, digests):
+        """(len(digests), BLOOM_PROBES) bit positions, by double hashing the digests' leading bytes."""
+        raw = np.frombuffer(digests.tobytes(), dtype=np.uint8).reshape(len(digests), self.dtype.itemsize)
+        words = np.zeros((len(digests), 16), dtype=np.uint8)
+        words[:, :min(16, raw.shape[1])] = raw[:, :16]
+        words = words.view("<u8")
+        h1 = words[:, 0]
+        h2 = (words[:, 1] if self.dtype.itemsize >= 16 else h1 * _MIX) | np.uint64(1)
+        steps = np.arange(BLOOM_PROBES, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(len(self._bloom) * 8)
+
+    def _bloom_set(self, digests):
+        # In chunks: the probe matrix takes 8 * BLOOM_PROBES bytes per digest
+        for start in range(0, len(digests), BLOOM_CHUNK):
+            bits = self._probes(digests[start:start + BLOOM_CHUNK]).ravel()
+            np.bitwise_or.at(self._bloom, bits >> np.uint64(3), np.uint8(1) << (bits & np.uint64(7)).astype(np.uint8))
+
+    def _bloom_test(self, digests):
+        hits = [np.zeros(0, dtype=bool)]
+        for start in range(0, len(digests), BLOOM_CHUNK):
+            bits = self._probes(digests[start:start + BLOOM_CHUNK])
+            hit = self._bloom[bits >> np.uint64(3)] & (np.uint8(1) << (bits & np.uint64(7)).astype(np.uint8))
+            hits.append(hit.all(axis=1))
+        return np.concatenate(hits)
+
+    def _rebuild_bloom(self):
+        # Room for twice the current digests, so appends do not regrow it right away
+        size = max(64, 2 * len(self) * BLOOM_BITS_PER_DIGEST // 8)
+        self._bloom = np.zeros(size, dtype=np.uint8)
+        self._bloom_set(self._digests)
+        self._bloom_set(self._delta)
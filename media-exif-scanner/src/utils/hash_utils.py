@@ -1,16 +1,191 @@
 import hashlib
+import os
+import threading
 
-def generate_hash(file_path, algorithm='sha256'):
-    """Generate a hash for the given file using the specified algorithm."""
-    hash_func = hashlib.new(algorithm)
+# Bytes hashed from each end of a file by generate_partial_hash.
+PARTIAL_HASH_CHUNK = 4 * 1024 * 1024
+# Size of the reusable per-thread read buffer; large reads keep Python call
+# overhead negligible next to the digest itself.
+READ_BUFFER_SIZE = 1024 * 1024
+DEFAULT_ALGORITHM = 'sha256'
+
+_ALGORITHMS = {
+    'sha256': hashlib.sha256,
+    'sha1': hashlib.sha1,
+    'md5': hashlib.md5,
+    'blake2b': hashlib.blake2b,
+}
+
+# Faster non-cryptographic / parallel hashes, when installed
+try:
+    import xxhash
+    _ALGORITHMS['xxh3_128'] = xxhash.xxh3_128
+    _ALGORITHMS['xxh64'] = xxhash.xxh64
+except ImportError:
+    pass
+try:
+    import blake3
+    _ALGORITHMS['blake3'] = blake3.blake3
+except ImportError:
+    pass
+
+_buffers = threading.local()
+# Optional store of hashes kept with the files (see src/utils/hash_cache.py)
+_hash_cache = None
+
+def set_hash_cache(cache):
+    """Have generate_hash() and generate_partial_hash() consult and fill cache (a HashCache), or stop with None."""
+    global _hash_cache
+    _hash_cache = cache
+
+def cached_hashes(file_path, algorithm, size, mtime_ns):
+    """(partial_hash, hash_value) the hash cache holds for a file of this size and mtime, without reading it."""
+    if _hash_cache is None:
+        return None, None
+    try:
+        full = _hash_cache.get(file_path, algorithm, size, mtime_ns)
+        partial = _hash_cache.get(file_path, f"{algorithm}:partial", size, mtime_ns)
+    except OSError:
+        return None, None
+    if partial is None and is_fully_covered(size):
+        partial = full
+    return partial, full
+
+def _cache_lookup(file_path, key):
+    """(stat, cached value) for file_path, or (None, None) when no cache is set."""
+    if _hash_cache is None:
+        return None, None
+    try:
+        st = os.stat(file_path)
+        return st, _hash_cache.get(file_path, key, st.st_size, st.st_mtime_ns)
+    except OSError:
+        return None, None
+
+def _cache_store(file_path, st, **hashes):
+    if st is not None:
+        try:
+            _hash_cache.put(file_path, st.st_size, st.st_mtime_ns, **hashes)
+        except OSError:
+            pass
+
+def available_algorithms():
+    return sorted(_ALGORITHMS)
+
+def new_hasher(algorithm=DEFAULT_ALGORITHM):
+    """Return a new hash object for a registered algorithm, or any name hashlib.new() accepts."""
+    factory = _ALGORITHMS.get(algorithm)
+    return factory() if factory else hashlib.new(algorithm)
+
+def _read_buffer():
+    view = getattr(_buffers, 'view', None)
+    if view is None:
+        view = _buffers.view = memoryview(bytearray(READ_BUFFER_SIZE))
+    return view
+
+def _advise(f, advice):
+    """Hint the kernel about our access pattern; a no-op where posix_fadvise is missing."""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, advice)
+        except OSError:
+            pass
+
+def _update_from_file(hash_func, f, length=None):
+    """Feed length bytes (or the rest of the file) into hash_func via readinto on the reused buffer."""
+    view = _read_buffer()
+    while length is None or length > 0:
+        n = f.readinto(view if length is None or length >= len(view) else view[:length])
+        if not n:
+            break
+        hash_func.update(view[:n])
+        if length is not None:
+            length -= n
+
+def _open_for_hashing(file_path):
+    # Unbuffered, so readinto() fills our buffer straight from the kernel
+    f = open(file_path, 'rb', buffering=0)
+    if hasattr(os, 'POSIX_FADV_SEQUENTIAL'):
+        _advise(f, os.POSIX_FADV_SEQUENTIAL)
+    return f
+
+def _close_after_hashing(f):
+    # Hashing reads each file once: drop it from the page cache instead of evicting hotter data
+    if hasattr(os, 'POSIX_FADV_DONTNEED'):
+        _advise(f, os.POSIX_FADV_DONTNEED)
+    f.close()
+
+def generate_hash(file_path, algorithm=DEFAULT_ALGORITHM, cached=True):
+    """
+    Generate a hash for the given file using the specified algorithm.
+
+    With a hash cache set, a hash cached for the file's current size and
+    mtime is returned without reading it, and fresh hashes are cached.
+    Pass cached=False where the content itself must be checked (verifying
+    a copy before deleting the original).
+    """
+    st, digest = _cache_lookup(file_path, algorithm) if cached else (None, None)
+    if digest:
+        return digest
     try:
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(8192):
-                hash_func.update(chunk)
+        f = _open_for_hashing(file_path)
+        try:
+            # Not hashlib.file_digest: it reads through its own 256 KiB buffer, allocated per call
+            hash_func = new_hasher(algorithm)
+            _update_from_file(hash_func, f)
+            digest = hash_func.hexdigest()
+        finally:
+            _close_after_hashing(f)
     except Exception as e:
         print(f"Error reading file {file_path}: {e}")
         return None
-    return hash_func.hexdigest()
+    # Stored against the stat taken before reading, so a file changed meanwhile no longer matches
+    _cache_store(file_path, st, **{algorithm: digest})
+    return digest
+
+def generate_partial_hash(file_path, algorithm=DEFAULT_ALGORITHM, chunk_size=PARTIAL_HASH_CHUNK):
+    """
+    Hash the first and last chunk_size bytes of a file.
+
+    Files no larger than two chunks are hashed in full, so for them the
+    partial hash equals generate_hash() and no full read is ever needed.
+    Consults and fills the hash cache like generate_hash().
+    """
+    # Cached partial hashes are only for the standard chunk size
+    standard = chunk_size == PARTIAL_HASH_CHUNK
+    st, digest = _cache_lookup(file_path, f"{algorithm}:partial") if standard else (None, None)
+    if digest:
+        return digest
+    if st is not None and is_fully_covered(st.st_size):
+        digest = _hash_cache.get(file_path, algorithm, st.st_size, st.st_mtime_ns)
+        if digest:
+            return digest
+    hash_func = new_hasher(algorithm)
+    try:
+        f = _open_for_hashing(file_path)
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size <= 2 * chunk_size:
+                _update_from_file(hash_func, f)
+            else:
+                _update_from_file(hash_func, f, chunk_size)
+                f.seek(size - chunk_size)
+                _update_from_file(hash_func, f, chunk_size)
+        finally:
+            _close_after_hashing(f)
+    except Exception as e:
+        print(f"Error reading file {file_path}: {e}")
+        return None
+    digest = hash_func.hexdigest()
+    if st is not None:
+        hashes = {f"{algorithm}:partial": digest}
+        if is_fully_covered(st.st_size):
+            hashes[algorithm] = digest
+        _cache_store(file_path, st, **hashes)
+    return digest
+
+def is_fully_covered(size, chunk_size=PARTIAL_HASH_CHUNK):
+    """Return True if a partial hash of a file this size is also its full hash."""
+    return size is not None and size <= 2 * chunk_size
 
 def hash_image(file_path):
     """Generate a SHA256 hash for an image file."""
@@ -18,4 +193,4 @@ def hash_image(file_path):
 
 def hash_video(file_path):
     """Generate a SHA256 hash for a video file."""
-    return generate_hash(file_path, 'sha256')
\ No newline at end of file
+    return generate_hash(file_path, 'sha256')
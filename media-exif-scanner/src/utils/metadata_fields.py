@@ -0,0 +1,174 @@
+"""
+Typed metadata promoted out of the EXIF / video JSON blob into indexed columns.
+
+metadata_columns() reads what the header reader, Pillow (after
+clean_exif_data) and the video parser store, so rows from every source can
+be filtered and sorted in SQL without decoding JSON.
+"""
+import calendar
+import numbers
+from datetime import date, datetime, timedelta
+
+from src.utils.exif_header import GPS_TAGS
+
+# Typed columns on media_files, in schema order; metadata_columns() always returns every one
+METADATA_COLUMNS = ("taken_at", "camera_make", "camera_model", "width", "height", "orientation",
+                    "latitude", "longitude", "duration")
+
+# Most specific first ("YYYY:MM:DD HH:MM:SS" or ISO 8601; MP4 header times are UTC)
+DATE_KEYS = ("DateTimeOriginal", "CreationDate", "CreationTime", "DateTimeDigitized", "DateTime")
+WIDTH_KEYS = ("ExifImageWidth", "ImageWidth", "PixelXDimension")
+HEIGHT_KEYS = ("ExifImageHeight", "ImageLength", "ImageHeight", "PixelYDimension")
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, numbers.Real):
+        # Includes Pillow's IFDRational when records hold raw, uncleaned EXIF
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip("\x00"))
+        except ValueError:
+            return None
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        # Older Pillow versions keep rationals as (numerator, denominator)
+        num, den = _number(value[0]), _number(value[1])
+        return num / den if num is not None and den else None
+    return None
+
+
+def _text(value):
+    if not isinstance(value, str):
+        return None
+    value = value.replace("\x00", "").strip()
+    return value or None
+
+
+def parse_exif_datetime(value):
+    """datetime for "YYYY:MM:DD HH:MM:SS", ISO 8601 or a bare date; None for blank or zeroed values."""
+    if not isinstance(value, str) or len(value) < 10:
+        return None
+    day = value[:10].replace("-", ":")
+    clock = value[11:19] if len(value) >= 19 else ""
+    try:
+        return datetime.strptime(f"{day} {clock}", "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(day, "%Y:%m:%d")
+    except ValueError:
+        return None
+
+
+def _dimension(exif_data, keys):
+    for key in keys:
+        value = _number(exif_data.get(key))
+        if value and value > 0:
+            return int(value)
+    return None
+
+
+def _coordinate(value, ref):
+    """Decimal degrees from a DMS list, a single number or a "d, m, s" string; negative for S/W."""
+    if isinstance(value, str):
+        value = [part for part in value.strip("()[] ").replace(",", " ").split() if part]
+    if isinstance(value, (list, tuple)) and len(value) == 3:
+        parts = [_number(part) for part in value]
+        if any(part is None for part in parts):
+            return None
+        degrees = sum(part / 60 ** i for i, part in enumerate(parts))
+    else:
+        degrees = _number(value)
+        if degrees is None:
+            return None
+    ref = _text(ref)
+    return -degrees if ref and ref[0].upper() in "SW" else degrees
+
+
+def gps_position(exif_data):
+    """(latitude, longitude) in decimal degrees, or (None, None)."""
+    latitude, longitude = exif_data.get("GPSLatitude"), exif_data.get("GPSLongitude")
+    if isinstance(latitude, (int, float)) and isinstance(longitude, (int, float)):
+        # Video location atoms are already signed decimal degrees
+        lat, lon = float(latitude), float(longitude)
+    else:
+        gps = exif_data.get("GPSInfo")
+        if not isinstance(gps, dict):
+            return None, None
+        # Header reader: tag names; Pillow: tag ids, which turn into strings once stored as JSON
+        named = {}
+        for key, value in gps.items():
+            if isinstance(key, str) and key.isdigit():
+                key = int(key)
+            named[GPS_TAGS.get(key, key)] = value
+        if named.get("GPSLatitude") is None or named.get("GPSLongitude") is None:
+            return None, None
+        lat = _coordinate(named["GPSLatitude"], named.get("GPSLatitudeRef"))
+        lon = _coordinate(named["GPSLongitude"], named.get("GPSLongitudeRef"))
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None
+    if lat == 0 and lon == 0:
+        # Cameras without a fix often write zeros
+        return None, None
+    return round(lat, 7), round(lon, 7)
+
+
+def metadata_columns(exif_data):
+    """Values for every METADATA_COLUMNS column from a stored EXIF / video metadata dict."""
+    if not isinstance(exif_data, dict):
+        return dict.fromkeys(METADATA_COLUMNS)
+    taken_at = None
+    for key in DATE_KEYS:
+        taken_at = parse_exif_datetime(exif_data.get(key))
+        if taken_at:
+            break
+    orientation = _number(exif_data.get("Orientation"))
+    duration = _number(exif_data.get("Duration"))
+    latitude, longitude = gps_position(exif_data)
+    return {
+        "taken_at": taken_at,
+        "camera_make": _text(exif_data.get("Make")),
+        "camera_model": _text(exif_data.get("Model")),
+        "width": _dimension(exif_data, WIDTH_KEYS),
+        "height": _dimension(exif_data, HEIGHT_KEYS),
+        "orientation": int(orientation) if orientation and 1 <= orientation <= 8 else None,
+        "latitude": latitude,
+        "longitude": longitude,
+        "duration": float(duration) if duration and duration > 0 else None,
+    }
+
+
+def parse_period(value):
+    """
+    (start, end) datetimes covering a period given as "YYYY", "YYYY-MM",
+    "YYYY-MM-DD", "YYYY-MM-DD HH:MM:SS" (":" separators work too) or a
+    date / datetime; end is exclusive. Raises ValueError for anything else.
+    """
+    if isinstance(value, datetime):
+        return value, value + timedelta(seconds=1)
+    if isinstance(value, date):
+        start = datetime(value.year, value.month, value.day)
+        return start, start + timedelta(days=1)
+    text = str(value).strip()
+    parts = text.replace(":", "-").split("-")
+    try:
+        if len(text) > 10:
+            start = parse_exif_datetime(text)
+            if start is None:
+                raise ValueError
+            return start, start + timedelta(seconds=1)
+        if len(parts) == 1:
+            start = datetime(int(parts[0]), 1, 1)
+            return start, start.replace(year=start.year + 1)
+        if len(parts) == 2:
+            start = datetime(int(parts[0]), int(parts[1]), 1)
+            days = calendar.monthrange(start.year, start.month)[1]
+            return start, start + timedelta(days=days)
+        if len(parts) == 3:
+            start = datetime(int(parts[0]), int(parts[1]), int(parts[2]))
+            return start, start + timedelta(days=1)
+    except ValueError:
+        pass
+    raise ValueError(f"Expected a date like 2019, 2019-06, 2019-06-01 or 2019-06-01 12:00:00, got {value!r}")
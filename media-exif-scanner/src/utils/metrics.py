@@ -0,0 +1,277 @@
+"""
+Lightweight per-stage scan metrics: counters, latency histograms, slow-file
+logging, optional cProfile / tracemalloc capture, and JSON lines or
+Prometheus textfile export.
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Upper bounds (seconds) of the latency buckets; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (not thread-safe; ScanMetrics holds the lock)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (max for the +Inf bucket)."""
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "mean_seconds": round(self.total / self.count, 6) if self.count else None,
+            "p50_seconds": self.quantile(0.5) if self.count else None,
+            "p95_seconds": self.quantile(0.95) if self.count else None,
+            "max_seconds": round(self.max, 6),
+        }
+
+
+class JsonLinesExporter:
+    """Appends one JSON object per export (periodic snapshots, then the final summary)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, metrics, final=False):
+        line = dict(metrics.summary(), event="summary" if final else "snapshot", time=time.time())
+        with open(self.path, "a") as f:
+            f.write(json.dumps(line) + "\n")
+
+
+class PrometheusTextfileExporter:
+    """Rewrites a node_exporter textfile-collector file (atomically) on every export."""
+
+    def __init__(self, path, prefix="media_scanner"):
+        self.path = path
+        self.prefix = prefix
+
+    def write(self, metrics, final=False):
+        p = self.prefix
+        lines = [f"# HELP {p}_stage_seconds Time spent per item in each scan stage",
+                 f"# TYPE {p}_stage_seconds histogram"]
+        with metrics.lock:
+            histograms = {stage: (list(h.buckets), list(h.counts), h.total, h.count)
+                          for stage, h in metrics.histograms.items()}
+            counters = dict(metrics.counters)
+        for stage, (buckets, counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {count}')
+        lines += [f"# HELP {p}_events_total Scan pipeline event counters", f"# TYPE {p}_events_total counter"]
+        lines += [f'{p}_events_total{{name="{name}"}} {value}' for name, value in sorted(counters.items())]
+        lines += [f"# TYPE {p}_last_export_timestamp_seconds gauge", f"{p}_last_export_timestamp_seconds {time.time()}"]
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+class ScanMetrics:
+    """
+    Thread-safe metrics shared by the threads of one scan.
+
+    Stages time their work with observe() or call(); items slower than
+    slow_threshold seconds are kept (the slowest max_slow_files) and reported
+    through on_slow(stage, file_path, seconds). Profiling (cProfile, one
+    profiler per worker thread, merged at the end) and memory tracing
+    (tracemalloc) can be switched on and off while a scan runs. Exporters are
+    written every export_interval seconds and once more by finish().
+    """
+
+    def __init__(self, slow_threshold=2.0, on_slow=None, exporters=(), export_interval=10.0, max_slow_files=50,
+                 profile_path=None):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.slow_threshold = slow_threshold
+        self.on_slow = on_slow if on_slow is not None else self._print_slow
+        self.slow_files = []
+        self.max_slow_files = max_slow_files
+        self.exporters = list(exporters)
+        self.export_interval = export_interval
+        self.profile_path = profile_path
+        self.profiling = False
+        self._profilers = []
+        self._thread_profiler = threading.local()
+        self._memory = None
+        self._last_export = time.monotonic()
+        self._started = time.monotonic()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, stage, seconds, file_path=None):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+            slow = file_path is not None and self.slow_threshold is not None and seconds >= self.slow_threshold
+            if slow:
+                self.slow_files.append({"stage": stage, "file_path": file_path, "seconds": round(seconds, 3)})
+                self.slow_files.sort(key=lambda entry: -entry["seconds"])
+                del self.slow_files[self.max_slow_files:]
+            export = self.exporters and time.monotonic() - self._last_export >= self.export_interval
+            if export:
+                self._last_export = time.monotonic()
+        if slow and self.on_slow:
+            self.on_slow(stage, file_path, seconds)
+        if export:
+            self.export()
+
+    def timer(self, stage, file_path=None):
+        """Context manager timing a block into stage's histogram."""
+        return _Timer(self, stage, file_path)
+
+    def call(self, stage, func, *args, file_path=None):
+        """Run func(*args), timing it into stage and profiling it when profiling is on."""
+        start = time.perf_counter()
+        profiler = self._profiler() if self.profiling else None
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows a single active profiler; leave this call unprofiled
+                profiler = None
+        try:
+            return func(*args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            self.observe(stage, time.perf_counter() - start, file_path)
+
+    def start_profiling(self):
+        self.profiling = True
+
+    def stop_profiling(self):
+        self.profiling = False
+
+    def start_tracemalloc(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop_tracemalloc(self):
+        if tracemalloc.is_tracing():
+            self._memory = self._memory_summary()
+            tracemalloc.stop()
+
+    def summary(self):
+        with self.lock:
+            summary = {
+                "elapsed_seconds": round(time.monotonic() - self._started, 3),
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.to_dict() for stage, histogram in self.histograms.items()},
+                "slow_files": list(self.slow_files),
+            }
+        memory = self._memory_summary() if tracemalloc.is_tracing() else self._memory
+        if memory:
+            summary["memory"] = memory
+        return summary
+
+    def export(self, final=False):
+        for exporter in self.exporters:
+            try:
+                exporter.write(self, final=final)
+            except OSError as e:
+                print(f"Error writing metrics to {exporter.path}: {e}")
+
+    def finish(self):
+        """Write the final export and profile; return the summary dict."""
+        self.stop_profiling()
+        if self.profile_path:
+            self.dump_profile(self.profile_path)
+        self.export(final=True)
+        return self.summary()
+
+    def dump_profile(self, path):
+        """Merge the per-thread profiles captured so far and save them as a pstats file."""
+        with self.lock:
+            profilers = list(self._profilers)
+        if not profilers:
+            return None
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+        return path
+
+    def format_summary(self):
+        """Human-readable summary lines, slowest stages first."""
+        summary = self.summary()
+        lines = [f"Scan metrics ({summary['elapsed_seconds']}s):"]
+        for stage, h in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+            lines.append(f"  {stage}: {h['count']} items, {h['total_seconds']:.2f}s total, "
+                         f"mean {h['mean_seconds'] * 1000:.2f} ms, p95 <= {h['p95_seconds'] * 1000:.1f} ms, "
+                         f"max {h['max_seconds'] * 1000:.1f} ms")
+        if summary["counters"]:
+            lines.append("  " + ", ".join(f"{name}={value}" for name, value in sorted(summary["counters"].items())))
+        for entry in summary["slow_files"][:10]:
+            lines.append(f"  slow {entry['stage']}: {entry['file_path']} ({entry['seconds']}s)")
+        return lines
+
+    def _profiler(self):
+        profiler = getattr(self._thread_profiler, "profiler", None)
+        if profiler is None:
+            profiler = self._thread_profiler.profiler = cProfile.Profile()
+            with self.lock:
+                self._profilers.append(profiler)
+        return profiler
+
+    def _memory_summary(self, limit=10):
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+        return {
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top": [{"location": str(stat.traceback), "bytes": stat.size, "count": stat.count} for stat in top],
+        }
+
+    def _print_slow(self, stage, file_path, seconds):
+        print(f"Slow {stage} ({seconds:.2f}s): {file_path}")
+
+
+class _Timer:
+    def __init__(self, metrics, stage, file_path):
+        self.metrics = metrics
+        self.stage = stage
+        self.file_path = file_path
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.file_path)
+        return False
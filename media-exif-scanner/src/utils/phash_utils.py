@@ -0,0 +1,35 @@
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 gradient bits -> 64-bit hash
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """
+    Difference hash of a PIL image as a signed 64-bit int (fits an SQLite INTEGER).
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale grid and
+    each bit records whether a pixel is brighter than its right-hand neighbour,
+    so resized or re-encoded copies land within a few bits of each other.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big", signed=True)
+
+
+def perceptual_hash(file_path):
+    """Return the dHash of an image file, or None if it cannot be decoded."""
+    try:
+        with Image.open(file_path) as img:
+            # Let JPEG decode straight to a small grayscale image
+            img.draft("L", (64, 64))
+            return dhash(img)
+    except Exception as e:
+        print(f"Error computing perceptual hash for {file_path}: {e}")
+        return None
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two 64-bit hashes."""
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
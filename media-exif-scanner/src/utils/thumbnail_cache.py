@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".media_exif_scanner", "thumbnails")
+
+
+def make_thumbnail(file_path, dest_path, size=(100, 100)):
+    """Decode file_path at reduced size and save a small JPEG thumbnail to dest_path."""
+    with Image.open(file_path) as img:
+        # For JPEGs, draft() lets the decoder downscale by 1/2..1/8 while decoding
+        img.draft("RGB", size)
+        img.thumbnail(size)
+        img = img.convert("RGB")
+        tmp_path = dest_path + ".tmp"
+        img.save(tmp_path, "JPEG", quality=85)
+    os.replace(tmp_path, dest_path)
+
+
+def thumbnail_key(f):
+    """
+    Cache key for a file dict: its full content hash, or for files that were
+    never fully hashed, a digest of path, size and mtime.
+    """
+    if f.get("hash_value"):
+        return f["hash_value"]
+    return hashlib.sha256(f"{f['file_path']}|{f.get('size')}|{f.get('mtime_ns')}".encode()).hexdigest()
+
+
+class ThumbnailCache:
+    """
+    On-disk thumbnail cache keyed by content hash.
+
+    Thumbnails live in a sharded directory (<dir>/<hash[:2]>/<hash>_<w>x<h>.jpg),
+    so every copy of a duplicate shares one entry and the cache survives
+    restarts. Reads touch the file's mtime; once the cache grows beyond
+    max_bytes the least recently used entries are deleted. Missing thumbnails
+    are generated by a small worker pool.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=512 * 1024 * 1024, size=(100, 100), workers=2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._total_bytes = None
+
+    def path_for(self, hash_value):
+        return os.path.join(self.cache_dir, hash_value[:2], f"{hash_value}_{self.size[0]}x{self.size[1]}.jpg")
+
+    def get(self, hash_value):
+        """Return the cached thumbnail path for hash_value, or None if it is not cached."""
+        path = self.path_for(hash_value)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def request(self, file_path, hash_value):
+        """Return a Future resolving to the thumbnail path (None on failure), generating it if needed."""
+        with self._lock:
+            future = self._in_flight.get(hash_value)
+            if future is None:
+                future = self._executor.submit(self._generate, file_path, hash_value)
+                self._in_flight[hash_value] = future
+                future.add_done_callback(lambda _: self._forget(hash_value))
+            return future
+
+    def prefetch(self, files):
+        """Queue generation for any of the given file dicts not yet cached (see thumbnail_key)."""
+        for f in files:
+            key = thumbnail_key(f)
+            if not os.path.exists(self.path_for(key)):
+                self.request(f["file_path"], key)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _forget(self, hash_value):
+        with self._lock:
+            self._in_flight.pop(hash_value, None)
+
+    def _generate(self, file_path, hash_value):
+        path = self.path_for(hash_value)
+        if os.path.exists(path):
+            return path
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            make_thumbnail(file_path, path, self.size)
+        except Exception as e:
+            print(f"Error creating thumbnail for {file_path}: {e}")
+            return None
+        self._account(os.path.getsize(path))
+        return path
+
+    def _account(self, added_bytes):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, _, size in self._entries())
+            else:
+                self._total_bytes += added_bytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for shard in os.scandir(self.cache_dir):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".jpg"):
+                        st = entry.stat()
+                        yield entry.path, st.st_mtime, st.st_size
+
+    def _evict(self):
+        """Delete least recently used thumbnails until the cache is back under 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        for path, _, size in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self._total_bytes -= size
+            except OSError:
+                pass
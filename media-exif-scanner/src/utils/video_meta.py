@@ -0,0 +1,171 @@
+"""
+Streaming MP4/MOV (ISO-BMFF / QuickTime) metadata reader.
+
+Walks box headers with seeks, so mdat payloads are never read: only moov and
+the few leaf boxes below it (mvhd, tkhd, hdlr, stsd, udta, meta) are loaded.
+Results use the same JSON-safe shape as image EXIF so they can be stored in
+the exif_data column.
+"""
+import re
+import struct
+from datetime import datetime, timedelta, timezone
+
+from src.utils.exif_header import ExifFormatError, iter_boxes
+
+_MAC_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+_TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+# ISO 6709 location string, e.g. "+37.7749-122.4194+010.000/"
+_ISO6709 = re.compile(r"([+-]\d+(?:\.\d+)?)([+-]\d+(?:\.\d+)?)([+-]\d+(?:\.\d+)?)?")
+_QUICKTIME_KEYS = {
+    b"com.apple.quicktime.location.ISO6709": "location",
+    b"com.apple.quicktime.creationdate": "CreationDate",
+    b"com.apple.quicktime.make": "Make",
+    b"com.apple.quicktime.model": "Model",
+}
+_UDTA_STRINGS = {b"\xa9xyz": "location", b"\xa9day": "CreationDate", b"\xa9mak": "Make", b"\xa9mod": "Model"}
+
+
+def read_video_metadata(file_path):
+    """
+    Return creation time, duration, resolution, codec, GPS and camera tags of
+    an MP4/MOV file as a JSON-safe dict, or None if it is not an ISO-BMFF file
+    or its moov box is malformed.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(8)
+            if len(head) < 8 or head[4:8] not in _TOP_LEVEL_BOXES:
+                return None
+            f.seek(0, 2)
+            file_end = f.tell()
+            for box_type, offset, size in iter_boxes(f, 0, file_end):
+                if box_type == b"moov":
+                    return _read_moov(f, offset, offset + size)
+            return {}
+    except (OSError, ValueError, struct.error, IndexError):
+        return None
+
+
+def _read_moov(f, start, end):
+    result = {}
+    for box_type, offset, size in iter_boxes(f, start, end):
+        if box_type == b"mvhd":
+            _read_mvhd(_payload(f, offset, size), result)
+        elif box_type == b"trak":
+            _read_trak(f, offset, offset + size, result)
+        elif box_type == b"udta":
+            _read_udta(f, offset, offset + size, result)
+        elif box_type == b"meta":
+            _read_quicktime_meta(f, offset, offset + size, result)
+    location = result.pop("location", None)
+    if location:
+        _set_location(location, result)
+    return result
+
+
+def _payload(f, offset, size, limit=1 << 20):
+    if size > limit:
+        raise ExifFormatError("metadata box too large")
+    f.seek(offset)
+    return f.read(size)
+
+
+def _read_mvhd(data, result):
+    version = data[0]
+    if version == 1:
+        created, _, timescale, duration = struct.unpack_from(">QQIQ", data, 4)
+    else:
+        created, _, timescale, duration = struct.unpack_from(">IIII", data, 4)
+    if created:
+        result["CreationTime"] = _format_time(_MAC_EPOCH + timedelta(seconds=created))
+    if timescale:
+        result["Duration"] = round(duration / timescale, 3)
+
+
+def _read_trak(f, start, end, result):
+    boxes = {box[0]: box for box in iter_boxes(f, start, end)}
+    if b"mdia" not in boxes:
+        return
+    _, mdia_offset, mdia_size = boxes[b"mdia"]
+    mdia = {box[0]: box for box in iter_boxes(f, mdia_offset, mdia_offset + mdia_size)}
+    if b"hdlr" not in mdia or _payload(f, *mdia[b"hdlr"][1:])[8:12] != b"vide":
+        return
+    if b"tkhd" in boxes and "ImageWidth" not in result:
+        tkhd = _payload(f, *boxes[b"tkhd"][1:])
+        # Width and height are 16.16 fixed point at the end of the box
+        width, height = struct.unpack_from(">II", tkhd, len(tkhd) - 8)
+        if width and height:
+            result["ImageWidth"], result["ImageLength"] = width >> 16, height >> 16
+    stsd = _find(f, mdia_offset, mdia_offset + mdia_size, (b"minf", b"stbl", b"stsd"))
+    if stsd and "VideoCodec" not in result:
+        data = _payload(f, *stsd)
+        # Full box header and entry count, then the first sample entry's size and format
+        codec = data[12:16]
+        result["VideoCodec"] = codec.decode("latin-1").strip()
+        if "ImageWidth" not in result and len(data) >= 44:
+            result["ImageWidth"], result["ImageLength"] = struct.unpack_from(">HH", data, 40)
+
+
+def _find(f, start, end, path):
+    """Follow a chain of box types below [start, end) and return (offset, size) of the last one."""
+    for box_type in path:
+        match = next((box for box in iter_boxes(f, start, end) if box[0] == box_type), None)
+        if match is None:
+            return None
+        _, start, size = match
+        end = start + size
+    return start, end - start
+
+
+def _read_udta(f, start, end, result):
+    for box_type, offset, size in iter_boxes(f, start, end):
+        if box_type in _UDTA_STRINGS:
+            data = _payload(f, offset, size)
+            # QuickTime international text: 16-bit length, 16-bit language, text
+            (length,) = struct.unpack_from(">H", data)
+            result.setdefault(_UDTA_STRINGS[box_type], data[4:4 + length].decode("utf-8", errors="replace").strip())
+        elif box_type == b"meta":
+            _read_quicktime_meta(f, offset, offset + size, result)
+
+
+def _read_quicktime_meta(f, start, end, result):
+    """Read the keys/ilst metadata written by Apple devices (creation date, location, camera)."""
+    f.seek(start)
+    if f.read(8)[4:8] != b"hdlr":
+        # ISO files write meta as a full box (version + flags before its children); QuickTime does not
+        start += 4
+    boxes = {box[0]: box for box in iter_boxes(f, start, end)}
+    if b"keys" not in boxes or b"ilst" not in boxes:
+        return
+    keys = _payload(f, *boxes[b"keys"][1:])
+    (count,) = struct.unpack_from(">I", keys, 4)
+    names, pos = {}, 8
+    for index in range(1, count + 1):
+        key_size = struct.unpack_from(">I", keys, pos)[0]
+        names[index] = keys[pos + 8:pos + key_size]
+        pos += key_size
+    _, ilst_offset, ilst_size = boxes[b"ilst"]
+    for box_type, offset, size in iter_boxes(f, ilst_offset, ilst_offset + ilst_size):
+        field = _QUICKTIME_KEYS.get(names.get(struct.unpack(">I", box_type)[0]))
+        if field is None:
+            continue
+        data = _find(f, offset, offset + size, (b"data",))
+        if data:
+            value = _payload(f, *data)[8:]
+            result.setdefault(field, value.decode("utf-8", errors="replace").strip())
+
+
+def _set_location(location, result):
+    match = _ISO6709.match(location)
+    if not match:
+        return
+    result["GPSPosition"] = location
+    result["GPSLatitude"] = float(match.group(1))
+    result["GPSLongitude"] = float(match.group(2))
+    if match.group(3):
+        result["GPSAltitude"] = float(match.group(3))
+
+
+def _format_time(value):
+    """Format like EXIF DateTimeOriginal ("YYYY:MM:DD HH:MM:SS", UTC for MP4 header times)."""
+    return value.strftime("%Y:%m:%d %H:%M:%S")